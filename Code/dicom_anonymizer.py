@@ -1,50 +1,218 @@
 import pydicom
 from pydicom.dataset import Dataset
+from pydicom.filebase import DicomBytesIO
+from pydicom.filereader import read_dataset
+from pydicom.filewriter import write_dataset
+from pydicom.uid import DeflatedExplicitVRLittleEndian, UID
+import mmap
 import os
+import struct
+
+from dicom_deid import DeidProfile
+
+def anonymized_path(filepath, output_dir=None):
+    """
+    Returns the path an anonymized copy of a DICOM file is written to.
+
+    Args:
+        filepath (str): Path to the original DICOM file.
+        output_dir (str, optional): Directory to write into. Defaults to the
+            directory of the original file.
+
+    Returns:
+        str: Path of the anonymized file.
+    """
+    if output_dir is None:
+        output_dir = os.path.dirname(filepath)
+    return os.path.join(output_dir, f"anonymized_{os.path.basename(filepath)}")
+
+# Elements removed by the viewer's Anonymize action, at any depth
+ANONYMIZE_PROFILE = DeidProfile('anonymize', {
+    'InstitutionName': 'remove',
+    'ReferringPhysicianName': 'remove',
+    'StudyID': 'remove',
+    'AccessionNumber': 'remove',
+    'PhysiciansOfRecord': 'remove',
+    'PerformingPhysicianName': 'remove',
+    'OperatorsName': 'remove',
+}, remove_private=False, date_shift_days=0, remap_uids=False)
+
+def _anonymize_dataset(ds, prefix):
+    """Replaces or removes patient-identifying elements in place."""
+    # Anonymize patient information
+    ds.PatientName = f"{prefix}_Anonymous"
+    ds.PatientID = f"{prefix}_ID"
+    ds.PatientBirthDate = "19000101"
+    ds.PatientSex = "O"  # Other/Unknown
+
+    # Remove identifiable information in one pass over the dataset
+    ANONYMIZE_PROFILE.compiled().apply(ds, prefix=prefix)
+
+# Explicit VRs whose length is a 4-byte field after 2 reserved bytes
+LONG_LENGTH_VRS = {b'OB', b'OD', b'OF', b'OL', b'OV', b'OW', b'SQ', b'SV', b'UC', b'UN', b'UR', b'UT', b'UV'}
+ITEM_TAG = 0xFFFEE000
+SEQUENCE_DELIMITER_TAG = 0xFFFEE0DD
+UNDEFINED_LENGTH = 0xFFFFFFFF
+TRAILING_PADDING_TAG = 0xFFFCFFFC
+
+def _element_end(src, offset, transfer_syntax):
+    """Returns the offset just past the data element starting at offset (Pixel Data after stop_before_pixels)."""
+    size = os.fstat(src.fileno()).st_size
+    if offset >= size:
+        return size
+    endian = '<' if transfer_syntax.is_little_endian else '>'
+    src.seek(offset)
+    header = src.read(12)
+    if transfer_syntax.is_implicit_VR:
+        length, position = struct.unpack(endian + 'L', header[4:8])[0], offset + 8
+    elif header[4:6] in LONG_LENGTH_VRS:
+        length, position = struct.unpack(endian + 'L', header[8:12])[0], offset + 12
+    else:
+        length, position = struct.unpack(endian + 'H', header[6:8])[0], offset + 8
+    if length != UNDEFINED_LENGTH:
+        return min(position + length, size)
+
+    # Encapsulated: items up to and including the sequence delimiter
+    while position + 8 <= size:
+        src.seek(position)
+        group, element, length = struct.unpack('<HHL', src.read(8))
+        position += 8
+        if (group << 16) | element == SEQUENCE_DELIMITER_TAG:
+            return position
+        position += length
+    return size
+
+def _split_pixel_data(src, ds, pixel_offset):
+    """
+    Finds where the Pixel Data element dcmread stopped at ends and reads the elements after it.
+
+    Elements stored after Pixel Data (private groups above 7FE0, signatures)
+    are moved into ds, so whatever de-identifies the header sees them too;
+    Data Set Trailing Padding is dropped.
+
+    Returns:
+        int: Offset just past the Pixel Data element.
+    """
+    transfer_syntax = UID(ds.file_meta.TransferSyntaxUID)
+    pixel_end = _element_end(src, pixel_offset, transfer_syntax)
+    if pixel_end < os.fstat(src.fileno()).st_size:
+        src.seek(pixel_end)
+        trailing = read_dataset(src, transfer_syntax.is_implicit_VR, transfer_syntax.is_little_endian)
+        for tag in trailing.keys():
+            if tag != TRAILING_PADDING_TAG:
+                ds[tag] = trailing.get_item(tag)
+    return pixel_end
+
+def _write_pixel_data(src, dst, ds, pixel_offset, pixel_end):
+    """
+    Writes ds, the Pixel Data element copied from src and the elements that follow it to dst.
+
+    Elements of ds tagged after Pixel Data are taken out of ds and encoded
+    after the copied element, keeping the file in tag order.
+    """
+    trailing = Dataset()
+    for tag in [tag for tag in ds.keys() if tag > 0x7FE00010]:
+        trailing[tag] = ds.get_item(tag)
+        del ds[tag]
+    ds.save_as(dst)
+    _copy_range(src, dst, pixel_offset, pixel_end)
+    if len(trailing):
+        transfer_syntax = UID(ds.file_meta.TransferSyntaxUID)
+        buffer = DicomBytesIO()
+        buffer.is_little_endian = transfer_syntax.is_little_endian
+        buffer.is_implicit_VR = transfer_syntax.is_implicit_VR
+        write_dataset(buffer, trailing)
+        dst.write(buffer.getvalue())
+
+def _copy_range(src, dst, start, stop):
+    """Copies bytes start to stop of src into dst through a read-only mmap."""
+    if start >= stop:
+        return
+    with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            dst.write(view[start:stop])
+        finally:
+            view.release()
+
+def anonymize_header(filepath, prefix, output_path):
+    """
+    Anonymizes only the header of a DICOM file.
+
+    The header is parsed with ``stop_before_pixels``, de-identified and
+    re-encoded; the Pixel Data element is copied byte for byte, so the cost
+    scales with header size rather than image size. Elements stored after
+    Pixel Data are anonymized with the header and written after it.
+
+    Args:
+        filepath (str): Path to the DICOM file to be anonymized.
+        prefix (str): Prefix to use for anonymized patient information.
+        output_path (str): Where to write the result.
+
+    Returns:
+        bool: False if the file cannot take the fast path (deflated transfer
+        syntax), in which case nothing is written.
+    """
+    with open(filepath, 'rb') as src:
+        ds = pydicom.dcmread(src, stop_before_pixels=True)
+        transfer_syntax = getattr(ds.file_meta, 'TransferSyntaxUID', None)
+        if transfer_syntax == DeflatedExplicitVRLittleEndian:
+            return False
+
+        # dcmread leaves the file positioned at the start of the Pixel Data tag
+        pixel_offset = src.tell()
+        pixel_end = _split_pixel_data(src, ds, pixel_offset)
+        _anonymize_dataset(ds, prefix)
+
+        with open(output_path, 'wb') as dst:
+            _write_pixel_data(src, dst, ds, pixel_offset, pixel_end)
+
+    return True
+
+def anonymize_file(filepath, prefix, output_path=None, header_only=True):
+    """
+    Anonymizes a DICOM file, raising on failure.
+
+    Args:
+        filepath (str): Path to the DICOM file to be anonymized.
+        prefix (str): Prefix to use for anonymized patient information.
+        output_path (str, optional): Where to write the result. Defaults to
+            ``anonymized_<name>`` next to the original.
+        header_only (bool): Use the header-only fast path when the transfer
+            syntax allows it, instead of reading and re-writing the whole file.
+
+    Returns:
+        str: Path of the anonymized file.
+    """
+    if output_path is None:
+        output_path = anonymized_path(filepath)
+
+    if header_only and anonymize_header(filepath, prefix, output_path):
+        return output_path
+
+    # Read the DICOM file
+    ds = pydicom.dcmread(filepath)
+    _anonymize_dataset(ds, prefix)
+
+    # Save the anonymized DICOM file
+    ds.save_as(output_path)
+
+    return output_path
 
 def anonymize_dicom(filepath, prefix):
     """
     Anonymizes a DICOM file by removing or modifying patient-specific information.
-    
+
     Args:
         filepath (str): Path to the DICOM file to be anonymized.
         prefix (str): Prefix to use for anonymized patient information.
-    
+
     Returns:
         bool: True if anonymization was successful, False otherwise.
     """
     try:
-        # Read the DICOM file
-        ds = pydicom.dcmread(filepath)
-        
-        # Anonymize patient information
-        ds.PatientName = f"{prefix}_Anonymous"
-        ds.PatientID = f"{prefix}_ID"
-        ds.PatientBirthDate = "19000101"
-        ds.PatientSex = "O"  # Other/Unknown
-        
-        # List of fields to anonymize
-        fields_to_remove = [
-            'InstitutionName',
-            'ReferringPhysicianName',
-            'StudyID',
-            'AccessionNumber',
-            'PhysiciansOfRecord',
-            'PerformingPhysicianName',
-            'OperatorsName'
-        ]
-        
-        # Remove identifiable information
-        for field in fields_to_remove:
-            if hasattr(ds, field):
-                delattr(ds, field)
-        
-        # Save the anonymized DICOM file
-        anonymized_filepath = os.path.join(os.path.dirname(filepath), 
-                                         f"anonymized_{os.path.basename(filepath)}")
-        ds.save_as(anonymized_filepath)
-        
+        anonymize_file(filepath, prefix)
         return True
     except Exception as e:
         print(f"Error anonymizing DICOM file: {str(e)}")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,362 @@
+"""Batch anonymization of DICOM directory trees.
+
+Runs without PyQt5 so it can be used headless on ingest nodes:
+
+    python dicom_batch.py /data/study --prefix SITE01 --output /data/anon --workers 8
+
+With ``--deidentify`` files go through a streaming read -> de-identify ->
+write pipeline instead: a tag profile (``dicom_deid``) is applied, UIDs are
+remapped consistently through a mapping store shared by the workers, and the
+output tree is laid out by the new Study/Series/SOP Instance UIDs:
+
+    python dicom_batch.py /data/study --prefix SITE01 --output /data/export --deidentify \
+        --profile site.json --mapping-store /secure/site01.sqlite
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import pydicom
+from pydicom.errors import InvalidDicomError
+from pydicom.uid import DeflatedExplicitVRLittleEndian
+
+from dicom_anonymizer import _split_pixel_data, _write_pixel_data, anonymize_file, anonymized_path
+from dicom_deid import DEFAULT_PROFILE, DeidProfile, MappingStore, deidentify_dataset
+from dicom_redact import redact_file, regions_for
+
+# stages maps a pipeline stage to the seconds this file spent in it
+FileResult = namedtuple('FileResult', ['path', 'output', 'status', 'error', 'size', 'seconds', 'stages'],
+                        defaults=(None,))
+STAGES = ['read', 'deidentify', 'write', 'redact']
+
+class BatchStats:
+    """Running totals for a batch job."""
+
+    def __init__(self, total=0):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.stage_seconds = {}
+        self.stage_files = {}
+        self.stage_bytes = {}
+        self.start = time.perf_counter()
+
+    def add(self, result):
+        self.done += 1
+        if result.status == 'ok':
+            self.bytes += result.size
+            for stage, seconds in (result.stages or {}).items():
+                self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+                self.stage_files[stage] = self.stage_files.get(stage, 0) + 1
+                self.stage_bytes[stage] = self.stage_bytes.get(stage, 0) + result.size
+        elif result.status == 'skipped':
+            self.skipped += 1
+        else:
+            self.failed += 1
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    @property
+    def files_per_sec(self):
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def mb_per_sec(self):
+        elapsed = self.elapsed
+        return self.bytes / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+
+    def stage_rates(self):
+        """Returns {stage: (files/s, MB/s)} for each pipeline stage, per worker."""
+        rates = {}
+        for stage, seconds in self.stage_seconds.items():
+            if seconds > 0:
+                rates[stage] = (self.stage_files[stage] / seconds,
+                                self.stage_bytes[stage] / (1024 * 1024) / seconds)
+        return rates
+
+    def summary(self):
+        text = (f"{self.done}/{self.total} files, {self.failed} failed, {self.skipped} skipped "
+                f"in {self.elapsed:.1f}s ({self.files_per_sec:.1f} files/s, "
+                f"{self.mb_per_sec:.1f} MB/s)")
+        for stage, (files, mb) in self.stage_rates().items():
+            text += f"\n  {stage:<10} {files:8.1f} files/s {mb:8.1f} MB/s per worker"
+        return text
+
+def find_dicom_files(root):
+    """Returns a sorted list of candidate files under root, skipping earlier outputs."""
+    if os.path.isfile(root):
+        return [root]
+
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.startswith('anonymized_'):
+                continue
+            paths.append(os.path.join(dirpath, name))
+    return paths
+
+def output_path_for(filepath, root, output_dir=None):
+    """Mirrors filepath under output_dir, or places the copy next to the original."""
+    if output_dir is None:
+        return anonymized_path(filepath)
+    if os.path.isfile(root):
+        root = os.path.dirname(root)
+    relative = os.path.relpath(os.path.dirname(filepath), root)
+    return anonymized_path(filepath, os.path.normpath(os.path.join(output_dir, relative)))
+
+def _anonymize_worker(filepath, output_path, prefix, header_only=True):
+    """Anonymizes one file inside a worker process and reports the outcome."""
+    start = time.perf_counter()
+    try:
+        size = os.path.getsize(filepath)
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        anonymize_file(filepath, prefix, output_path, header_only)
+        return FileResult(filepath, output_path, 'ok', None, size,
+                          time.perf_counter() - start)
+    except InvalidDicomError as e:
+        return FileResult(filepath, None, 'skipped', str(e), 0, time.perf_counter() - start)
+    except Exception as e:
+        return FileResult(filepath, None, 'error', str(e), 0, time.perf_counter() - start)
+
+def _bounded_results(executor, submit, items, max_in_flight):
+    """Submits submit(item) for each item, keeping at most max_in_flight pending, and yields results."""
+    pending = set()
+    for item in items:
+        pending.add(submit(item))
+        if len(pending) >= max_in_flight:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+def iter_batch_anonymize(paths, prefix, root, output_dir=None, workers=None, header_only=True):
+    """
+    Anonymizes files across a process pool, yielding results as they complete.
+
+    At most a few tasks per worker are in flight, so memory stays flat
+    regardless of how many files are queued.
+
+    Args:
+        paths (list): Files to anonymize.
+        prefix (str): Prefix to use for anonymized patient information.
+        root (str): Root the paths were collected from, used to mirror the tree.
+        output_dir (str, optional): Output root. Defaults to writing next to the originals.
+        workers (int, optional): Number of worker processes. Defaults to the CPU count.
+        header_only (bool): Rewrite only the header and copy pixel data unchanged.
+
+    Yields:
+        FileResult: One result per input file, in completion order.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from _bounded_results(
+            executor,
+            lambda filepath: executor.submit(_anonymize_worker, filepath,
+                                             output_path_for(filepath, root, output_dir), prefix,
+                                             header_only),
+            paths, workers * 4)
+
+# Profile and mapping store of a de-identification worker process, set by _init_deidentify_worker
+_deidentify_state = {}
+
+def _init_deidentify_worker(profile, store_path, prefix):
+    _deidentify_state['profile'] = profile
+    _deidentify_state['store'] = MappingStore(store_path)
+    _deidentify_state['prefix'] = prefix
+
+def deidentified_path(ds, output_dir):
+    """Returns <output_dir>/<StudyInstanceUID>/<SeriesInstanceUID>/<SOPInstanceUID>.dcm for a de-identified ds."""
+    parts = [str(ds.get(keyword) or 'unknown') for keyword in
+             ('StudyInstanceUID', 'SeriesInstanceUID', 'SOPInstanceUID')]
+    return os.path.join(output_dir, parts[0], parts[1], f"{parts[2]}.dcm")
+
+def _deidentify_worker(filepath, output_dir):
+    """
+    Runs one file through read -> de-identify -> write inside a worker process.
+
+    Only the header is parsed; the Pixel Data element is copied byte for byte
+    through a memory map, so memory use does not depend on the file size.
+    Elements stored after Pixel Data are de-identified with the header.
+    Deflated files are read and written whole.
+    Burned-in regions matched by the profile are blanked in the written copy
+    before it is renamed into place.
+    """
+    state = _deidentify_state
+    start = time.perf_counter()
+    stages = {}
+    try:
+        size = os.path.getsize(filepath)
+        with open(filepath, 'rb') as src:
+            ds = pydicom.dcmread(src, stop_before_pixels=True)
+            # dcmread leaves the file positioned at the start of the Pixel Data tag
+            pixel_offset = src.tell()
+            if getattr(ds.file_meta, 'TransferSyntaxUID', None) == DeflatedExplicitVRLittleEndian:
+                ds = pydicom.dcmread(filepath)
+                pixel_offset = None
+            else:
+                pixel_end = _split_pixel_data(src, ds, pixel_offset)
+            read_done = time.perf_counter()
+            stages['read'] = read_done - start
+
+            # Matched before the profile removes Manufacturer and friends
+            regions = regions_for(ds, state['profile'].redact) if 'Rows' in ds else []
+            deidentify_dataset(ds, state['profile'], state['store'], state['prefix'])
+            if regions:
+                ds.BurnedInAnnotation = 'NO'
+            deidentify_done = time.perf_counter()
+            stages['deidentify'] = deidentify_done - read_done
+
+            output_path = deidentified_path(ds, output_dir)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            # Written under a unique name and renamed, so a crash never leaves a truncated file
+            partial = f"{output_path}.{uuid.uuid4().hex}.partial"
+            try:
+                with open(partial, 'wb') as dst:
+                    if pixel_offset is not None:
+                        _write_pixel_data(src, dst, ds, pixel_offset, pixel_end)
+                    else:
+                        ds.save_as(dst)
+                write_done = time.perf_counter()
+                stages['write'] = write_done - deidentify_done
+                if regions:
+                    redact_file(partial, regions)
+                    stages['redact'] = time.perf_counter() - write_done
+                os.replace(partial, output_path)
+            except BaseException:
+                if os.path.exists(partial):
+                    os.remove(partial)
+                raise
+        return FileResult(filepath, output_path, 'ok', None, size, time.perf_counter() - start, stages)
+    except InvalidDicomError as e:
+        return FileResult(filepath, None, 'skipped', str(e), 0, time.perf_counter() - start)
+    except Exception as e:
+        return FileResult(filepath, None, 'error', str(e), 0, time.perf_counter() - start)
+
+def iter_batch_deidentify(paths, prefix, output_dir, profile=None, store_path=None, workers=None):
+    """
+    De-identifies files into output_dir across a process pool, yielding results as they complete.
+
+    Args:
+        paths (list): Files to de-identify.
+        prefix (str): Substituted for ``{prefix}`` in the profile's replacement values.
+        output_dir (str): Root of the output tree.
+        profile (DeidProfile, optional): Rules to apply. Defaults to DEFAULT_PROFILE.
+        store_path (str, optional): Mapping store shared by the workers.
+            Defaults to DEFAULT_MAPPING_STORE.
+        workers (int, optional): Number of worker processes. Defaults to the CPU count.
+
+    Yields:
+        FileResult: One result per input file, in completion order, with
+        per-stage timings for files written.
+    """
+    workers = workers or os.cpu_count() or 1
+    profile = profile or DEFAULT_PROFILE
+    # Created once up front so the workers do not race to set up the schema
+    MappingStore(store_path).close()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_deidentify_worker,
+                             initargs=(profile, store_path, prefix)) as executor:
+        yield from _bounded_results(
+            executor, lambda filepath: executor.submit(_deidentify_worker, filepath, output_dir),
+            paths, workers * 4)
+
+def batch_anonymize(root, prefix, output_dir=None, workers=None, progress=None, header_only=True):
+    """
+    Anonymizes every DICOM file under root.
+
+    Args:
+        root (str): File or directory to process.
+        prefix (str): Prefix to use for anonymized patient information.
+        output_dir (str, optional): Output root. Defaults to writing next to the originals.
+        workers (int, optional): Number of worker processes. Defaults to the CPU count.
+        progress (callable, optional): Called with (result, stats) after every file.
+        header_only (bool): Rewrite only the header and copy pixel data unchanged.
+
+    Returns:
+        BatchStats: Totals and throughput for the job.
+    """
+    paths = find_dicom_files(root)
+    stats = BatchStats(len(paths))
+    for result in iter_batch_anonymize(paths, prefix, root, output_dir, workers, header_only):
+        stats.add(result)
+        if progress is not None:
+            progress(result, stats)
+    return stats
+
+def batch_deidentify(root, prefix, output_dir, profile=None, store_path=None, workers=None, progress=None):
+    """
+    De-identifies every DICOM file under root into output_dir.
+
+    Args:
+        root (str): File or directory to process.
+        prefix (str): Substituted for ``{prefix}`` in the profile's replacement values.
+        output_dir (str): Root of the output tree.
+        profile (DeidProfile, optional): Rules to apply. Defaults to DEFAULT_PROFILE.
+        store_path (str, optional): Mapping store shared by the workers.
+        workers (int, optional): Number of worker processes. Defaults to the CPU count.
+        progress (callable, optional): Called with (result, stats) after every file.
+
+    Returns:
+        BatchStats: Totals, throughput and per-stage throughput for the job.
+    """
+    paths = find_dicom_files(root)
+    stats = BatchStats(len(paths))
+    for result in iter_batch_deidentify(paths, prefix, output_dir, profile, store_path, workers):
+        stats.add(result)
+        if progress is not None:
+            progress(result, stats)
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Anonymize a tree of DICOM files.")
+    parser.add_argument('root', help="DICOM file or directory to anonymize")
+    parser.add_argument('--prefix', required=True, help="Prefix for anonymized patient information")
+    parser.add_argument('--output', help="Output directory (default: next to the originals)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--full-rewrite', action='store_true',
+                        help="Decode and re-write the whole file instead of only the header")
+    parser.add_argument('--deidentify', action='store_true',
+                        help="Apply a de-identification profile and remap UIDs (needs --output)")
+    parser.add_argument('--profile', help="De-identification profile JSON (default: built-in basic profile)")
+    parser.add_argument('--mapping-store', help="UID and date shift mapping store shared across runs")
+    parser.add_argument('--quiet', action='store_true', help="Only print errors and the summary")
+    args = parser.parse_args(argv)
+    if args.deidentify and not args.output:
+        parser.error("--deidentify needs --output")
+
+    def report(result, stats):
+        if result.status == 'error':
+            print(f"ERROR {result.path}: {result.error}", file=sys.stderr)
+        elif result.status == 'skipped' and not args.quiet:
+            print(f"SKIP  {result.path}: not a DICOM file", file=sys.stderr)
+        if not args.quiet and (stats.done % 100 == 0 or stats.done == stats.total):
+            print(f"[{stats.done}/{stats.total}] {stats.files_per_sec:.1f} files/s, "
+                  f"{stats.mb_per_sec:.1f} MB/s")
+
+    if args.deidentify:
+        profile = DeidProfile.load(args.profile) if args.profile else None
+        stats = batch_deidentify(args.root, args.prefix, args.output, profile, args.mapping_store,
+                                 args.workers, report)
+    else:
+        stats = batch_anonymize(args.root, args.prefix, args.output, args.workers, report,
+                                header_only=not args.full_rewrite)
+    print(stats.summary())
+    return 1 if stats.failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
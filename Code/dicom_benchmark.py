@@ -0,0 +1,743 @@
+"""Benchmarks for the DICOM Viewer hot paths.
+
+    python dicom_benchmark.py anonymize --frames 200 --rows 512 --cols 512
+    python dicom_benchmark.py mpr --slices 1000 --rows 512 --cols 512
+    python dicom_benchmark.py decode --frames 120 --rows 512 --cols 512
+    python dicom_benchmark.py deid --elements 100 1000 10000
+    python dicom_benchmark.py trace --calls 1000000
+    python dicom_benchmark.py startup --budget-ms 500
+    python dicom_benchmark.py suite --json results.json --compare baseline.json
+
+``suite`` generates synthetic datasets (a single frame, a 1000-frame cine, a
+file with a large private-tag header and a 2000-file series) and times the
+viewer's own code paths on them headlessly, with Qt on its offscreen platform
+and matplotlib on Agg. Results are written as JSON; ``--compare`` reports
+the change against an earlier run and exits with status 1 on regressions.
+"""
+import argparse
+import contextlib
+import copy
+import functools
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pydicom
+
+import dicom_trace
+from dicom_anonymizer import anonymize_file
+from dicom_cache import FrameCache
+from dicom_deid import DEFAULT_PROFILE, MappingStore, _is_registered, _shift_date
+from dicom_frames import FRAME_DEFER_SIZE, decode_frames, open_frames
+from dicom_lut import WindowLevelLUT
+from dicom_synthetic import (make_header, make_header_file, make_jpeg2000_multiframe, make_multiframe,
+                             make_series, make_single_frame)
+from dicom_volume import Volume
+
+def _time(func, repeat):
+    """Returns the best wall time of func over repeat runs, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_anonymize(workdir, frames=200, rows=512, cols=512, repeat=5):
+    """Compares header-only anonymization with the full read/write path."""
+    source = make_multiframe(os.path.join(workdir, 'cine.dcm'), frames, rows, cols)
+    output = os.path.join(workdir, 'anonymized_cine.dcm')
+    size_mb = os.path.getsize(source) / (1024 * 1024)
+
+    full = _time(lambda: anonymize_file(source, 'BENCH', output, header_only=False), repeat)
+    header = _time(lambda: anonymize_file(source, 'BENCH', output, header_only=True), repeat)
+    return {
+        'file_mb': round(size_mb, 1),
+        'full_rewrite_s': full,
+        'header_only_s': header,
+        'speedup': full / header if header > 0 else float('inf'),
+    }
+
+def bench_mpr(workdir, slices=1000, rows=512, cols=512, moves=50, seed=0):
+    """
+    Times a crosshair move in the MPR view: all three planes re-windowed from a memory-mapped volume.
+
+    Returns:
+        dict: Volume size and mean/max milliseconds per move and per plane.
+    """
+    rng = np.random.default_rng(seed)
+    path = os.path.join(workdir, 'volume.npy')
+    array = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint16, shape=(slices, rows, cols))
+    for start in range(0, slices, 64):
+        stop = min(start + 64, slices)
+        array[start:stop] = rng.integers(0, 4096, size=(stop - start, rows, cols), dtype=np.uint16)
+    array.flush()
+    volume = Volume(np.load(path, mmap_mode='r'), (1.0, 0.7, 0.7))
+    lut = WindowLevelLUT(None, np.uint16, center=2048, width=4096)
+    lut.apply(volume.plane(0, 0))
+
+    per_plane = [[], [], []]
+    per_move = []
+    for _ in range(moves):
+        position = [int(rng.integers(0, size)) for size in volume.shape]
+        move_start = time.perf_counter()
+        for axis in range(3):
+            start = time.perf_counter()
+            lut.apply(volume.plane(axis, position[axis]))
+            per_plane[axis].append(time.perf_counter() - start)
+        per_move.append(time.perf_counter() - move_start)
+    del volume, array
+    return {
+        'volume_mb': round(slices * rows * cols * 2 / (1024 * 1024), 1),
+        'move_mean_ms': float(np.mean(per_move)) * 1000,
+        'move_max_ms': float(np.max(per_move)) * 1000,
+        'plane_mean_ms': [float(np.mean(times)) * 1000 for times in per_plane],
+    }
+
+def _worker_counts(limit):
+    """Returns 1, 2, 4, ... up to limit, always including limit itself."""
+    counts = []
+    count = 1
+    while count < limit:
+        counts.append(count)
+        count *= 2
+    return counts + [limit]
+
+def bench_decode(workdir, frames=120, rows=512, cols=512, max_workers=None, repeat=3):
+    """
+    Times decoding every frame of a JPEG 2000 multi-frame file against the number of workers.
+
+    The frame cache is disabled so every run decodes. Thread and process
+    pools are both measured; ``pixel_array`` is the single-threaded baseline.
+
+    Returns:
+        dict: Baseline seconds and a list of (pool, workers, seconds, speedup) rows.
+    """
+    source = make_jpeg2000_multiframe(os.path.join(workdir, 'j2k_cine.dcm'), frames, rows, cols)
+    baseline = _time(lambda: pydicom.dcmread(source).pixel_array, repeat)
+    accessor = open_frames(pydicom.dcmread(source, defer_size=FRAME_DEFER_SIZE),
+                           frame_cache=FrameCache(memory_bytes=0, directory=None))
+    out = np.empty((frames, rows, cols), dtype=np.uint16)
+    rows_out = []
+    try:
+        for pool in ('thread', 'process'):
+            for workers in _worker_counts(max_workers or os.cpu_count() or 1):
+                seconds = _time(lambda: decode_frames(accessor, out=out, workers=workers, pool=pool), repeat)
+                rows_out.append((pool, workers, seconds, baseline / seconds))
+    finally:
+        accessor.close()
+    return {
+        'file_mb': round(os.path.getsize(source) / (1024 * 1024), 1),
+        'cpu_count': os.cpu_count(),
+        'pixel_array_s': baseline,
+        'runs': rows_out,
+    }
+
+def _keyword_loop(ds, profile, store, prefix):
+    """The per-keyword approach the action table replaced: one lookup per rule, then separate passes."""
+    days = profile.date_shift_days or 0
+    uid_keywords = set()
+    for keyword, (action, value) in profile.rules.items():
+        if not hasattr(ds, keyword):
+            continue
+        if action == 'remove':
+            delattr(ds, keyword)
+        elif action == 'empty':
+            ds[keyword].value = [] if ds[keyword].VR == 'SQ' else ''
+        elif action == 'replace':
+            ds[keyword].value = value.format(prefix=prefix)
+        elif action == 'shift' and days:
+            ds[keyword].value = _shift_date(ds[keyword].value, days)
+        elif action == 'uid':
+            uid_keywords.add(keyword)
+    if profile.remove_private:
+        ds.remove_private_tags()
+    elements = [elem for elem in ds.iterall() if elem.VR == 'UI' and elem.value
+                and (elem.keyword in uid_keywords or not _is_registered(str(elem.value)))]
+    replacements = store.remap([str(elem.value) for elem in elements])
+    for elem in elements:
+        elem.value = replacements[str(elem.value)]
+
+def bench_deid(workdir, sizes=(100, 1000, 10000), copies=20):
+    """
+    Times de-identifying headers of increasing size with the compiled action table.
+
+    Each header is a mix of standard, private and nested sequence elements
+    (see make_header). The per-keyword loop the table replaced is timed on
+    the same headers for comparison.
+
+    Returns:
+        list: (elements, table µs/file, table ns/element, loop µs/file) per size.
+    """
+    store = MappingStore(os.path.join(workdir, 'deid_map.sqlite'))
+    compiled = DEFAULT_PROFILE.compiled()
+    results = []
+    try:
+        for size in sizes:
+            header = make_header(size)
+            # Warm the UID map so both approaches only pay for in-process lookups
+            compiled.apply(copy.deepcopy(header), store, 'BENCH')
+            table = _time_each(lambda ds: compiled.apply(ds, store, 'BENCH'), header, copies)
+            loop = _time_each(lambda ds: _keyword_loop(ds, DEFAULT_PROFILE, store, 'BENCH'), header, copies)
+            count = sum(1 for _ in header.iterall())
+            results.append((count, table * 1e6, table * 1e9 / count, loop * 1e6))
+    finally:
+        store.close()
+    return results
+
+def _time_each(func, header, copies):
+    """Returns the mean seconds of func over fresh deep copies of header."""
+    datasets = [copy.deepcopy(header) for _ in range(copies)]
+    start = time.perf_counter()
+    for ds in datasets:
+        func(ds)
+    return (time.perf_counter() - start) / copies
+
+def bench_trace(calls=1000000, frames=100, rows=512, cols=512):
+    """
+    Measures what tracing costs: per span, and on windowing real frames.
+
+    Returns:
+        dict: ns per empty span with recording off and on, and ms per
+        windowed frame with tracing off and on.
+    """
+    def spans():
+        for _ in range(calls):
+            with dicom_trace.span('bench', 'bench'):
+                pass
+
+    def empty():
+        for _ in range(calls):
+            pass
+
+    rng = np.random.default_rng(0)
+    stack = rng.integers(0, 4096, size=(frames, rows, cols), dtype=np.uint16)
+    lut = WindowLevelLUT(None, np.uint16, center=2048, width=4096)
+
+    def window():
+        for frame in stack:
+            lut.apply(frame)
+
+    was_recording = dicom_trace.is_recording()
+    dicom_trace.disable()
+    try:
+        baseline = _time(empty, 3)
+        off = _time(spans, 3)
+        window_off = _time(window, 3)
+        dicom_trace.enable(events=True)
+        on = _time(spans, 1)
+        window_on = _time(window, 3)
+    finally:
+        dicom_trace.disable()
+        dicom_trace.clear()
+        if was_recording:
+            dicom_trace.enable()
+    return {
+        'span_off_ns': (off - baseline) * 1e9 / calls,
+        'span_on_ns': (on - baseline) * 1e9 / calls,
+        'window_off_ms': window_off * 1000 / frames,
+        'window_on_ms': window_on * 1000 / frames,
+    }
+
+# Time from launching the interpreter to the main window being shown that startup must stay under
+STARTUP_BUDGET_MS = 500
+# Launches the viewer like Main (1).py, but exits once the window is up
+STARTUP_SCRIPT = """
+import os, sys, time
+start = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+from dicom_viewer import DICOMViewer
+viewer = DICOMViewer()
+viewer.show()
+app.processEvents()
+sys.stdout.write(f"{(time.perf_counter() - start) * 1000}\\n")
+sys.stdout.flush()
+os._exit(0)
+"""
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def parse_importtime(text):
+    """Returns [(module, self us, cumulative us, depth)] from python -X importtime output."""
+    rows = []
+    for line in text.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2)),
+                         len(match.group(3)) // 2))
+    return rows
+
+def bench_startup(repeat=5, top=15, budget_ms=STARTUP_BUDGET_MS):
+    """
+    Times launching the viewer to its first shown window, in fresh interpreters.
+
+    Each run starts ``python -X importtime`` on the offscreen Qt platform with
+    background pre-loading off, so only what startup itself imports is counted.
+
+    Returns:
+        dict: first/best/median wall ms to the window, the in-process part,
+        import ms of the viewer's top-level modules, the slowest imports by
+        cumulative time and whether the best run met budget_ms.
+    """
+    env = dict(os.environ, DICOM_VIEWER_PRELOAD='0')
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    code_dir = os.path.dirname(os.path.abspath(__file__))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [code_dir, env.get('PYTHONPATH')]))
+    wall, in_process, imports = [], [], None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT], cwd=code_dir,
+                                env=env, capture_output=True, text=True)
+        wall.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"Viewer failed to start: {result.stderr.strip()[-500:]}")
+        in_process.append(float(result.stdout.split()[-1]))
+        imports = parse_importtime(result.stderr)
+
+    top_level = {module: cumulative for module, _, cumulative, depth in imports if depth == 0}
+    slowest = sorted(imports, key=lambda row: row[2], reverse=True)[:top]
+    return {
+        'first_window_ms': {'first': wall[0], 'best': min(wall), 'median': statistics.median(wall)},
+        'in_process_ms': statistics.median(in_process),
+        'import_ms': sum(top_level.values()) / 1000,
+        'top_level_ms': {module: us / 1000 for module, us in top_level.items()},
+        'slowest_imports': [{'module': module, 'self_ms': own / 1000, 'cumulative_ms': cumulative / 1000}
+                            for module, own, cumulative, _ in slowest],
+        'budget_ms': budget_ms,
+        'within_budget': min(wall) <= budget_ms,
+    }
+
+def _summary(runs):
+    """Returns the first (cold), best and median of a list of wall times."""
+    return {'first_s': runs[0], 'best_s': min(runs), 'median_s': statistics.median(runs), 'runs': len(runs)}
+
+def _measure(func, repeat):
+    """Returns the first (cold), best and median wall time of func over repeat runs."""
+    runs = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return _summary(runs)
+
+def _run_loader(app, loader, names):
+    """
+    Runs one of the viewer's loader threads to the end.
+
+    Returns:
+        tuple: ({signal name: seconds from start to its emission}, {signal name: its arguments}).
+    """
+    from PyQt5.QtCore import Qt
+
+    times, emitted = {}, {}
+
+    def record(name, *args):
+        times[name] = time.perf_counter() - start
+        emitted[name] = args
+    for name in names:
+        # Timed on the loader's thread, as it emits rather than as the event loop delivers
+        getattr(loader, name).connect(functools.partial(record, name), Qt.DirectConnection)
+    loader.failed.connect(functools.partial(record, 'failed'), Qt.DirectConnection)
+    start = time.perf_counter()
+    loader.start()
+    loader.wait()
+    app.processEvents()
+    if 'failed' in emitted:
+        raise RuntimeError(emitted['failed'][0])
+    return times, emitted
+
+def _headless():
+    """Puts Qt on its offscreen platform and matplotlib on Agg, and returns the QApplication."""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    import matplotlib
+    matplotlib.use('Agg')
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+class _Replaced:
+    """Context manager swapping an attribute of obj for the duration of a benchmark."""
+
+    def __init__(self, obj, name, value):
+        self.obj, self.name, self.value = obj, name, value
+
+    def __enter__(self):
+        self.original = getattr(self.obj, self.name)
+        setattr(self.obj, self.name, self.value)
+
+    def __exit__(self, *exc_info):
+        setattr(self.obj, self.name, self.original)
+
+def _close_figures():
+    """Closes every matplotlib figure the way closing its window would, stopping mosaic prefetch."""
+    import matplotlib.pyplot as plt
+    from matplotlib.backend_bases import CloseEvent
+
+    for number in plt.get_fignums():
+        canvas = plt.figure(number).canvas
+        canvas.callbacks.process('close_event', CloseEvent('close_event', canvas))
+    plt.close('all')
+
+def _render_first_frame(app, viewer, ds, frames):
+    """Shows frames through the viewer's own display dispatch and draws the first frame."""
+    import matplotlib.pyplot as plt
+
+    viewer.image_window = None
+    viewer.show_image(ds, frames)
+    for number in plt.get_fignums():
+        plt.figure(number).canvas.draw()
+    if viewer.image_window is not None:
+        viewer.image_window.grab()
+        viewer.image_window.close()
+    app.processEvents()
+    _close_figures()
+
+SEARCH_QUERIES = ['patient', '(0009,0000)-(0009,ffff)', 're:^Synthetic']
+
+def _bench_file(app, viewer, path, repeat):
+    """Times the per-file paths of the viewer on path; returns {path name: timings}."""
+    import dicom_tags
+    from dicom_anonymizer import anonymize_dicom
+    from dicom_display import display_tags
+    from dicom_loader import FileLoaderThread
+    from dicom_tag_groups import GROUPS, TagGroupIndex
+    from dicom_tag_model import DicomTagModel
+    from dicom_tags import TagViewerWindow
+
+    results = {}
+    # The viewer's own load: header, then frames ready to display, then prefetched
+    stages = ('header_loaded', 'ready', 'loaded')
+    runs = {name: [] for name in stages}
+    for _ in range(max(1, repeat)):
+        times, emitted = _run_loader(app, FileLoaderThread(path), stages)
+        for name in stages:
+            runs[name].append(times[name])
+        emitted['ready'][1].close()
+    for name in stages:
+        results[f"loader_{name}"] = _summary(runs[name])
+    _, emitted = _run_loader(app, FileLoaderThread(path), ('ready',))
+    ds, frames = emitted['ready']
+
+    results['display_tags'] = _measure(lambda: display_tags(ds), repeat)
+    groups = GROUPS
+    results['tag_groups_index'] = _measure(lambda: TagGroupIndex(ds), repeat)
+    viewer.group_index = None
+    results['get_group_tags'] = _measure(lambda: [viewer.get_group_tags(ds, group) for group in groups], repeat)
+    results['anonymize_dicom'] = _measure(lambda: anonymize_dicom(path, 'BENCH'), repeat)
+
+    window = TagViewerWindow(ds)
+    window.index_thread.wait()
+    app.processEvents()
+
+    def search():
+        for query in SEARCH_QUERIES:
+            window.search_entry.blockSignals(True)
+            window.search_entry.setText(query)
+            window.search_entry.blockSignals(False)
+            window.matches = None
+            window.search()
+    results['search'] = _measure(search, repeat)
+    window.close()
+
+    window = TagViewerWindow(ds)
+    window.index_thread.wait()
+    app.processEvents()
+    model = window.model
+    model.fetch_all()
+    row = next(row for row in range(model.rowCount())
+               if model.index(row, 0).internalPointer().element.keyword == 'PatientID')
+    edit = model.index(row, DicomTagModel.VALUE_COLUMN)
+    edits = iter(range(1 << 30))
+
+    def save():
+        model.setData(edit, f"BENCH{next(edits)}")
+        window.save_current_changes()
+    # Success and failure are reported in message boxes, which would block without a user
+    with _Replaced(dicom_tags.QMessageBox, 'information', staticmethod(lambda *args: None)), \
+            _Replaced(dicom_tags.QMessageBox, 'critical', staticmethod(lambda *args: None)):
+        results['save_current_changes'] = _measure(save, repeat)
+    window.close()
+
+    # The viewer reports what it displays on stdout, which carries the results table
+    with contextlib.redirect_stdout(sys.stderr):
+        results['render_first_frame'] = _measure(lambda: _render_first_frame(app, viewer, ds, frames), repeat)
+    frames.close()
+    return results
+
+def _bench_series(app, viewer, directory, repeat):
+    """Times cataloguing, assembling, loading and displaying a series of single-slice files."""
+    import dicom_catalog
+    from dicom_catalog import SeriesCatalog
+    from dicom_loader import SeriesLoaderThread
+    from dicom_volume import build_volume
+
+    results = {}
+    scans = iter(range(1 << 30))
+
+    def scan():
+        # A fresh catalog every run, so every header is parsed
+        catalog = SeriesCatalog(os.path.join(directory, f"catalog_{next(scans)}.sqlite"))
+        try:
+            catalog.scan(directory)
+        finally:
+            catalog.close()
+    results['catalog_scan'] = _measure(scan, repeat)
+
+    catalog = SeriesCatalog(os.path.join(directory, 'catalog_rescan.sqlite'))
+    try:
+        catalog.scan(directory)
+        results['catalog_rescan'] = _measure(lambda: catalog.scan(directory), repeat)
+        series_uid = catalog.series(directory)[0].series_uid
+        ordered = catalog.instances(series_uid, directory)
+    finally:
+        catalog.close()
+
+    results['build_volume'] = _measure(lambda: build_volume(ordered, cache_dir=None), repeat)
+
+    # The viewer's own load of the chosen series, reading the catalog scanned above;
+    # the first run builds the volume, later ones find it in the volume cache
+    with _Replaced(dicom_catalog, 'DEFAULT_CATALOG', os.path.join(directory, 'catalog_rescan.sqlite')), \
+            contextlib.redirect_stdout(sys.stderr):
+        runs = []
+        for _ in range(max(1, repeat)):
+            times, emitted = _run_loader(app, SeriesLoaderThread(directory, series_uid), ('loaded',))
+            runs.append(times['loaded'])
+    results['series_loader'] = _summary(runs)
+    ds, _, volume = emitted['loaded']
+    with contextlib.redirect_stdout(sys.stderr):
+        results['render_first_frame'] = _measure(lambda: _render_first_frame(app, viewer, ds, volume), repeat)
+    return results
+
+def bench_suite(workdir, rows=512, cols=512, cine_frames=1000, cine_size=256, header_elements=20000,
+                series_files=2000, series_size=128, repeat=3, progress=None):
+    """
+    Generates the synthetic datasets and times every viewer hot path on them.
+
+    Args:
+        workdir (str): Scratch folder for the datasets and outputs.
+        rows, cols (int): Size of the single-frame image.
+        cine_frames, cine_size (int): Frames and square frame size of the cine.
+        header_elements (int): Elements in the large-header file (a third private).
+        series_files, series_size (int): Files and square slice size of the series.
+        repeat (int): Runs per path; the first one is reported separately as cold.
+        progress (callable): Called with a description of each step.
+
+    Returns:
+        dict: 'meta' (environment and dataset sizes), 'results', mapping
+        'dataset/path' to first/best/median seconds, and 'startup' (see
+        bench_startup, including the slowest imports).
+    """
+    progress = progress or (lambda message: None)
+    # Measured first, in fresh interpreters, before this process has imported the viewer
+    progress("Timing startup")
+    startup = bench_startup(repeat)
+    app = _headless()
+    with contextlib.redirect_stdout(sys.stderr):
+        from dicom_viewer import DICOMViewer
+
+    progress("Generating datasets")
+    start = time.perf_counter()
+    files = {
+        'single': make_single_frame(os.path.join(workdir, 'single.dcm'), rows, cols),
+        'cine': make_multiframe(os.path.join(workdir, 'cine.dcm'), cine_frames, cine_size, cine_size),
+        'private_header': make_header_file(os.path.join(workdir, 'private_header.dcm'), header_elements),
+    }
+    series_dir = os.path.join(workdir, 'series')
+    series_paths = make_series(series_dir, series_files, series_size, series_size)
+    generate_s = time.perf_counter() - start
+
+    viewer = DICOMViewer()
+    results = {}
+    try:
+        for name, path in files.items():
+            progress(f"Timing {name}")
+            for key, timing in _bench_file(app, viewer, path, repeat).items():
+                results[f"{name}/{key}"] = timing
+        progress("Timing series")
+        for key, timing in _bench_series(app, viewer, series_dir, repeat).items():
+            results[f"series/{key}"] = timing
+    finally:
+        viewer.close()
+        _close_figures()
+
+    window = startup['first_window_ms']
+    results['startup/first_window'] = {'first_s': window['first'] / 1000, 'best_s': window['best'] / 1000,
+                                       'median_s': window['median'] / 1000, 'runs': max(1, repeat)}
+    results['startup/imports'] = {'first_s': startup['import_ms'] / 1000, 'best_s': startup['import_ms'] / 1000,
+                                  'median_s': startup['import_ms'] / 1000, 'runs': 1}
+
+    datasets = {name: {'file_mb': round(os.path.getsize(path) / (1024 * 1024), 2)} for name, path in files.items()}
+    datasets['single'].update(rows=rows, cols=cols)
+    datasets['cine'].update(frames=cine_frames, rows=cine_size, cols=cine_size)
+    datasets['private_header']['elements'] = header_elements
+    datasets['series'] = {'files': series_files, 'rows': series_size, 'cols': series_size,
+                          'total_mb': round(sum(os.path.getsize(path) for path in series_paths) / (1024 * 1024), 1)}
+    meta = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pydicom': pydicom.__version__,
+        'repeat': repeat,
+        'generate_s': generate_s,
+        'datasets': datasets,
+    }
+    return {'meta': meta, 'results': results, 'startup': startup}
+
+def compare_results(baseline, current, threshold=0.1):
+    """
+    Compares the best times of two suite runs.
+
+    Returns:
+        list: (path, baseline s, current s, relative change, regressed) for
+        every path in both runs; regressed means slower by more than threshold.
+    """
+    rows = []
+    for key, timing in current['results'].items():
+        if key not in baseline['results']:
+            continue
+        before, after = baseline['results'][key]['best_s'], timing['best_s']
+        change = (after - before) / before if before > 0 else 0.0
+        rows.append((key, before, after, change, change > threshold))
+    return rows
+
+def _print_startup(result):
+    window = result['first_window_ms']
+    status = 'within' if result['within_budget'] else 'OVER'
+    print(f"First window: best {window['best']:.0f} ms, median {window['median']:.0f} ms, "
+          f"cold {window['first']:.0f} ms ({status} the {result['budget_ms']:.0f} ms budget)")
+    print(f"In process:   {result['in_process_ms']:.0f} ms, of which imports {result['import_ms']:.0f} ms")
+    print(f"{'module':<40} {'self ms':>8} {'cumul ms':>9}")
+    for row in result['slowest_imports']:
+        print(f"{row['module']:<40} {row['self_ms']:>8.1f} {row['cumulative_ms']:>9.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DICOM Viewer hot paths.")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    anonymize_parser = subparsers.add_parser('anonymize', help="Header-only vs full anonymization")
+    anonymize_parser.add_argument('--frames', type=int, default=200)
+    anonymize_parser.add_argument('--rows', type=int, default=512)
+    anonymize_parser.add_argument('--cols', type=int, default=512)
+    anonymize_parser.add_argument('--repeat', type=int, default=5)
+
+    mpr_parser = subparsers.add_parser('mpr', help="MPR crosshair update on a memory-mapped volume")
+    mpr_parser.add_argument('--slices', type=int, default=1000)
+    mpr_parser.add_argument('--rows', type=int, default=512)
+    mpr_parser.add_argument('--cols', type=int, default=512)
+    mpr_parser.add_argument('--moves', type=int, default=50)
+
+    decode_parser = subparsers.add_parser('decode', help="Parallel JPEG 2000 frame decoding vs worker count")
+    decode_parser.add_argument('--frames', type=int, default=120)
+    decode_parser.add_argument('--rows', type=int, default=512)
+    decode_parser.add_argument('--cols', type=int, default=512)
+    decode_parser.add_argument('--max-workers', type=int, default=None,
+                               help="Largest worker count to try (default: CPU count)")
+    decode_parser.add_argument('--repeat', type=int, default=3)
+
+    deid_parser = subparsers.add_parser('deid', help="De-identification action table vs header size")
+    deid_parser.add_argument('--elements', type=int, nargs='+', default=[100, 1000, 10000])
+    deid_parser.add_argument('--copies', type=int, default=20)
+
+    startup_parser = subparsers.add_parser('startup', help="Time to the first viewer window, with import times")
+    startup_parser.add_argument('--repeat', type=int, default=5)
+    startup_parser.add_argument('--top', type=int, default=15, help="Slowest imports to list")
+    startup_parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+    startup_parser.add_argument('--json', help="Write the results to this file")
+
+    trace_parser = subparsers.add_parser('trace', help="Cost of tracing spans, off and on")
+    trace_parser.add_argument('--calls', type=int, default=1000000)
+    trace_parser.add_argument('--frames', type=int, default=100)
+
+    suite_parser = subparsers.add_parser('suite', help="Every viewer hot path on synthetic datasets, as JSON")
+    suite_parser.add_argument('--json', help="Write the results to this file")
+    suite_parser.add_argument('--compare', help="Earlier results to compare against")
+    suite_parser.add_argument('--threshold', type=float, default=0.1,
+                              help="Relative slowdown reported as a regression (default: 0.1)")
+    suite_parser.add_argument('--repeat', type=int, default=3)
+    suite_parser.add_argument('--rows', type=int, default=512)
+    suite_parser.add_argument('--cols', type=int, default=512)
+    suite_parser.add_argument('--cine-frames', type=int, default=1000)
+    suite_parser.add_argument('--cine-size', type=int, default=256)
+    suite_parser.add_argument('--header-elements', type=int, default=20000)
+    suite_parser.add_argument('--series-files', type=int, default=2000)
+    suite_parser.add_argument('--series-size', type=int, default=128)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='dicom_bench_')
+    try:
+        if args.benchmark == 'anonymize':
+            result = bench_anonymize(workdir, args.frames, args.rows, args.cols, args.repeat)
+            print(f"File size:    {result['file_mb']} MB")
+            print(f"Full rewrite: {result['full_rewrite_s'] * 1000:.1f} ms")
+            print(f"Header only:  {result['header_only_s'] * 1000:.1f} ms")
+            print(f"Speedup:      {result['speedup']:.1f}x")
+        elif args.benchmark == 'mpr':
+            result = bench_mpr(workdir, args.slices, args.rows, args.cols, args.moves)
+            print(f"Volume:       {result['volume_mb']} MB")
+            print(f"Move (3 planes): mean {result['move_mean_ms']:.1f} ms, max {result['move_max_ms']:.1f} ms")
+            print("Per plane:    " + ', '.join(f"{name} {ms:.1f} ms" for name, ms in
+                                               zip(['axial', 'coronal', 'sagittal'], result['plane_mean_ms'])))
+        elif args.benchmark == 'decode':
+            result = bench_decode(workdir, args.frames, args.rows, args.cols, args.max_workers, args.repeat)
+            print(f"File size:    {result['file_mb']} MB, {args.frames} frames, {result['cpu_count']} CPUs")
+            print(f"pixel_array:  {result['pixel_array_s'] * 1000:.0f} ms")
+            for pool, workers, seconds, speedup in result['runs']:
+                print(f"{pool:>7} x {workers:<3} {seconds * 1000:8.0f} ms  {speedup:.2f}x")
+        elif args.benchmark == 'deid':
+            print(f"{'elements':>9} {'table us':>10} {'ns/elem':>8} {'loop us':>10}")
+            for count, table_us, per_element_ns, loop_us in bench_deid(workdir, args.elements, args.copies):
+                print(f"{count:>9} {table_us:>10.0f} {per_element_ns:>8.0f} {loop_us:>10.0f}")
+        elif args.benchmark == 'startup':
+            result = bench_startup(args.repeat, args.top, args.budget_ms)
+            _print_startup(result)
+            if args.json:
+                with open(args.json, 'w') as output:
+                    json.dump(result, output, indent=2)
+            if not result['within_budget']:
+                return 1
+        elif args.benchmark == 'trace':
+            result = bench_trace(args.calls, args.frames)
+            print(f"Span, tracing off: {result['span_off_ns']:.0f} ns")
+            print(f"Span, tracing on:  {result['span_on_ns']:.0f} ns")
+            print(f"Window 512x512, tracing off: {result['window_off_ms']:.3f} ms/frame")
+            print(f"Window 512x512, tracing on:  {result['window_on_ms']:.3f} ms/frame")
+        elif args.benchmark == 'suite':
+            result = bench_suite(workdir, args.rows, args.cols, args.cine_frames, args.cine_size,
+                                 args.header_elements, args.series_files, args.series_size, args.repeat,
+                                 progress=lambda message: print(message, file=sys.stderr))
+            print(f"{'path':<36} {'first ms':>10} {'best ms':>10} {'median ms':>10}")
+            for key, timing in result['results'].items():
+                print(f"{key:<36} {timing['first_s'] * 1000:>10.1f} {timing['best_s'] * 1000:>10.1f} "
+                      f"{timing['median_s'] * 1000:>10.1f}")
+            if args.json:
+                with open(args.json, 'w') as output:
+                    json.dump(result, output, indent=2)
+                print(f"Results written to {args.json}")
+            if args.compare:
+                with open(args.compare) as baseline_file:
+                    baseline = json.load(baseline_file)
+                if baseline['meta'].get('datasets') != result['meta']['datasets']:
+                    print("Warning: the runs used different dataset sizes", file=sys.stderr)
+                rows = compare_results(baseline, result, args.threshold)
+                print(f"\n{'path':<36} {'before ms':>10} {'after ms':>10} {'change':>8}")
+                for key, before, after, change, regressed in rows:
+                    flag = '  REGRESSION' if regressed else ''
+                    print(f"{key:<36} {before * 1000:>10.1f} {after * 1000:>10.1f} {change:>+8.1%}{flag}")
+                if any(row[4] for row in rows):
+                    return 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Two-level cache of decoded frames.
+
+The first level is an in-memory LRU bounded by bytes. The second keeps every
+decoded frame as a ``.npy`` file under ``<directory>/<SOPInstanceUID>/``
+(named by frame number plus a digest of the encoding, since copies of an
+instance may share its UID),
+which is memory-mapped when read back, so re-opening a compressed study that
+was reviewed recently skips decompression entirely. The disk level is capped
+by size and trimmed least recently used first; a hit refreshes the file's
+modification time.
+"""
+import hashlib
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.dicom_viewer', 'frames')
+DEFAULT_MEMORY_BYTES = 256 * 1024 * 1024
+DEFAULT_DISK_BYTES = 4 * 1024 ** 3
+# After a trim the disk level is brought down to this fraction of its cap
+TRIM_TARGET = 0.9
+SAFE_UID = re.compile(r'^[0-9.]{1,64}$')
+# Characters kept from a variant when it becomes part of a file name
+SAFE_VARIANT = re.compile(r'[^0-9A-Za-z]')
+
+class FrameCache:
+    """
+    Decoded frames keyed by (instance key, frame number, variant), in memory and on disk.
+
+    The variant distinguishes differently encoded files that share an
+    instance key (e.g. a SOPInstanceUID).
+
+    Args:
+        memory_bytes (int): Size of the in-memory LRU; 0 disables it.
+        directory (str): Folder of the on-disk level, or None to keep frames in memory only.
+        disk_bytes (int): Size cap of the on-disk level.
+    """
+
+    def __init__(self, memory_bytes=DEFAULT_MEMORY_BYTES, directory=DEFAULT_DIRECTORY,
+                 disk_bytes=DEFAULT_DISK_BYTES):
+        self.memory_bytes = memory_bytes
+        self.directory = directory
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = None
+        self._lock = threading.Lock()
+        self.hits = {'memory': 0, 'disk': 0, 'miss': 0}
+
+    def _path(self, key, index, variant):
+        # UIDs come from the files being read; anything that is not a plain UID is hashed
+        folder = key if SAFE_UID.match(key) else hashlib.sha1(key.encode('utf-8')).hexdigest()
+        name = f"{index}_{variant}" if variant else f"{index}"
+        return os.path.join(self.directory, folder, f"{name}.npy")
+
+    def _remember(self, item_key, frame):
+        """Adds frame to the memory level; the caller holds the lock."""
+        if self.memory_bytes <= 0 or frame.nbytes > self.memory_bytes:
+            return
+        if item_key in self._memory:
+            self._memory_used -= self._memory.pop(item_key).nbytes
+        self._memory[item_key] = frame
+        self._memory_used += frame.nbytes
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= evicted.nbytes
+
+    def get(self, key, index, variant=''):
+        """Returns the cached frame, or None. Disk hits are returned as read-only memory maps."""
+        variant = SAFE_VARIANT.sub('', variant)
+        item_key = (key, index, variant)
+        with self._lock:
+            if item_key in self._memory:
+                self._memory.move_to_end(item_key)
+                self.hits['memory'] += 1
+                return self._memory[item_key]
+
+        if self.directory and key:
+            path = self._path(key, index, variant)
+            try:
+                frame = np.load(path, mmap_mode='r')
+                os.utime(path)
+            except (OSError, ValueError):
+                frame = None
+            if frame is not None:
+                with self._lock:
+                    self.hits['disk'] += 1
+                    self._remember(item_key, frame)
+                return frame
+
+        with self._lock:
+            self.hits['miss'] += 1
+        return None
+
+    def put(self, key, index, frame, variant='', persist=True):
+        """Caches frame in memory and, if persist is set, on disk."""
+        variant = SAFE_VARIANT.sub('', variant)
+        with self._lock:
+            self._remember((key, index, variant), frame)
+        if not (persist and self.directory and key):
+            return
+
+        path = self._path(key, index, variant)
+        # Written under a unique name and renamed, so readers never see a partial file
+        partial = f"{path}.{uuid.uuid4().hex}.partial"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(partial, 'wb') as output:
+                np.save(output, np.ascontiguousarray(frame))
+            os.replace(partial, path)
+        except OSError as e:
+            print(f"Could not write frame cache: {str(e)}")
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            if self._disk_used is not None:
+                self._disk_used += os.path.getsize(path)
+            over = self._disk_used is None or self._disk_used > self.disk_bytes
+        if over:
+            self.trim()
+
+    def _files(self):
+        """Returns [(mtime, size, path)] for every cached frame file."""
+        files = []
+        if not os.path.isdir(self.directory):
+            return files
+        for folder in os.scandir(self.directory):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith('.npy'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def trim(self):
+        """Deletes least recently used frame files until the disk level is under its cap."""
+        files = self._files()
+        used = sum(size for _, size, _ in files)
+        if used > self.disk_bytes:
+            target = self.disk_bytes * TRIM_TARGET
+            for _, size, path in sorted(files):
+                if used <= target:
+                    break
+                try:
+                    os.remove(path)
+                    used -= size
+                except OSError:
+                    pass
+        with self._lock:
+            self._disk_used = used
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def default_frame_cache():
+    """Returns the frame cache shared by every accessor in this process."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = FrameCache()
+        return _default_cache
@@ -0,0 +1,266 @@
+"""Persistent metadata catalog for folders of DICOM files.
+
+A scan walks a folder, reads only the header attributes needed to group and
+order instances (no Pixel Data, large values deferred) on a thread pool, and
+stores one row per file in a SQLite database (one per user by default) keyed
+by path, modification time and size. Scanning the same folder again only
+parses files that are new or changed and drops rows for files that
+disappeared, so re-opening a large archive costs little more than listing it.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pydicom
+from pydicom.errors import InvalidDicomError
+
+# Catalog used when no path is given; paths are absolute, so one catalog serves every folder
+DEFAULT_CATALOG = os.path.join(os.path.expanduser('~'), '.dicom_viewer', 'catalog.sqlite')
+# Header attributes read from each file; everything else is skipped while parsing
+CATALOG_KEYWORDS = [
+    'PatientName', 'PatientID', 'StudyInstanceUID', 'StudyDescription', 'StudyDate',
+    'SeriesInstanceUID', 'SeriesDescription', 'SeriesNumber', 'Modality',
+    'SOPInstanceUID', 'InstanceNumber', 'ImagePositionPatient', 'ImageOrientationPatient',
+    'Rows', 'Columns', 'NumberOfFrames',
+]
+# Values deferred while scanning; the catalog attributes are all short
+SCAN_DEFER_SIZE = '1 KB'
+# Rows are written to the database in batches of this many files
+COMMIT_BATCH = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    is_dicom INTEGER NOT NULL,
+    patient_name TEXT,
+    patient_id TEXT,
+    study_uid TEXT,
+    study_description TEXT,
+    study_date TEXT,
+    series_uid TEXT,
+    series_description TEXT,
+    series_number INTEGER,
+    modality TEXT,
+    sop_uid TEXT,
+    instance_number INTEGER,
+    slice_position REAL,
+    rows INTEGER,
+    columns INTEGER,
+    frames INTEGER
+);
+CREATE INDEX IF NOT EXISTS instances_series ON instances (series_uid);
+"""
+COLUMNS = ['path', 'mtime', 'size', 'is_dicom', 'patient_name', 'patient_id', 'study_uid',
+           'study_description', 'study_date', 'series_uid', 'series_description',
+           'series_number', 'modality', 'sop_uid', 'instance_number', 'slice_position',
+           'rows', 'columns', 'frames']
+
+ScanStats = namedtuple('ScanStats', ['files', 'parsed', 'unchanged', 'removed', 'errors', 'seconds'])
+SeriesInfo = namedtuple('SeriesInfo', ['study_uid', 'series_uid', 'patient_name', 'study_description',
+                                       'study_date', 'series_description', 'series_number',
+                                       'modality', 'instances'])
+
+def list_files(root):
+    """Yields (path, mtime, size) for every file below root, using scandir's cached stat."""
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError as e:
+            print(f"Cannot list directory: {str(e)}")
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+def slice_position(ds):
+    """
+    Returns the position of an image along its slice normal, or None.
+
+    The normal is the cross product of the row and column direction cosines
+    in Image Orientation (Patient), so sorting by it orders slices through
+    the volume whatever the acquisition plane.
+    """
+    position = ds.get('ImagePositionPatient')
+    orientation = ds.get('ImageOrientationPatient')
+    if position is None or len(position) != 3:
+        return None
+    if orientation is None or len(orientation) != 6:
+        return float(position[2])
+    orientation = np.asarray(orientation, dtype=float)
+    normal = np.cross(orientation[:3], orientation[3:])
+    return float(np.dot(normal, np.asarray(position, dtype=float)))
+
+def _int_or_none(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+def read_catalog_row(path, mtime, size):
+    """Reads the header attributes of one file and returns its catalog row."""
+    try:
+        ds = pydicom.dcmread(path, stop_before_pixels=True, defer_size=SCAN_DEFER_SIZE,
+                             specific_tags=CATALOG_KEYWORDS)
+    except InvalidDicomError:
+        return (path, mtime, size, 0) + (None,) * (len(COLUMNS) - 4)
+
+    return (path, mtime, size, 1,
+            str(ds.get('PatientName', '')), str(ds.get('PatientID', '')),
+            str(ds.get('StudyInstanceUID', '')), str(ds.get('StudyDescription', '')),
+            str(ds.get('StudyDate', '')),
+            str(ds.get('SeriesInstanceUID', '')), str(ds.get('SeriesDescription', '')),
+            _int_or_none(ds.get('SeriesNumber')), str(ds.get('Modality', '')),
+            str(ds.get('SOPInstanceUID', '')), _int_or_none(ds.get('InstanceNumber')),
+            slice_position(ds), _int_or_none(ds.get('Rows')), _int_or_none(ds.get('Columns')),
+            _int_or_none(ds.get('NumberOfFrames')) or 1)
+
+class SeriesCatalog:
+    """SQLite catalog of the DICOM instances found under one or more folders."""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or DEFAULT_CATALOG
+        if os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.executescript(SCHEMA)
+
+    def _under(self, root):
+        """Returns a WHERE clause and parameters selecting paths below root."""
+        prefix = os.path.join(os.path.abspath(root), '')
+        return "substr(path, 1, ?) = ?", (len(prefix), prefix)
+
+    def close(self):
+        self.connection.close()
+
+    def scan(self, root, workers=None, progress=None):
+        """
+        Brings the catalog up to date with the files below root.
+
+        Args:
+            root (str): Folder to scan recursively.
+            workers (int): Header-reading threads (default: os.cpu_count() * 2).
+            progress (callable): Called as progress(done, total) after each committed
+                batch; an exception it raises stops the scan, keeping those batches.
+
+        Returns:
+            ScanStats: Counts of files seen, parsed, unchanged, removed and failed.
+        """
+        start = time.perf_counter()
+        root = os.path.abspath(root)
+        where, params = self._under(root)
+        known = {path: (mtime, size) for path, mtime, size in self.connection.execute(
+            f"SELECT path, mtime, size FROM instances WHERE {where}", params)}
+
+        files = 0
+        pending = []
+        for path, mtime, size in list_files(root):
+            files += 1
+            if known.pop(path, None) != (mtime, size):
+                pending.append((path, mtime, size))
+
+        # Whatever is left in known no longer exists on disk
+        removed = list(known)
+        self.connection.executemany("DELETE FROM instances WHERE path = ?",
+                                    ((path,) for path in removed))
+
+        errors = 0
+        insert = (f"INSERT OR REPLACE INTO instances ({', '.join(COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * len(COLUMNS))})")
+        workers = workers or (os.cpu_count() or 1) * 2
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch_start in range(0, len(pending), COMMIT_BATCH):
+                batch = pending[batch_start:batch_start + COMMIT_BATCH]
+                rows = []
+                futures = [executor.submit(read_catalog_row, *item) for item in batch]
+                for item, future in zip(batch, futures):
+                    try:
+                        rows.append(future.result())
+                    except Exception as e:
+                        errors += 1
+                        print(f"Error reading {item[0]}: {str(e)}")
+                self.connection.executemany(insert, rows)
+                self.connection.commit()
+                if progress is not None:
+                    progress(batch_start + len(batch), len(pending))
+        self.connection.commit()
+
+        return ScanStats(files, len(pending) - errors, files - len(pending), len(removed),
+                         errors, time.perf_counter() - start)
+
+    def series(self, root=None):
+        """Returns a SeriesInfo for every series, optionally limited to files below root."""
+        query = ("SELECT study_uid, series_uid, MAX(patient_name), MAX(study_description), "
+                 "MAX(study_date), MAX(series_description), MIN(series_number), MAX(modality), "
+                 "COUNT(*) FROM instances WHERE is_dicom = 1")
+        params = ()
+        if root is not None:
+            where, params = self._under(root)
+            query += f" AND {where}"
+        query += (" GROUP BY study_uid, series_uid "
+                  "ORDER BY MAX(study_date), study_uid, MIN(series_number), series_uid")
+        return [SeriesInfo(*row) for row in self.connection.execute(query, params)]
+
+    def instances(self, series_uid, root=None):
+        """
+        Returns the file paths of a series ordered along the slice normal, then by InstanceNumber.
+
+        root limits the files to those below a folder, as in instance_frames().
+        """
+        return [path for path, _ in self.instance_frames(series_uid, root)]
+
+    def instance_frames(self, series_uid, root=None):
+        """
+        Returns (path, number of frames) for the files of a series, in the order of instances().
+
+        root limits the files to those below a folder, since copies of a
+        series kept elsewhere share its UID.
+        """
+        query = "SELECT path, frames FROM instances WHERE is_dicom = 1 AND series_uid = ?"
+        params = (series_uid,)
+        if root is not None:
+            where, root_params = self._under(root)
+            query += f" AND {where}"
+            params += root_params
+        query += " ORDER BY slice_position IS NULL, slice_position, instance_number, path"
+        return [(path, frames or 1) for path, frames in self.connection.execute(query, params)]
+
+def series_label(info):
+    """Returns a one-line description of a series for lists and dialogs."""
+    description = info.series_description or info.study_description or 'Unnamed series'
+    number = f"#{info.series_number} " if info.series_number is not None else ''
+    return f"{info.patient_name} - {info.modality} {number}{description} ({info.instances} files)"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index a folder of DICOM files into a SQLite catalog.")
+    parser.add_argument('root', help="Folder to scan recursively")
+    parser.add_argument('--catalog', help=f"Catalog file (default: {DEFAULT_CATALOG})")
+    parser.add_argument('--workers', type=int, default=None, help="Header-reading threads")
+    parser.add_argument('--list', action='store_true', help="Print the series found")
+    args = parser.parse_args(argv)
+
+    catalog = SeriesCatalog(args.catalog)
+    try:
+        stats = catalog.scan(args.root, workers=args.workers)
+        print(f"{stats.files} files: {stats.parsed} parsed, {stats.unchanged} unchanged, "
+              f"{stats.removed} removed, {stats.errors} errors in {stats.seconds:.2f} s")
+        if args.list:
+            for info in catalog.series(args.root):
+                print(series_label(info))
+    finally:
+        catalog.close()
+    return 1 if stats.errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""Rule-based de-identification for research exports.
+
+A ``DeidProfile`` says what happens to each attribute (remove, empty,
+replace, shift a date, remap a UID or keep it), whether private tags are
+dropped, and by how many days dates move. Profiles are JSON files such as
+
+    {
+        "name": "site-export",
+        "remove_private": true,
+        "date_shift_days": null,
+        "rules": {
+            "PatientName": ["replace", "{prefix}^Anonymous"],
+            "StudyDate": "shift",
+            "InstitutionName": "remove"
+        },
+        "redact": [
+            {"modality": "US", "manufacturer": "Acme", "regions": [[0, 0, 800, 60]]}
+        ]
+    }
+
+``redact`` lists burned-in text regions per Modality and Manufacturer (see
+``dicom_redact``). Instance UIDs are replaced through a ``MappingStore``, a SQLite file shared
+by every worker process, so all files of a study get the same new Study and
+Series UIDs and references between instances stay intact. With no fixed
+``date_shift_days`` each patient gets a random shift, kept in the same store
+so intervals between their studies are preserved.
+"""
+import datetime
+import functools
+import json
+import os
+import random
+import sqlite3
+
+from pydicom.datadict import dictionary_VR, tag_for_keyword
+from pydicom.uid import UID, generate_uid
+
+from dicom_redact import RedactionRule
+
+DEFAULT_MAPPING_STORE = os.path.join(os.path.expanduser('~'), '.dicom_viewer', 'deid_map.sqlite')
+# Random per-patient date shifts move dates back by 1 to this many days
+MAX_RANDOM_SHIFT_DAYS = 3650
+ACTIONS = ('remove', 'empty', 'replace', 'shift', 'uid', 'keep')
+
+# A subset of the DICOM PS3.15 Basic Application Level Confidentiality Profile
+DEFAULT_RULES = {
+    'PatientName': ['replace', '{prefix}_Anonymous'],
+    'PatientID': ['replace', '{prefix}_ID'],
+    'PatientBirthDate': 'empty',
+    'PatientBirthTime': 'remove',
+    'PatientSex': 'keep',
+    'PatientAge': 'keep',
+    'OtherPatientIDs': 'remove',
+    'OtherPatientNames': 'remove',
+    'OtherPatientIDsSequence': 'remove',
+    'PatientBirthName': 'remove',
+    'PatientMotherBirthName': 'remove',
+    'PatientAddress': 'remove',
+    'PatientTelephoneNumbers': 'remove',
+    'MilitaryRank': 'remove',
+    'EthnicGroup': 'remove',
+    'PatientComments': 'remove',
+    'MedicalRecordLocator': 'remove',
+    'InstitutionName': 'remove',
+    'InstitutionAddress': 'remove',
+    'InstitutionalDepartmentName': 'remove',
+    'ReferringPhysicianName': 'empty',
+    'ReferringPhysicianAddress': 'remove',
+    'ReferringPhysicianTelephoneNumbers': 'remove',
+    'PhysiciansOfRecord': 'remove',
+    'PerformingPhysicianName': 'remove',
+    'NameOfPhysiciansReadingStudy': 'remove',
+    'OperatorsName': 'remove',
+    'RequestingPhysician': 'remove',
+    'StationName': 'remove',
+    'DeviceSerialNumber': 'remove',
+    'AccessionNumber': 'empty',
+    'StudyID': 'empty',
+    'AdmissionID': 'remove',
+    'RequestAttributesSequence': 'remove',
+    'StudyDescription': 'keep',
+    'SeriesDescription': 'keep',
+    'AdditionalPatientHistory': 'remove',
+    'ImageComments': 'remove',
+    'StudyDate': 'shift',
+    'SeriesDate': 'shift',
+    'AcquisitionDate': 'shift',
+    'ContentDate': 'shift',
+    'InstanceCreationDate': 'shift',
+    'AcquisitionDateTime': 'shift',
+    'StudyTime': 'keep',
+    'SeriesTime': 'keep',
+    'StudyInstanceUID': 'uid',
+    'SeriesInstanceUID': 'uid',
+    'SOPInstanceUID': 'uid',
+    'FrameOfReferenceUID': 'uid',
+}
+
+class DeidProfile:
+    """
+    What a de-identification run does to each attribute.
+
+    Args:
+        name (str): Recorded in Deidentification Method.
+        rules (dict): Keyword -> action, or [action, value] for 'replace'.
+            Values may use ``{prefix}``.
+        remove_private (bool): Drop all private tags.
+        date_shift_days (int): Days added to DA and DT values under 'shift';
+            None picks a random shift per patient.
+        remap_uids (bool): Also remap every other non-registered UID
+            (references, frame of reference, ...), not only those listed.
+        redact (list): RedactionRule objects for burned-in annotations.
+    """
+
+    def __init__(self, name, rules, remove_private=True, date_shift_days=None, remap_uids=True,
+                 redact=None):
+        self.name = name
+        self.rules = {}
+        for keyword, rule in rules.items():
+            action, value = (rule, None) if isinstance(rule, str) else (rule[0], rule[1])
+            if action not in ACTIONS:
+                raise ValueError(f"Unknown action '{action}' for {keyword}")
+            if tag_for_keyword(keyword) is None:
+                raise ValueError(f"Unknown keyword '{keyword}' in profile {name}")
+            self.rules[keyword] = (action, value)
+        self.remove_private = remove_private
+        self.date_shift_days = None if date_shift_days is None else int(date_shift_days)
+        self.remap_uids = remap_uids
+        self.redact = list(redact or [])
+        self._compiled = None
+
+    def compiled(self):
+        """Returns the CompiledProfile for these rules, building it on first use."""
+        if self._compiled is None:
+            self._compiled = CompiledProfile(self)
+        return self._compiled
+
+    @classmethod
+    def load(cls, path):
+        """Reads a profile from a JSON file."""
+        with open(path) as profile_file:
+            data = json.load(profile_file)
+        return cls(data.get('name', os.path.splitext(os.path.basename(path))[0]),
+                   data.get('rules', {}), data.get('remove_private', True),
+                   data.get('date_shift_days'), data.get('remap_uids', True),
+                   [RedactionRule.from_dict(rule) for rule in data.get('redact', [])])
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'rules': {keyword: action if value is None else [action, value]
+                      for keyword, (action, value) in self.rules.items()},
+            'remove_private': self.remove_private,
+            'date_shift_days': self.date_shift_days,
+            'remap_uids': self.remap_uids,
+            'redact': [rule.to_dict() for rule in self.redact],
+        }
+
+DEFAULT_PROFILE = DeidProfile('basic', DEFAULT_RULES)
+
+class MappingStore:
+    """
+    Persistent UID replacements and per-patient date shifts.
+
+    Backed by SQLite in WAL mode, so worker processes can share one file: a
+    new value is inserted with INSERT OR IGNORE and the stored one read back,
+    which makes the first writer win if two processes meet the same UID or
+    patient. Keep the file private; it is the key for re-identification.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_MAPPING_STORE
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS uid_map (original TEXT PRIMARY KEY, replacement TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS date_shift (patient TEXT PRIMARY KEY, days INTEGER NOT NULL);")
+        self.connection.commit()
+        self._known = {}
+        self._shifts = {}
+
+    def remap(self, uids):
+        """Returns {original: replacement} for uids, creating replacements as needed."""
+        missing = [uid for uid in set(uids) if uid not in self._known]
+        if missing:
+            with self.connection:
+                self.connection.executemany("INSERT OR IGNORE INTO uid_map VALUES (?, ?)",
+                                            ((uid, generate_uid()) for uid in missing))
+            # Chunked to stay under SQLite's host parameter limit
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT original, replacement FROM uid_map "
+                    f"WHERE original IN ({', '.join('?' * len(chunk))})", chunk)
+                self._known.update(rows)
+        return {uid: self._known[uid] for uid in uids}
+
+    def date_shift(self, patient):
+        """Returns the day offset for patient, drawing a random one the first time."""
+        if patient not in self._shifts:
+            with self.connection:
+                self.connection.execute("INSERT OR IGNORE INTO date_shift VALUES (?, ?)",
+                                        (patient, -random.randint(1, MAX_RANDOM_SHIFT_DAYS)))
+            self._shifts[patient] = self.connection.execute(
+                "SELECT days FROM date_shift WHERE patient = ?", (patient,)).fetchone()[0]
+        return self._shifts[patient]
+
+    def close(self):
+        self.connection.close()
+
+@functools.lru_cache(maxsize=4096)
+def _is_registered(uid):
+    """Returns True for UIDs defined by the standard (SOP classes, transfer syntaxes, ...)."""
+    return UID(uid).name != str(uid)
+
+def _shift_date(value, days):
+    """Returns a DA (YYYYMMDD) or DT value moved by days; other values come back unchanged."""
+    text = str(value)
+    try:
+        date = datetime.datetime.strptime(text[:8], '%Y%m%d')
+    except ValueError:
+        return value
+    return (date + datetime.timedelta(days=days)).strftime('%Y%m%d') + text[8:]
+
+def _element_vr(tag, raw):
+    """Returns the VR of a possibly still raw element; implicit VR files leave it to the dictionary."""
+    if raw.VR:
+        return raw.VR
+    try:
+        return dictionary_VR(tag)
+    except KeyError:
+        return 'UN'
+
+class CompiledProfile:
+    """
+    A DeidProfile turned into a tag-number keyed action table.
+
+    ``apply`` makes one recursive pass over a dataset: each element costs a
+    dict lookup on its tag, and only elements that are acted upon, UIDs and
+    sequences are converted from their raw encoding. Private tags (odd
+    groups) are dropped when the profile says so, at any depth.
+    """
+
+    def __init__(self, profile):
+        self.name = profile.name
+        self.remove_private = profile.remove_private
+        self.date_shift_days = profile.date_shift_days
+        self.remap_uids = profile.remap_uids
+        self.actions = {int(tag_for_keyword(keyword)): rule for keyword, rule in profile.rules.items()}
+
+    def _walk(self, ds, days, prefix, uids):
+        """Applies the table to ds and its sequence items, appending (element, forced) for UIDs to remap."""
+        actions = self.actions
+        removed = []
+        for tag, raw in ds.items():
+            rule = actions.get(tag)
+            if rule is None:
+                if self.remove_private and tag >> 16 & 1:
+                    removed.append(tag)
+                    continue
+                vr = _element_vr(tag, raw)
+                if vr == 'SQ':
+                    for item in ds[tag].value:
+                        self._walk(item, days, prefix, uids)
+                elif vr == 'UI' and self.remap_uids:
+                    uids.append((ds[tag], False))
+                continue
+
+            action, value = rule
+            if action == 'keep':
+                continue
+            if action == 'remove':
+                removed.append(tag)
+                continue
+            elem = ds[tag]
+            if action == 'empty':
+                elem.value = [] if elem.VR == 'SQ' else ''
+            elif action == 'replace':
+                elem.value = value.format(prefix=prefix) if isinstance(value, str) else value
+            elif action == 'shift':
+                if days and elem.VR in ('DA', 'DT') and elem.value:
+                    elem.value = ([_shift_date(date, days) for date in elem.value] if elem.VM > 1
+                                  else _shift_date(elem.value, days))
+            elif action == 'uid':
+                uids.append((elem, True))
+        for tag in removed:
+            del ds[tag]
+
+    def apply(self, ds, store=None, prefix=''):
+        """
+        Applies the table to ds in place.
+
+        Args:
+            ds (Dataset): Parsed dataset (Pixel Data may be absent).
+            store (MappingStore): UID replacements and date shifts; only
+                needed when the profile remaps UIDs or shifts dates randomly.
+            prefix (str): Substituted for ``{prefix}`` in replacement values.
+        """
+        if self.date_shift_days is not None:
+            days = self.date_shift_days
+        else:
+            # Keyed on the original identity, read before the rules replace it
+            days = store.date_shift(f"{ds.get('IssuerOfPatientID', '')}|{ds.get('PatientID', '')}")
+
+        uids = []
+        self._walk(ds, days, prefix, uids)
+        if not uids:
+            return ds
+
+        to_remap = set()
+        for elem, forced in uids:
+            for uid in (elem.value if elem.VM > 1 else [elem.value] if elem.value else []):
+                if forced or not _is_registered(str(uid)):
+                    to_remap.add(str(uid))
+        replacements = store.remap(list(to_remap)) if to_remap else {}
+        for elem, _ in uids:
+            if elem.VM > 1:
+                elem.value = [replacements.get(str(uid), str(uid)) for uid in elem.value]
+            elif elem.value:
+                elem.value = replacements.get(str(elem.value), str(elem.value))
+        return ds
+
+def deidentify_dataset(ds, profile, store, prefix):
+    """
+    Applies profile to ds in place and returns it.
+
+    Args:
+        ds (Dataset): Parsed dataset (Pixel Data may be absent).
+        profile (DeidProfile): Rules to apply.
+        store (MappingStore): Shared UID replacements and date shifts.
+        prefix (str): Substituted for ``{prefix}`` in replacement values.
+    """
+    profile.compiled().apply(ds, store, prefix)
+    # File meta identifies the writing software too, so only the instance UID is carried over
+    if getattr(ds, 'file_meta', None) is not None and 'SOPInstanceUID' in ds:
+        ds.file_meta.MediaStorageSOPInstanceUID = ds.SOPInstanceUID
+
+    ds.PatientIdentityRemoved = 'YES'
+    ds.DeidentificationMethod = profile.name
+    return ds
@@ -1,158 +1,187 @@
 from PyQt5.QtWidgets import QFileDialog, QApplication
-import pydicom
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-from matplotlib.widgets import Slider, Button
+from dicom_trace import span
 
-def load_dicom_file():
-    """Opens a file dialog to load a DICOM file."""
-    try:
-        options = QFileDialog.Options()
-        filepath, _ = QFileDialog.getOpenFileName(
-            None, "Open DICOM File", "", 
-            "DICOM Files (*.dcm);;All Files (*)", 
-            options=options)
-        
-        if not filepath:
-            return None, "No file selected."
-        ds = pydicom.dcmread(filepath)
-        return ds, filepath
-    except Exception as e:
-        return None, f"Error loading file: {str(e)}"
+# matplotlib, pydicom and the display modules are imported by the functions
+# that use them, so the main window comes up without loading them
+
+def choose_dicom_file(parent=None):
+    """Opens a file dialog and returns the chosen path, or None."""
+    options = QFileDialog.Options()
+    filepath, _ = QFileDialog.getOpenFileName(
+        parent, "Open DICOM File", "", 
+        "DICOM Files (*.dcm);;All Files (*)", 
+        options=options)
+    return filepath or None
 
 def display_tags(ds):
-    """Returns a formatted string of DICOM tags."""
+    """Returns a formatted string of DICOM tags; large values are shortened and deferred ones left unread."""
     if ds is None:
         return "No DICOM file loaded"
+    from dicom_tag_format import format_value, iter_elements
     
     tag_list = []
-    for elem in ds:
-        try:
-            tag_id = f"({elem.tag.group:04x},{elem.tag.element:04x})"
-            tag_str = f"{tag_id} - {elem.name}: {elem.repval}"
-            tag_list.append(tag_str)
-        except Exception as e:
-            tag_str = f"Error reading tag: {str(e)}"
-            tag_list.append(tag_str)
+    with span('tag_format', 'tags'):
+        for elem in iter_elements(ds):
+            try:
+                tag_id = f"({elem.tag.group:04x},{elem.tag.element:04x})"
+                tag_str = f"{tag_id} - {elem.name}: {format_value(elem)[0]}"
+                tag_list.append(tag_str)
+            except Exception as e:
+                tag_str = f"Error reading tag: {str(e)}"
+                tag_list.append(tag_str)
     
     return "\n".join(tag_list)
 
-def display_dicom(ds):
-    """Displays a single DICOM image."""
+def _connect_window_level(fig, windowed, axes, redraw):
+    """Lets a left-button drag over axes adjust window/level, then calls redraw()."""
+    last = [None]
+    
+    def on_press(event):
+        if event.button == 1 and event.inaxes in axes and not windowed.color:
+            last[0] = (event.x, event.y)
+    
+    def on_motion(event):
+        if last[0] is None:
+            return
+        # Horizontal drag changes the width, vertical drag the center
+        dx, dy = event.x - last[0][0], last[0][1] - event.y
+        last[0] = (event.x, event.y)
+        center, width = windowed.window
+        step = max(width, 1.0) / 200.0
+        windowed.set_window(center + dy * step, width + dx * step)
+        redraw()
+    
+    def on_release(event):
+        last[0] = None
+    
+    fig.canvas.mpl_connect('button_press_event', on_press)
+    fig.canvas.mpl_connect('motion_notify_event', on_motion)
+    fig.canvas.mpl_connect('button_release_event', on_release)
+
+def display_dicom(ds, frames=None):
+    """Displays a single DICOM image; drag on it to change window/level."""
     if ds is None:
         print("No file loaded.")
         return
     
+    import matplotlib.pyplot as plt
+    from dicom_frames import open_frames
+    from dicom_lut import WindowedFrames
+    from dicom_render import BlitManager
+    
+    if frames is None:
+        frames = open_frames(ds)
+    windowed = WindowedFrames(frames, ds)
+    
     fig, ax = plt.subplots()
-    ax.imshow(ds.pixel_array, cmap='gray')
+    image = ax.imshow(windowed[0], cmap='gray', vmin=0, vmax=255)
     ax.set_title("DICOM Viewer")
     ax.axis('off')
+    
+    blitter = BlitManager(fig.canvas, [image])
+    def redraw():
+        image.set_array(windowed[0])
+        blitter.update()
+    _connect_window_level(fig, windowed, [ax], redraw)
     plt.show()
 
-def display_m2d(ds):
-    """Displays M2D (multi-frame) DICOM files with a slider."""
+def display_m2d(ds, frames=None):
+    """Displays M2D (multi-frame) DICOM files in a cine window, decoding frames on demand."""
     try:
-        frames = ds.pixel_array
-        print(f"Frame shape: {frames.shape}")
-        
-        fig, ax = plt.subplots(figsize=(10, 8))
-        plt.subplots_adjust(bottom=0.2)
-        
-        im = ax.imshow(frames[0])
-        ax.set_title(f"Frame 1/{len(frames)}")
-        ax.axis('off')
-        
-        slider_ax = plt.axes([0.1, 0.05, 0.8, 0.03])
-        slider = Slider(slider_ax, 'Frame', 0, len(frames)-1, valinit=0, valstep=1)
+        from dicom_frames import cine_frame_rate, open_frames
+        from dicom_lut import WindowedFrames
+        from dicom_render import CineViewerWindow, ensure_application
         
-        def update(val):
-            frame_idx = int(slider.val)
-            im.set_array(frames[frame_idx])
-            ax.set_title(f"Frame {frame_idx+1}/{len(frames)}")
-            fig.canvas.draw_idle()
-        
-        slider.on_changed(update)
+        if frames is None:
+            frames = open_frames(ds)
+        print(f"Frame shape: {frames.shape}")
         
-        # Add play/pause functionality
-        play_ax = plt.axes([0.1, 0.1, 0.1, 0.04])
-        play_button = Button(play_ax, 'Play')
+        # Frames are painted as QImages straight from the NumPy buffer
+        app, owns_app = ensure_application()
+        window = CineViewerWindow(WindowedFrames(frames, ds), cine_frame_rate(ds),
+                                  title="DICOM Cine Viewer")
+        window.show()
+        if owns_app:
+            app.exec_()
+        return window
         
-        is_playing = [False]
-        def play(event):
-            is_playing[0] = not is_playing[0]
-            play_button.label.set_text('Pause' if is_playing[0] else 'Play')
-            
-            def animate():
-                # Reset to beginning if we're at the end
-                if int(slider.val) >= len(frames) - 1:
-                    slider.set_val(0)
-                
-                current_frame = int(slider.val)
-                while is_playing[0] and current_frame < len(frames) - 1:
-                    current_frame += 1
-                    slider.set_val(current_frame)
-                    fig.canvas.draw_idle()
-                    plt.pause(0.1)  # Increased from 0.05 to 0.1 for slower playback
-                
-                # Reset play button when reaching the end
-                if current_frame >= len(frames) - 1:
-                    is_playing[0] = False
-                    play_button.label.set_text('Play')
-            
-            if is_playing[0]:
-                animate()
+    except Exception as e:
+        print(f"Error in display_m2d: {str(e)}")
+        raise
+
+def display_mpr(volume, ds=None):
+    """Displays linked axial, coronal and sagittal planes of a volume."""
+    try:
+        from dicom_mpr import MPRViewerWindow
+        from dicom_render import ensure_application
         
-        play_button.on_clicked(play)
-        plt.show()
+        print(f"Volume shape: {volume.shape}, spacing: {volume.spacing}")
+        app, owns_app = ensure_application()
+        window = MPRViewerWindow(volume, ds)
+        window.show()
+        if owns_app:
+            app.exec_()
+        return window
         
     except Exception as e:
-        print(f"Error in display_m2d: {str(e)}")
+        print(f"Error in display_mpr: {str(e)}")
         raise
 
-def display_3d(ds):
-    """Displays 3D DICOM files as a tiled grid with pagination."""
+def _rgba(image):
+    """Expands a uint8 gray or RGB image to RGBA, which matplotlib draws without colormapping."""
+    import numpy as np
+    
+    rgba = np.empty(image.shape[:2] + (4,), dtype=np.uint8)
+    rgba[..., :3] = image[..., np.newaxis] if image.ndim == 2 else image
+    rgba[..., 3] = 255
+    return rgba
+
+def display_3d(ds, frames=None):
+    """Displays 3D DICOM files as a paged thumbnail mosaic."""
     if ds is None:
         print("No file loaded.")
         return
     
-    volume = ds.pixel_array
-    total_slices = len(volume)
-    slices_per_page = 16  # 4x4 grid
+    import matplotlib.pyplot as plt
+    from matplotlib.widgets import Button
+    from dicom_frames import open_frames
+    from dicom_mosaic import ThumbnailMosaic
+    from dicom_render import BlitManager
+    
+    # A page is one tiled image; thumbnails are block means cached on disk per series
+    mosaic = ThumbnailMosaic(frames if frames is not None else open_frames(ds), ds)
+    total_slices = len(mosaic.frames)
     current_page = [0]  # Using list to make it accessible in nested function
-    fig = plt.figure(figsize=(100, 12))
-    fig.suptitle(f'3D Volume Viewer - {total_slices} slices')
+    fig = plt.figure(figsize=(10, 10.5))
+    title = fig.suptitle(f'3D Volume Viewer - {total_slices} slices')
+    
+    ax = fig.add_axes([0.01, 0.08, 0.98, 0.86])
+    ax.axis('off')
+    image = ax.imshow(_rgba(mosaic.page(0)), interpolation='none')
+    labels = []
+    for offset in range(mosaic.per_page):
+        x, y = mosaic.tile_origin(offset)
+        labels.append(ax.text(x + 2, y + 2, '', color='yellow', fontsize=8, va='top'))
+    blitter = BlitManager(fig.canvas, [title, image] + labels)
     
     def show_page(page_num):
-        start_idx = page_num * slices_per_page
-        end_idx = min(start_idx + slices_per_page, total_slices)
-        
-        plt.clf()
-        fig.suptitle(f'Slices {start_idx+1}-{end_idx} (Total: {total_slices})')
+        start_idx, end_idx = mosaic.page_range(page_num)
         
-        grid_size = int(np.ceil(np.sqrt(min(slices_per_page, end_idx - start_idx))))
+        title.set_text(f'Slices {start_idx+1}-{end_idx} (Total: {total_slices})')
+        image.set_data(_rgba(mosaic.page(page_num)))
+        for offset, label in enumerate(labels):
+            label.set_text(f'{start_idx + offset + 1}' if start_idx + offset < end_idx else '')
         
-        for i, slice_idx in enumerate(range(start_idx, end_idx)):
-            ax = plt.subplot(grid_size, grid_size, i + 1)
-            ax.imshow(volume[slice_idx], cmap='gray')
-            ax.axis('off')
-            ax.set_title(f'Slice {slice_idx + 1}')
-        
-        plt.tight_layout(rect=[0, 0.03, 1, 0.95])
+        blitter.update()
     
     def next_page(event):
-        max_pages = (total_slices - 1) // slices_per_page
-        current_page[0] = min(current_page[0] + 1, max_pages)
+        current_page[0] = min(current_page[0] + 1, mosaic.pages - 1)
         show_page(current_page[0])
-        plt.draw()
     
     def prev_page(event):
         current_page[0] = max(current_page[0] - 1, 0)
         show_page(current_page[0])
-        plt.draw()
     
-    plt.subplots_adjust(bottom=0.15)
     next_button_ax = plt.axes([0.7, 0.02, 0.1, 0.04])
     prev_button_ax = plt.axes([0.2, 0.02, 0.1, 0.04])
     
@@ -163,6 +192,7 @@ def display_3d(ds):
     prev_button.on_clicked(prev_page)
     
     show_page(0)
+    mosaic.prefetch()
     
     def on_key(event):
         if event.key == 'right':
@@ -171,4 +201,6 @@ def display_3d(ds):
             prev_page(event)
     
     fig.canvas.mpl_connect('key_press_event', on_key)
-    plt.show()
\ No newline at end of file
+    fig.canvas.mpl_connect('close_event', lambda event: mosaic.close())
+    _connect_window_level(fig, mosaic, [ax], lambda: show_page(current_page[0]))
+    plt.show()
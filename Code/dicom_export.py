@@ -0,0 +1,543 @@
+"""Headless export of DICOM frames and series.
+
+Runs without PyQt5 or matplotlib:
+
+    python dicom_export.py /data/echo.dcm --format png --output /data/png
+    python dicom_export.py /data/study --format npy --output /data/volumes
+    python dicom_export.py /data/cine.dcm --format raw --output - | ffmpeg -f rawvideo ...
+
+Formats:
+    png: One windowed 8-bit PNG per frame, in a folder per file or series.
+    npy, npz: The stored pixel values as one (frames, rows, columns[, samples])
+        array; ``--windowed`` exports the windowed 8-bit frames instead.
+    raw: Windowed 8-bit frames back to back (gray or rgb24), the rawvideo
+        input of an encoder such as ffmpeg.
+
+Exports run as a three-stage pipeline joined by bounded queues: frames are
+decoded ahead on ``DECODE_WORKERS`` workers, windowed through a lookup table
+on their own thread and encoded/written by the caller, with PNG encoding
+spread over a thread pool. Every stage works on a different frame at the same
+time, and memory use is bounded by the queue depth whatever the file size.
+A folder is indexed through the series catalog and exported one series at a
+time, each slice file decoded on the decode workers.
+"""
+import argparse
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pydicom
+
+from dicom_cache import FrameCache
+from dicom_catalog import SeriesCatalog
+from dicom_frames import DECODE_WORKERS, FRAME_DEFER_SIZE, cine_frame_rate, iter_frames, open_frames
+from dicom_lut import WindowLevelLUT, to_uint8
+from dicom_tag_format import DEFER_SIZE
+
+FORMATS = ['png', 'npy', 'npz', 'raw']
+STAGES = ['decode', 'window', 'encode']
+# Frames held between two stages
+QUEUE_DEPTH = 16
+# zlib level of exported PNGs; low levels are several times faster and still lossless
+DEFAULT_PNG_LEVEL = 1
+SAFE_NAME = re.compile(r'[^0-9A-Za-z._-]+')
+
+class ExportStats:
+    """Frame counts and per-stage timings of one export."""
+
+    def __init__(self, total=0):
+        self.total = total
+        self.frames = 0
+        self.bytes = 0
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.start = time.perf_counter()
+        self.end = None
+        # Shape of the exported frames
+        self.frame_shape = None
+
+    def add(self, other):
+        """Adds the counts and timings of another export to these."""
+        self.total += other.total
+        self.frames += other.frames
+        self.bytes += other.bytes
+        for stage, seconds in other.stage_seconds.items():
+            self.stage_seconds[stage] += seconds
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def frames_per_sec(self):
+        elapsed = self.elapsed
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        text = (f"{self.frames}/{self.total} frames in {self.elapsed:.1f}s "
+                f"({self.frames_per_sec:.1f} frames/s, {self.bytes / (1024 * 1024):.1f} MB written)")
+        for stage in STAGES:
+            seconds = self.stage_seconds[stage]
+            if seconds > 0:
+                text += f"\n  {stage:<8} {self.frames / seconds:8.1f} frames/s busy"
+        return text
+
+class SeriesFrames:
+    """
+    Frame accessor over the files of a series, one file read per frame.
+
+    Reading a file means decoding it, so the accessor reports itself as
+    encapsulated and iter_frames reads files ahead on its worker threads.
+
+    Args:
+        members (list): (path, number of frames) in slice order.
+    """
+
+    def __init__(self, members):
+        self.members = [(path, index) for path, count in members for index in range(count)]
+        self.encapsulated = True
+        self._cache = FrameCache(memory_bytes=0, directory=None)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __getitem__(self, index):
+        return self.frame(index)
+
+    def frame(self, index):
+        path, number = self.members[index]
+        # Pixel Data stays deferred unless the file has to be decoded through pydicom
+        frames = open_frames(pydicom.dcmread(path, defer_size=FRAME_DEFER_SIZE), frame_cache=self._cache)
+        try:
+            # Copied, since a native frame is a view of a map that closes with the file
+            return np.array(frames.frame(number))
+        finally:
+            frames.close()
+
+    def close(self):
+        self.members = []
+
+def make_windower(ds, sample, center=None, width=None):
+    """
+    Returns a function mapping a frame to display-ready uint8.
+
+    Grayscale frames go through a WindowLevelLUT (the header's window unless
+    center and width are given, else the full range of sample); color frames
+    are scaled by the range of sample, as in the viewer.
+    """
+    if sample.ndim == 3:
+        if sample.dtype == np.uint8:
+            return lambda frame: frame
+        low, high = sample.min(), sample.max()
+        return lambda frame: to_uint8(frame, low, high)
+
+    lut = WindowLevelLUT(ds, sample.dtype, center, width)
+    if lut.center is None or lut.width is None:
+        lut.auto_window(sample)
+    return lut.apply
+
+class _Failed:
+    """Carries an exception raised in a stage thread to the next stage."""
+
+    def __init__(self, error):
+        self.error = error
+
+_DONE = object()
+
+def _put(target, item, stop):
+    """Queues item unless stop is set first; returns whether it was queued."""
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _drain(source, stop):
+    """Yields the items of a stage queue until its producer finishes or stop is set, re-raising errors."""
+    while not stop.is_set():
+        try:
+            item = source.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        if isinstance(item, _Failed):
+            raise item.error
+        yield item
+
+def _run_stage(items, work, target, stop, timings, stage):
+    """
+    Thread body of a pipeline stage: queues work(item) for each item.
+
+    The time spent in work is charged to stage; without work, the time spent
+    producing items is (iter_frames decodes inside next()).
+    """
+    iterator = iter(items)
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            if work is None:
+                timings[stage] += time.perf_counter() - start
+            else:
+                start = time.perf_counter()
+                index, frame = item
+                item = index, work(frame)
+                timings[stage] += time.perf_counter() - start
+            if not _put(target, item, stop):
+                return
+    except Exception as e:
+        _put(target, _Failed(e), stop)
+        return
+    finally:
+        if hasattr(iterator, 'close'):
+            iterator.close()
+    _put(target, _DONE, stop)
+
+def _encode_png(path, image, level):
+    """Writes image to path as PNG; returns (bytes written, seconds)."""
+    from PIL import Image
+
+    start = time.perf_counter()
+    Image.fromarray(np.ascontiguousarray(image)).save(path, compress_level=level)
+    return os.path.getsize(path), time.perf_counter() - start
+
+class _PngWriter:
+    """Encodes frames to numbered PNG files on a thread pool (zlib releases the GIL)."""
+
+    def __init__(self, directory, count, workers, level=DEFAULT_PNG_LEVEL):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.digits = max(4, len(str(count)))
+        self.level = level
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending = deque()
+
+    def _collect(self, stats):
+        written, seconds = self.pending.popleft().result()
+        stats.bytes += written
+        stats.stage_seconds['encode'] += seconds
+        stats.frames += 1
+
+    def write(self, position, index, image, stats):
+        path = os.path.join(self.directory, f"{index + 1:0{self.digits}d}.png")
+        self.pending.append(self.executor.submit(_encode_png, path, image, self.level))
+        while len(self.pending) >= self.workers * 2:
+            self._collect(stats)
+
+    def close(self, stats, completed=True):
+        try:
+            while self.pending:
+                self._collect(stats)
+        finally:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+class _ArrayWriter:
+    """Base of the writers that store frames in order, timed on the calling thread."""
+
+    def write(self, position, index, frame, stats):
+        start = time.perf_counter()
+        stats.bytes += self._write(position, frame)
+        stats.stage_seconds['encode'] += time.perf_counter() - start
+        stats.frames += 1
+
+    def _check(self, index, frame):
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Frame {index + 1} has shape {frame.shape}, expected {self.frame_shape}")
+
+class _NpyWriter(_ArrayWriter):
+    """Copies frames into a ``.npy`` memory map, so volumes of any size are written without RAM."""
+
+    def __init__(self, path, count, sample):
+        self.path = path
+        self.frame_shape = sample.shape
+        self.partial = path + '.partial'
+        self.output = np.lib.format.open_memmap(self.partial, mode='w+', dtype=sample.dtype.newbyteorder('='),
+                                                shape=(count,) + sample.shape)
+
+    def write(self, position, index, frame, stats):
+        self._check(index, frame)
+        super().write(position, index, frame, stats)
+
+    def _write(self, position, frame):
+        self.output[position] = frame
+        return frame.size * self.output.dtype.itemsize
+
+    def close(self, stats, completed=True):
+        self.output.flush()
+        del self.output
+        if completed:
+            os.replace(self.partial, self.path)
+        else:
+            os.remove(self.partial)
+
+class _NpzWriter(_ArrayWriter):
+    """Streams frames into the ``pixels.npy`` member of a ``.npz`` archive, as np.load expects it."""
+
+    def __init__(self, path, count, sample, compress=False):
+        self.path = path
+        self.frame_shape = sample.shape
+        self.dtype = sample.dtype.newbyteorder('=')
+        self.partial = path + '.partial'
+        compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        self.archive = zipfile.ZipFile(self.partial, 'w', compression=compression, allowZip64=True)
+        self.member = self.archive.open('pixels.npy', 'w', force_zip64=True)
+        header = {'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False,
+                  'shape': (count,) + sample.shape}
+        np.lib.format.write_array_header_2_0(self.member, header)
+
+    def write(self, position, index, frame, stats):
+        self._check(index, frame)
+        super().write(position, index, frame, stats)
+
+    def _write(self, position, frame):
+        data = np.ascontiguousarray(frame, dtype=self.dtype)
+        self.member.write(memoryview(data).cast('B'))
+        return data.nbytes
+
+    def close(self, stats, completed=True):
+        self.member.close()
+        self.archive.close()
+        if completed:
+            os.replace(self.partial, self.path)
+        else:
+            os.remove(self.partial)
+
+class _RawWriter(_ArrayWriter):
+    """Writes frames back to back to a file, or to stdout for path '-'."""
+
+    def __init__(self, path, sample):
+        self.frame_shape = sample.shape
+        self.stream = sys.stdout.buffer if path == '-' else open(path, 'wb')
+
+    def write(self, position, index, frame, stats):
+        self._check(index, frame)
+        super().write(position, index, frame, stats)
+
+    def _write(self, position, frame):
+        data = np.ascontiguousarray(frame)
+        self.stream.write(memoryview(data).cast('B'))
+        return data.nbytes
+
+    def close(self, stats, completed=True):
+        if self.stream is sys.stdout.buffer:
+            self.stream.flush()
+        else:
+            self.stream.close()
+
+def raw_encoder_hint(path, frame_shape, fps):
+    """Returns an ffmpeg command line that encodes a raw export of uint8 frames of frame_shape."""
+    pixel_format = 'rgb24' if len(frame_shape) == 3 else 'gray'
+    rows, columns = frame_shape[:2]
+    source = '-' if path == '-' else f'"{path}"'
+    return (f"ffmpeg -f rawvideo -pix_fmt {pixel_format} -video_size {columns}x{rows} "
+            f"-framerate {fps:g} -i {source} -pix_fmt yuv420p out.mp4")
+
+def export_frames(frames, ds, output, fmt, indices=None, windowed=None, center=None, width=None,
+                  workers=None, encoders=None, compress=False, png_level=DEFAULT_PNG_LEVEL,
+                  progress=None):
+    """
+    Exports frames through the decode -> window -> encode pipeline.
+
+    Args:
+        frames: Frame accessor (FrameAccessor, SeriesFrames, Volume, ...).
+        ds (Dataset): Header used for windowing.
+        output (str): Folder for 'png'; file (or '-' for stdout with 'raw') otherwise.
+        fmt (str): One of FORMATS.
+        indices (list): Frame numbers to export (default: every frame).
+        windowed (bool): Window to uint8 (default: True except for 'npy' and 'npz').
+        center, width (float): VOI window overriding the header's.
+        workers (int): Decode workers (default: DECODE_WORKERS).
+        encoders (int): PNG encoding threads (default: DECODE_WORKERS).
+        compress (bool): Deflate the 'npz' archive.
+        png_level (int): zlib level of 'png' frames.
+        progress (callable): Called as progress(done, total) from the calling thread.
+
+    Returns:
+        ExportStats: Frames, bytes written and per-stage busy time.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    if windowed is None:
+        windowed = fmt not in ('npy', 'npz')
+    if fmt in ('png', 'raw') and not windowed:
+        raise ValueError(f"{fmt} export needs windowed frames")
+    indices = list(range(len(frames)) if indices is None else indices)
+    stats = ExportStats(len(indices))
+    if not indices:
+        stats.finish()
+        return stats
+
+    sample = frames.frame(indices[0])
+    window = make_windower(ds, sample, center, width) if windowed else None
+    if window is not None:
+        sample = window(sample)
+    stats.frame_shape = sample.shape
+
+    if fmt == 'png':
+        writer = _PngWriter(output, max(indices) + 1, encoders or DECODE_WORKERS, png_level)
+    elif fmt == 'npy':
+        writer = _NpyWriter(output, len(indices), sample)
+    elif fmt == 'npz':
+        writer = _NpzWriter(output, len(indices), sample, compress)
+    else:
+        writer = _RawWriter(output, sample)
+
+    stop = threading.Event()
+    decoded = queue.Queue(QUEUE_DEPTH)
+    threads = [threading.Thread(target=_run_stage, daemon=True, args=(
+        iter_frames(frames, indices, workers), None, decoded, stop, stats.stage_seconds, 'decode'))]
+    source = decoded
+    if window is not None:
+        source = queue.Queue(QUEUE_DEPTH)
+        threads.append(threading.Thread(target=_run_stage, daemon=True, args=(
+            _drain(decoded, stop), window, source, stop, stats.stage_seconds, 'window')))
+    for thread in threads:
+        thread.start()
+
+    completed = False
+    try:
+        for position, (index, frame) in enumerate(_drain(source, stop)):
+            writer.write(position, index, frame, stats)
+            if progress is not None:
+                progress(position + 1, len(indices))
+        completed = True
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        writer.close(stats, completed)
+    stats.finish()
+    return stats
+
+def _safe_name(text):
+    return SAFE_NAME.sub('_', text).strip('._') or 'export'
+
+def export_jobs(root, catalog_path=None):
+    """
+    Yields (name, open) for each file or series to export from root.
+
+    A file is one job. A folder is scanned into the series catalog and each
+    series becomes a job; a series of a single file is exported as that file.
+    open() returns (frames, header) and the caller closes the frames.
+    """
+    if os.path.isfile(root):
+        yield _safe_name(os.path.splitext(os.path.basename(root))[0]), lambda: _open_file(root)
+        return
+
+    catalog = SeriesCatalog(catalog_path)
+    try:
+        catalog.scan(root)
+        jobs = []
+        for info in catalog.series(root):
+            members = catalog.instance_frames(info.series_uid, root)
+            number = info.series_number if info.series_number is not None else 0
+            name = _safe_name(f"{info.modality}_{number}_{info.series_uid}")
+            jobs.append((name, members))
+    finally:
+        catalog.close()
+
+    for name, members in jobs:
+        if len(members) == 1:
+            yield name, lambda path=members[0][0]: _open_file(path)
+        else:
+            yield name, lambda members=members: _open_series(members)
+
+def _open_file(path):
+    ds = pydicom.dcmread(path, defer_size=DEFER_SIZE)
+    return open_frames(ds), ds
+
+def _open_series(members):
+    return SeriesFrames(members), pydicom.dcmread(members[0][0], stop_before_pixels=True)
+
+def output_for(output_dir, name, fmt):
+    """Returns the folder ('png') or file a job named name is exported to."""
+    if fmt == 'png':
+        return os.path.join(output_dir, name)
+    return os.path.join(output_dir, f"{name}.{fmt}")
+
+def parse_frames(text):
+    """Parses 'START:STOP[:STEP]' or a single frame number into a slice."""
+    parts = [int(part) if part else None for part in text.split(':')]
+    if len(parts) == 1:
+        return slice(parts[0], parts[0] + 1 or None)
+    if len(parts) > 3:
+        raise ValueError(f"Bad frame range {text!r}")
+    return slice(*parts)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export DICOM frames and series as images or arrays.")
+    parser.add_argument('root', help="DICOM file, or folder whose series are exported")
+    parser.add_argument('--format', choices=FORMATS, default='png', help="Export format (default: png)")
+    parser.add_argument('--output', required=True,
+                        help="Output folder; '-' streams a single raw export to stdout")
+    parser.add_argument('--frames', type=parse_frames, help="Frames to export, as START:STOP[:STEP]")
+    parser.add_argument('--windowed', action='store_true', help="Export windowed 8-bit npy/npz frames")
+    parser.add_argument('--center', type=float, help="Window center (default: from the header)")
+    parser.add_argument('--width', type=float, help="Window width (default: from the header)")
+    parser.add_argument('--workers', type=int, default=None, help="Decode workers (default: CPU count)")
+    parser.add_argument('--encoders', type=int, default=None, help="PNG encoding threads (default: CPU count)")
+    parser.add_argument('--compress', action='store_true', help="Deflate npz archives")
+    parser.add_argument('--png-level', type=int, default=DEFAULT_PNG_LEVEL, help="PNG zlib level, 0-9")
+    parser.add_argument('--catalog', help="Series catalog used for folders")
+    parser.add_argument('--quiet', action='store_true', help="Only print errors and the summary")
+    args = parser.parse_args(argv)
+    if (args.center is None) != (args.width is None):
+        parser.error("--center and --width go together")
+    to_stdout = args.output == '-'
+    if to_stdout and (args.format != 'raw' or not os.path.isfile(args.root)):
+        parser.error("--output - streams one file's raw export")
+    # Progress goes to stderr, which stays free when frames stream to stdout
+    log = sys.stderr
+
+    total = ExportStats()
+    failed = 0
+    for name, opener in export_jobs(args.root, args.catalog):
+        output = '-' if to_stdout else output_for(args.output, name, args.format)
+        try:
+            frames, ds = opener()
+        except Exception as e:
+            print(f"ERROR {name}: {str(e)}", file=log)
+            failed += 1
+            continue
+        try:
+            indices = range(len(frames))[args.frames] if args.frames else None
+            if not to_stdout:
+                os.makedirs(args.output, exist_ok=True)
+            stats = export_frames(frames, ds, output, args.format, indices,
+                                  windowed=True if args.windowed else None, center=args.center,
+                                  width=args.width, workers=args.workers, encoders=args.encoders,
+                                  compress=args.compress, png_level=args.png_level)
+            if args.format == 'raw' and stats.frames:
+                hint = raw_encoder_hint(output, stats.frame_shape, cine_frame_rate(ds))
+                print(f"Encode with: {hint}", file=log)
+        except Exception as e:
+            print(f"ERROR {name}: {str(e)}", file=log)
+            failed += 1
+            continue
+        finally:
+            frames.close()
+        if not args.quiet:
+            print(f"{name}: {stats.summary().splitlines()[0]}", file=log)
+        total.add(stats)
+    total.finish()
+    print(total.summary(), file=log)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,518 @@
+"""Lazy, frame-on-demand pixel access for DICOM files.
+
+``FrameAccessor`` never decodes the whole Pixel Data element. Native
+(uncompressed) frames are memory-mapped straight from the file; encapsulated
+frames are located through the Basic or Extended Offset Table and only the
+requested frame's fragments are read and decoded. Decoded frames are kept in
+a ``FrameCache`` (memory LRU plus on-disk ``.npy`` files keyed by
+SOPInstanceUID), so scrubbing stays cheap and re-opening a study skips
+decompression. Accessors are safe to share with decoding threads.
+
+``decode_frames`` and ``iter_frames`` decode many frames of an encapsulated
+file at once on a thread or process pool (``DECODE_WORKERS`` workers by
+default), delivering them in frame order.
+"""
+import hashlib
+import mmap
+import os
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.encaps import encapsulate
+from pydicom.uid import UID
+
+from dicom_cache import FrameCache, default_frame_cache
+from dicom_trace import span
+
+ITEM_TAG = 0xFFFEE000
+SEQUENCE_DELIMITER_TAG = 0xFFFEE0DD
+UNDEFINED_LENGTH = 0xFFFFFFFF
+NATIVE_SYNTAXES = {
+    '1.2.840.10008.1.2',    # Implicit VR Little Endian
+    '1.2.840.10008.1.2.1',  # Explicit VR Little Endian
+    '1.2.840.10008.1.2.2',  # Explicit VR Big Endian
+}
+NATIVE_PHOTOMETRICS = {'MONOCHROME1', 'MONOCHROME2', 'RGB', 'PALETTE COLOR'}
+# Pixel module attributes copied onto the single-frame dataset handed to the decoder
+PIXEL_MODULE_KEYWORDS = [
+    'SamplesPerPixel', 'PhotometricInterpretation', 'PlanarConfiguration',
+    'Rows', 'Columns', 'BitsAllocated', 'BitsStored', 'HighBit',
+    'PixelRepresentation', 'RedPaletteColorLookupTableDescriptor',
+    'GreenPaletteColorLookupTableDescriptor', 'BluePaletteColorLookupTableDescriptor',
+]
+
+# Values deferred when a file is read only for its frames, so Pixel Data stays
+# on disk until it is mapped or decoded
+FRAME_DEFER_SIZE = '1 KB'
+
+# pydicom 2.x takes the encoding from the dataset's is_little_endian/is_implicit_VR
+# and has no enforce_file_format argument to save_as
+LEGACY_PYDICOM = int(pydicom.__version__.split('.')[0]) < 3
+
+class UnsupportedLayout(Exception):
+    """Raised by FrameAccessor for pixel data it cannot map or index; callers fall back to pydicom."""
+
+def _is_frame_start(fragment):
+    """Returns True if a fragment begins a JPEG, JPEG-LS or JPEG 2000 codestream."""
+    return (fragment.startswith(b'\xff\xd8')           # JPEG / JPEG-LS SOI
+            or fragment.startswith(b'\xff\x4f\xff\x51')  # JPEG 2000 codestream
+            or fragment[4:12] == b'jP  \r\n\x87\n')      # JP2 file signature box
+
+class FrameAccessor:
+    """
+    Random access to the frames of a DICOM file without decoding all of them.
+
+    With writable set, native pixel data is mapped read/write so it can be
+    edited in place (e.g. for redaction); decoded frames are never written back.
+    """
+
+    def __init__(self, filepath, frame_cache=None, writable=False):
+        self.filepath = filepath
+        self.writable = writable
+        self.frame_cache = frame_cache if frame_cache is not None else default_frame_cache()
+        self._file = open(filepath, 'rb')
+        try:
+            self.header = pydicom.dcmread(self._file, stop_before_pixels=True)
+            self._pixel_offset = self._file.tell()
+            self._init_geometry()
+            self._locate_pixel_data()
+        except Exception:
+            self.close()
+            raise
+        self.cache_key = self._cache_key()
+        # Copies of an instance keep its UID; the encoding digest keeps their frames apart
+        encoding = (f"{self.transfer_syntax}|{self.rows}|{self.columns}|{self.samples}|"
+                    f"{self.bits_allocated}|{self.bits_stored}|{self.pixel_representation}|"
+                    f"{self.photometric}|{self.number_of_frames}|"
+                    f"{os.path.getsize(filepath) - self._value_offset}")
+        self.cache_variant = hashlib.sha1(encoding.encode('utf-8')).hexdigest()[:16]
+
+    def _cache_key(self):
+        """Returns the SOPInstanceUID, or a digest of the file's identity if it has none."""
+        uid = str(self.header.get('SOPInstanceUID', '')).strip()
+        if uid:
+            return uid
+        stat = os.stat(self.filepath)
+        identity = f"{os.path.abspath(self.filepath)}|{stat.st_mtime}|{stat.st_size}"
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    def _init_geometry(self):
+        header = self.header
+        if 'Rows' not in header or 'Columns' not in header:
+            raise UnsupportedLayout("Dataset has no image pixel module")
+
+        transfer_syntax = header.file_meta.get('TransferSyntaxUID')
+        if transfer_syntax is None:
+            raise UnsupportedLayout("File has no transfer syntax")
+
+        self.transfer_syntax = UID(transfer_syntax)
+        self.rows = int(header.Rows)
+        self.columns = int(header.Columns)
+        self.samples = int(header.get('SamplesPerPixel', 1))
+        self.bits_allocated = int(header.get('BitsAllocated', 8))
+        self.bits_stored = int(header.get('BitsStored', self.bits_allocated))
+        self.pixel_representation = int(header.get('PixelRepresentation', 0))
+        self.planar_configuration = int(header.get('PlanarConfiguration', 0))
+        self.photometric = str(header.get('PhotometricInterpretation', 'MONOCHROME2'))
+        self.number_of_frames = int(header.get('NumberOfFrames', 1) or 1)
+
+    @property
+    def frame_shape(self):
+        if self.samples > 1:
+            return (self.rows, self.columns, self.samples)
+        return (self.rows, self.columns)
+
+    @property
+    def shape(self):
+        """Shape of the full pixel array as pydicom would report it."""
+        if self.number_of_frames > 1:
+            return (self.number_of_frames,) + self.frame_shape
+        return self.frame_shape
+
+    def __len__(self):
+        return self.number_of_frames
+
+    def __getitem__(self, index):
+        return self.frame(index)
+
+    def _locate_pixel_data(self):
+        """Reads the Pixel Data element header at the offset dcmread stopped at."""
+        little = self.transfer_syntax.is_little_endian
+        implicit = self.transfer_syntax.is_implicit_VR
+        endian = '<' if little else '>'
+
+        self._file.seek(self._pixel_offset)
+        raw = self._file.read(12)
+        if len(raw) < 8:
+            raise UnsupportedLayout("File has no Pixel Data")
+        group, element = struct.unpack(endian + 'HH', raw[:4])
+        if (group, element) != (0x7FE0, 0x0010):
+            raise UnsupportedLayout("Float pixel data is not supported")
+
+        if implicit:
+            length = struct.unpack(endian + 'L', raw[4:8])[0]
+            value_offset = self._pixel_offset + 8
+        else:
+            length = struct.unpack(endian + 'L', raw[8:12])[0]
+            value_offset = self._pixel_offset + 12
+
+        self._value_offset = value_offset
+        self.encapsulated = length == UNDEFINED_LENGTH
+        if self.encapsulated:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._frame_fragments = self._index_fragments()
+        else:
+            self._native = self._map_native(value_offset, length)
+
+    @property
+    def _map_mode(self):
+        return 'r+' if self.writable else 'r'
+
+    def _map_native(self, offset, length):
+        """Returns a (frames, ...) memmap over native pixel data."""
+        if self.transfer_syntax not in NATIVE_SYNTAXES:
+            raise UnsupportedLayout(f"Unexpected native transfer syntax {self.transfer_syntax}")
+        if self.bits_allocated not in (8, 16, 32, 64) or self.photometric not in NATIVE_PHOTOMETRICS:
+            raise UnsupportedLayout("Pixel layout needs pydicom's native handler")
+        if self.bits_allocated == 8 and not self.transfer_syntax.is_little_endian:
+            raise UnsupportedLayout("8-bit big endian data may be byte swapped")
+
+        kind = 'i' if self.pixel_representation else 'u'
+        endian = '<' if self.transfer_syntax.is_little_endian else '>'
+        dtype = np.dtype(f"{endian}{kind}{self.bits_allocated // 8}")
+        frame_pixels = self.rows * self.columns * self.samples
+        if length < frame_pixels * dtype.itemsize * self.number_of_frames:
+            raise UnsupportedLayout("Pixel Data is shorter than the image geometry")
+
+        if self.samples > 1 and self.planar_configuration == 1:
+            native = np.memmap(self.filepath, dtype=dtype, mode=self._map_mode, offset=offset,
+                               shape=(self.number_of_frames, self.samples, self.rows, self.columns))
+            return native.transpose(0, 2, 3, 1)
+
+        shape = (self.number_of_frames, self.rows, self.columns)
+        if self.samples > 1:
+            shape += (self.samples,)
+        return np.memmap(self.filepath, dtype=dtype, mode=self._map_mode, offset=offset, shape=shape)
+
+    def _read_item(self, position):
+        """Returns (tag, length, value position) for the item header at position."""
+        tag_group, tag_element, length = struct.unpack_from('<HHL', self._mmap, position)
+        return (tag_group << 16) | tag_element, length, position + 8
+
+    def _index_fragments(self):
+        """Maps each frame to a list of (offset, length) fragment spans."""
+        tag, bot_length, position = self._read_item(self._value_offset)
+        if tag != ITEM_TAG:
+            raise UnsupportedLayout("Encapsulated Pixel Data has no Basic Offset Table item")
+        basic_offsets = list(struct.unpack_from(f'<{bot_length // 4}L', self._mmap, position))
+        first_fragment = position + bot_length
+
+        extended = self.header.get('ExtendedOffsetTable')
+        extended_lengths = self.header.get('ExtendedOffsetTableLengths')
+        if extended is not None and extended_lengths is not None:
+            offsets = np.frombuffer(extended, dtype='<u8')
+            lengths = np.frombuffer(extended_lengths, dtype='<u8')
+            # Extended offsets point at the single item holding each frame
+            return [[(first_fragment + int(offset) + 8, int(length))]
+                    for offset, length in zip(offsets, lengths)]
+
+        fragments = []
+        position = first_fragment
+        size = len(self._mmap)
+        while position + 8 <= size:
+            tag, length, value = self._read_item(position)
+            if tag == SEQUENCE_DELIMITER_TAG:
+                break
+            if tag != ITEM_TAG:
+                raise UnsupportedLayout(f"Unexpected tag {tag:08X} in encapsulated Pixel Data")
+            fragments.append((position - first_fragment, value, length))
+            position = value + length
+
+        frames = self.number_of_frames
+        if basic_offsets:
+            starts = basic_offsets + [float('inf')]
+            frame_fragments = [[] for _ in range(len(basic_offsets))]
+            frame = 0
+            for relative, value, length in fragments:
+                while relative >= starts[frame + 1]:
+                    frame += 1
+                frame_fragments[frame].append((value, length))
+            return frame_fragments
+
+        if frames == 1:
+            return [[(value, length) for _, value, length in fragments]]
+        if len(fragments) == frames:
+            return [[(value, length)] for _, value, length in fragments]
+
+        # No offset table and several fragments per frame: split on codestream starts
+        frame_fragments = []
+        for _, value, length in fragments:
+            if not frame_fragments or _is_frame_start(self._mmap[value:value + 12]):
+                frame_fragments.append([])
+            frame_fragments[-1].append((value, length))
+        if len(frame_fragments) != frames:
+            raise UnsupportedLayout("Cannot locate frame boundaries in encapsulated Pixel Data")
+        return frame_fragments
+
+    def frame_bytes(self, index):
+        """Returns the encoded bytes of one encapsulated frame."""
+        return b''.join(self._mmap[value:value + length]
+                        for value, length in self._frame_fragments[index])
+
+    def _frame_dataset(self, index):
+        """Builds a single-frame dataset that pydicom's pixel handlers can decode."""
+        ds = Dataset()
+        ds.file_meta = FileMetaDataset()
+        ds.file_meta.TransferSyntaxUID = self.transfer_syntax
+        for keyword in PIXEL_MODULE_KEYWORDS:
+            if keyword in self.header:
+                setattr(ds, keyword, self.header[keyword].value)
+        ds.NumberOfFrames = 1
+        ds.PixelData = encapsulate([self.frame_bytes(index)])
+        if LEGACY_PYDICOM:
+            ds.is_little_endian = True
+            ds.is_implicit_VR = False
+        return ds
+
+    def _decode(self, index):
+        if self.encapsulated:
+            return self._frame_dataset(index).pixel_array
+
+        frame = self._native[index]
+        if self.pixel_representation and self.bits_stored < self.bits_allocated:
+            # Sign-extend values stored in fewer bits than allocated
+            shift = self.bits_allocated - self.bits_stored
+            frame = (frame.astype(frame.dtype.newbyteorder('=')) << shift) >> shift
+        return frame
+
+    def _check_index(self, index):
+        if index < 0:
+            index += self.number_of_frames
+        if not 0 <= index < self.number_of_frames:
+            raise IndexError(f"Frame {index} out of range (0-{self.number_of_frames - 1})")
+        return index
+
+    def cached_frame(self, index):
+        """Returns frame index if it can be had without decoding, otherwise None."""
+        index = self._check_index(index)
+        if not self.encapsulated and not (self.pixel_representation
+                                          and self.bits_stored < self.bits_allocated):
+            # Native frames are views into the memory map; the OS page cache is the cache
+            return self._native[index]
+
+        frame = self.frame_cache.get(self.cache_key, index, self.cache_variant)
+        if frame is not None and frame.shape == self.frame_shape:
+            return frame
+        return None
+
+    def remember(self, index, frame, persist=None):
+        """Adds a frame decoded elsewhere (e.g. in a worker process) to the frame cache."""
+        # Sign-extended native frames are cheap to redo, so only decompressed ones go to disk
+        persist = self.encapsulated if persist is None else persist
+        self.frame_cache.put(self.cache_key, index, frame, self.cache_variant, persist=persist)
+
+    def frame(self, index):
+        """Returns frame index as a NumPy array, decoding it only if not cached."""
+        index = self._check_index(index)
+        frame = self.cached_frame(index)
+        if frame is None:
+            with span('decode', 'decode', frame=index):
+                frame = self._decode(index)
+            self.remember(index, frame)
+        return frame
+
+    def native_array(self, raw=False):
+        """
+        Returns all frames as one (frames, ...) memmap, or None if they need decoding.
+
+        With raw set, native data is returned even if its values still need
+        sign extension, as stored in the file.
+        """
+        if self.encapsulated:
+            return None
+        if not raw and self.pixel_representation and self.bits_stored < self.bits_allocated:
+            return None
+        return self._native
+
+    def close(self):
+        self._native = None
+        if getattr(self, '_mmap', None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+class ArrayFrames:
+    """Frame accessor over an already decoded pixel array."""
+
+    def __init__(self, ds):
+        with span('decode', 'decode', frame='all'):
+            self.array = ds.pixel_array
+        self.number_of_frames = int(ds.get('NumberOfFrames', 1) or 1)
+        if self.number_of_frames == 1:
+            self.array = self.array[np.newaxis]
+        self.frame_shape = self.array.shape[1:]
+        self.shape = self.array.shape if self.number_of_frames > 1 else self.frame_shape
+        self.encapsulated = False
+
+    def __len__(self):
+        return self.number_of_frames
+
+    def __getitem__(self, index):
+        return self.frame(index)
+
+    def frame(self, index):
+        return self.array[index]
+
+    def close(self):
+        self.array = None
+
+def open_frames(ds, frame_cache=None):
+    """Returns a lazy frame accessor for ds, falling back to decoding pixel_array."""
+    filename = getattr(ds, 'filename', None)
+    if isinstance(filename, str) and os.path.isfile(filename):
+        try:
+            return FrameAccessor(filename, frame_cache)
+        except UnsupportedLayout as e:
+            print(f"Lazy frame access unavailable, decoding all frames: {str(e)}")
+    return ArrayFrames(ds)
+
+DEFAULT_FPS = 10.0
+
+def cine_frame_rate(ds, default=DEFAULT_FPS):
+    """Returns the intended playback rate in frames per second."""
+    try:
+        if ds is not None:
+            if 'CineRate' in ds and ds.CineRate:
+                return float(ds.CineRate)
+            if 'FrameTime' in ds and float(ds.FrameTime) > 0:
+                return 1000.0 / float(ds.FrameTime)
+            if 'RecommendedDisplayFrameRate' in ds and ds.RecommendedDisplayFrameRate:
+                return float(ds.RecommendedDisplayFrameRate)
+    except (TypeError, ValueError):
+        pass
+    return default
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, '')) or default
+    except ValueError:
+        return default
+
+# Frames decoded concurrently by iter_frames and decode_frames
+DECODE_WORKERS = _env_int('DICOM_VIEWER_DECODE_WORKERS', os.cpu_count() or 1)
+# 'thread' or 'process'; processes also scale decoders that hold the GIL, such as pydicom's RLE
+DECODE_POOL = os.environ.get('DICOM_VIEWER_DECODE_POOL', 'thread')
+# Frames handed to a worker process per task, so each task re-opens the file once
+PROCESS_CHUNK = 4
+
+def _decode_in_process(filepath, indices, cache_directory):
+    """Decodes frames of filepath in a worker process, sharing only the on-disk cache."""
+    frames = FrameAccessor(filepath, FrameCache(memory_bytes=0, directory=cache_directory))
+    try:
+        return [np.asarray(frames.frame(index)) for index in indices]
+    finally:
+        frames.close()
+
+def _decode_in_thread(frames, indices):
+    return [frames.frame(index) for index in indices]
+
+def iter_frames(frames, indices=None, workers=None, pool=None):
+    """
+    Yields (index, frame) for each of indices in order, decoding ahead in parallel.
+
+    Only encapsulated frames are farmed out; native ones are memory-mapped and
+    yielded directly. At most a couple of tasks per worker are in flight, and
+    closing the generator early cancels whatever has not started.
+
+    Args:
+        frames: Frame accessor (FrameAccessor, ArrayFrames, Volume, ...).
+        indices (iterable): Frame numbers (default: every frame).
+        workers (int): Concurrent decodes (default: DECODE_WORKERS).
+        pool (str): 'thread' or 'process' (default: DECODE_POOL). Worker
+            processes re-open the file, so they need a FrameAccessor.
+    """
+    indices = range(len(frames)) if indices is None else indices
+    workers = workers or DECODE_WORKERS
+    pool = pool or DECODE_POOL
+    if workers <= 1 or not getattr(frames, 'encapsulated', False):
+        for index in indices:
+            yield index, frames.frame(index)
+        return
+
+    processes = pool == 'process' and isinstance(frames, FrameAccessor)
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        chunk = PROCESS_CHUNK
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        chunk = 1
+
+    def submit(batch):
+        """Returns (batch, cached frames, future decoding the rest or None)."""
+        cached = [frames.cached_frame(index) for index in batch] if processes else [None] * len(batch)
+        missing = [index for index, frame in zip(batch, cached) if frame is None]
+        if not missing:
+            future = None
+        elif processes:
+            future = executor.submit(_decode_in_process, frames.filepath, missing,
+                                     frames.frame_cache.directory)
+        else:
+            future = executor.submit(_decode_in_thread, frames, missing)
+        return batch, cached, future
+
+    def deliver(batch, cached, future):
+        decoded = iter(future.result() if future is not None else ())
+        for index, frame in zip(batch, cached):
+            if frame is None:
+                frame = next(decoded)
+                if processes:
+                    # The worker already wrote the disk cache
+                    frames.remember(index, frame, persist=False)
+            yield index, frame
+
+    pending = deque()
+    batch = []
+    try:
+        for index in indices:
+            batch.append(index)
+            if len(batch) < chunk:
+                continue
+            pending.append(submit(batch))
+            batch = []
+            if len(pending) >= workers * 2:
+                yield from deliver(*pending.popleft())
+        if batch:
+            pending.append(submit(batch))
+        while pending:
+            yield from deliver(*pending.popleft())
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def decode_frames(frames, indices=None, out=None, workers=None, pool=None, progress=None):
+    """
+    Decodes frames in parallel into one preallocated array.
+
+    Args:
+        frames: Frame accessor.
+        indices (list): Frame numbers (default: every frame).
+        out (numpy.ndarray): (len(indices), ...) array to fill, e.g. a memory
+            map; allocated from the first frame when not given.
+        workers (int): Concurrent decodes (default: DECODE_WORKERS).
+        pool (str): 'thread' or 'process' (default: DECODE_POOL).
+        progress (callable): Called as progress(done, total) in frame order.
+
+    Returns:
+        numpy.ndarray: out, holding the frames in the order of indices.
+    """
+    indices = list(range(len(frames)) if indices is None else indices)
+    for position, (_, frame) in enumerate(iter_frames(frames, indices, workers, pool)):
+        if out is None:
+            out = np.empty((len(indices),) + frame.shape, dtype=frame.dtype.newbyteorder('='))
+        out[position] = frame
+        if progress is not None:
+            progress(position + 1, len(indices))
+    return out
@@ -0,0 +1,203 @@
+"""Background loading of DICOM files.
+
+``FileLoaderThread`` reads a file off the GUI thread in three stages: the
+header is parsed (Pixel Data stays deferred), the pixel data is opened
+(memory-mapped, or its fragments indexed) and then the frames of compressed
+files are decoded ahead into the frame cache. The header is handed to the GUI
+as soon as it is parsed and the frames as soon as they are opened, so the
+first frame shows without waiting for the rest; the decoding that follows is
+a prefetch that can be cancelled between frames.
+
+``SeriesScanThread`` and ``SeriesLoaderThread`` do the same for a folder:
+the first indexes it through the series catalog, the second reads the chosen
+series and assembles its slices into a volume.
+"""
+import threading
+
+import pydicom
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from dicom_catalog import SeriesCatalog
+from dicom_frames import iter_frames, open_frames
+from dicom_tag_format import DEFER_SIZE
+from dicom_trace import file_scope, span
+from dicom_volume import build_volume
+
+STAGES = ['Parsing header', 'Reading pixel data', 'Decoding frames']
+
+class LoadCancelled(Exception):
+    pass
+
+class CancellableThread(QThread):
+    """A worker thread that stops at its next _check_cancelled() once cancel() is called."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _check_cancelled(self):
+        if self._cancel.is_set():
+            raise LoadCancelled()
+
+    def _checked_progress(self, *args):
+        """Emits progress(*args), stopping first if cancelled; a progress callback for long library calls."""
+        self._check_cancelled()
+        self.progress.emit(*args)
+
+class FileLoaderThread(CancellableThread):
+    """
+    Loads one DICOM file in the background.
+
+    Signals:
+        header_loaded(ds): The parsed header; Pixel Data is still deferred.
+        progress(stage, done, total): Index into STAGES and its progress;
+            total is 0 while a stage's length is unknown.
+        ready(ds, frames): The frames are open and can be displayed; any
+            frame not prefetched yet is decoded when it is asked for.
+        loaded(ds, frames): Prefetching finished; every frame is decoded and cached.
+        failed(message): Loading raised an error.
+        cancelled(): cancel() was called before loading finished. Frames
+            already handed over by ready stay open.
+    """
+    header_loaded = pyqtSignal(object)
+    progress = pyqtSignal(int, int, int)
+    ready = pyqtSignal(object, object)
+    loaded = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, filepath, parent=None):
+        super().__init__(parent)
+        self.filepath = filepath
+
+    def run(self):
+        with file_scope(self.filepath):
+            self._load()
+
+    def _load(self):
+        frames = None
+        # Once displayed, the frames belong to the display and are not closed here
+        handed_over = False
+        try:
+            self.progress.emit(0, 0, 0)
+            # Large values such as Pixel Data stay on disk until they are accessed
+            with span('read', 'io'):
+                ds = pydicom.dcmread(self.filepath, defer_size=DEFER_SIZE)
+            self.header_loaded.emit(ds)
+            self._check_cancelled()
+
+            self.progress.emit(1, 0, 0)
+            with span('open_frames', 'io'):
+                frames = open_frames(ds)
+            self._check_cancelled()
+            self.ready.emit(ds, frames)
+            handed_over = True
+
+            # Native frames are memory-mapped and need no decoding ahead
+            if getattr(frames, 'encapsulated', False):
+                total = len(frames)
+                self.progress.emit(2, 0, total)
+                decoded = iter_frames(frames)
+                try:
+                    for done, _ in enumerate(decoded, 1):
+                        self._check_cancelled()
+                        self.progress.emit(2, done, total)
+                finally:
+                    decoded.close()
+            self.loaded.emit(ds, frames)
+        except LoadCancelled:
+            if frames is not None and not handed_over:
+                frames.close()
+            self.cancelled.emit()
+        except Exception as e:
+            if frames is not None and not handed_over:
+                frames.close()
+            self.failed.emit(f"Error loading file: {str(e)}")
+
+class SeriesScanThread(CancellableThread):
+    """
+    Indexes a folder through the series catalog in the background.
+
+    Signals:
+        progress(done, total): Headers read so far.
+        scanned(stats, series): The ScanStats and the SeriesInfo of the folder's series.
+        failed(message): Scanning raised an error.
+        cancelled(): cancel() was called before the scan finished; the
+            headers committed so far stay in the catalog.
+    """
+    progress = pyqtSignal(int, int)
+    scanned = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, folder, parent=None):
+        super().__init__(parent)
+        self.folder = folder
+
+    def run(self):
+        try:
+            # SQLite connections belong to the thread that opens them
+            catalog = SeriesCatalog()
+            try:
+                # Files already in the catalog with the same mtime and size are not re-read
+                stats = catalog.scan(self.folder, progress=self._checked_progress)
+                series = catalog.series(self.folder)
+            finally:
+                catalog.close()
+            self._check_cancelled()
+            self.scanned.emit(stats, series)
+        except LoadCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(f"Error opening series: {str(e)}")
+
+class SeriesLoaderThread(CancellableThread):
+    """
+    Reads one series of a scanned folder and assembles its slices into a volume.
+
+    Signals:
+        progress(done, total): Slices assembled so far.
+        loaded(ds, path, frames): The first file's header and path, and a
+            Volume (or the file's frames when the series has a single file).
+        failed(message): Loading raised an error.
+        cancelled(): cancel() was called before the volume was assembled.
+    """
+    progress = pyqtSignal(int, int)
+    loaded = pyqtSignal(object, str, object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, folder, series_uid, parent=None):
+        super().__init__(parent)
+        self.folder = folder
+        self.series_uid = series_uid
+
+    def run(self):
+        try:
+            catalog = SeriesCatalog()
+            try:
+                instances = catalog.instance_frames(self.series_uid, self.folder)
+            finally:
+                catalog.close()
+            paths = [path for path, _ in instances]
+            if not paths:
+                raise ValueError("The series has no files left in this folder")
+
+            self._check_cancelled()
+            with span('read', 'io'):
+                ds = pydicom.dcmread(paths[0], defer_size=DEFER_SIZE)
+            if len(paths) == 1:
+                self.loaded.emit(ds, paths[0], open_frames(ds))
+                return
+            # Slices are assembled into a memory-mapped volume, cached on disk for the next open
+            volume = build_volume(paths, progress=self._checked_progress,
+                                  frame_counts=[count for _, count in instances])
+            print(f"Volume {volume.shape}, spacing {volume.spacing} mm")
+            self.loaded.emit(ds, paths[0], volume)
+        except LoadCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(f"Error opening series: {str(e)}")
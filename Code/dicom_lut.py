@@ -0,0 +1,192 @@
+"""Modality and VOI (window/level) lookup tables.
+
+Stored integer values are mapped to display uint8 with one table lookup per
+pixel: the Rescale Slope/Intercept and the linear Window Center/Width
+function are folded into a single table covering every possible stored
+value. ``WindowedFrames`` applies the table to a frame accessor and caches
+the output per frame and window setting.
+"""
+import copy
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from pydicom.multival import MultiValue
+
+from dicom_trace import span
+
+# Tables are built for stored values up to this many bits; wider data uses float math
+MAX_TABLE_BITS = 16
+
+def to_uint8(frame, low=None, high=None):
+    """Linearly maps frame from [low, high] (default: its own range) to uint8."""
+    if frame.dtype == np.uint8 and low is None and high is None:
+        return frame
+    if low is None:
+        low = frame.min()
+    if high is None:
+        high = frame.max()
+    scale = 255.0 / max(float(high) - float(low), 1e-12)
+    scaled = (frame.astype(np.float32) - float(low)) * scale
+    return np.clip(scaled, 0, 255, out=scaled).astype(np.uint8)
+
+def _first_value(value):
+    """Returns the first of a possibly multi-valued element as a float."""
+    if isinstance(value, MultiValue):
+        value = value[0] if len(value) else None
+    if value is None or value == '':
+        return None
+    return float(value)
+
+def modality_rescale(ds):
+    """Returns (slope, intercept) from the Modality LUT module, defaulting to identity."""
+    slope = _first_value(ds.get('RescaleSlope', None)) if ds is not None else None
+    intercept = _first_value(ds.get('RescaleIntercept', None)) if ds is not None else None
+    return (slope if slope else 1.0), (intercept or 0.0)
+
+def voi_window(ds):
+    """Returns (center, width) from the VOI LUT module, or (None, None) if absent."""
+    if ds is None:
+        return None, None
+    center = _first_value(ds.get('WindowCenter', None))
+    width = _first_value(ds.get('WindowWidth', None))
+    if center is None or not width:
+        return None, None
+    return center, width
+
+def voi_linear(values, center, width):
+    """Applies the DICOM linear VOI function to modality values, returning uint8."""
+    width = max(float(width), 1.0)
+    scaled = ((values - (center - 0.5)) / max(width - 1.0, 1.0) + 0.5) * 255.0
+    return np.clip(scaled, 0, 255).astype(np.uint8)
+
+class WindowLevelLUT:
+    """Maps stored pixel values to uint8 through modality rescale and a VOI window."""
+
+    def __init__(self, ds=None, dtype=np.uint16, center=None, width=None, invert=None):
+        self.slope, self.intercept = modality_rescale(ds)
+        self.dtype = np.dtype(dtype)
+        if invert is None:
+            invert = ds is not None and str(ds.get('PhotometricInterpretation', '')) == 'MONOCHROME1'
+        self.invert = invert
+        self.table = None
+        default_center, default_width = voi_window(ds)
+        self.center = center if center is not None else default_center
+        self.width = width if width is not None else default_width
+
+    @property
+    def uses_table(self):
+        return self.dtype.kind in 'ui' and self.dtype.itemsize * 8 <= MAX_TABLE_BITS
+
+    def auto_window(self, frame):
+        """Sets the window to the full modality range of frame."""
+        low = float(frame.min()) * self.slope + self.intercept
+        high = float(frame.max()) * self.slope + self.intercept
+        low, high = min(low, high), max(low, high)
+        self.set_window((low + high) / 2.0, max(high - low, 1.0))
+
+    def set_window(self, center, width):
+        self.center = float(center)
+        self.width = max(float(width), 1.0)
+        self.table = None
+
+    def with_window(self, center, width):
+        """Returns a copy of this LUT using a different window."""
+        lut = copy.copy(self)
+        lut.set_window(center, width)
+        return lut
+
+    def _build_table(self):
+        """Builds a uint8 table indexed by the stored value's unsigned bit pattern."""
+        size = 1 << (self.dtype.itemsize * 8)
+        unsigned = np.arange(size, dtype=np.dtype(f'u{self.dtype.itemsize}'))
+        # Signed data is looked up through its unsigned view, so the table is ordered the same way
+        stored = unsigned.view(self.dtype.newbyteorder('=')) if self.dtype.kind == 'i' else unsigned
+        table = voi_linear(stored * self.slope + self.intercept, self.center, self.width)
+        self.table = 255 - table if self.invert else table
+
+    def apply(self, frame):
+        """Returns frame windowed to uint8."""
+        with span('lut', 'lut'):
+            return self._apply(frame)
+
+    def _apply(self, frame):
+        if self.center is None:
+            self.auto_window(frame)
+
+        if self.uses_table and frame.dtype.kind in 'ui' and frame.dtype.itemsize == self.dtype.itemsize:
+            if self.table is None:
+                self._build_table()
+            index = frame.view(np.dtype(f'u{frame.dtype.itemsize}').newbyteorder(frame.dtype.byteorder))
+            return np.take(self.table, index)
+
+        values = frame.astype(np.float32) * self.slope + self.intercept
+        output = voi_linear(values, self.center, self.width)
+        return 255 - output if self.invert else output
+
+class WindowedFrames:
+    """
+    Frame accessor yielding display-ready uint8 frames.
+
+    Grayscale frames go through a WindowLevelLUT; color frames are passed
+    through (scaled to uint8 if needed). Output is cached per frame and
+    window setting in an LRU bounded by bytes.
+    """
+
+    def __init__(self, frames, ds=None, cache_bytes=256 * 1024 * 1024):
+        self.frames = frames
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+        first = frames[0]
+        self.color = first.ndim == 3
+        self.lut = WindowLevelLUT(ds, first.dtype)
+        if not self.color and self.lut.center is None:
+            self.lut.auto_window(first)
+        # Color frames keep the first frame's range, like matplotlib's imshow did
+        self._color_range = (None, None) if first.dtype == np.uint8 else (first.min(), first.max())
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return self.frame(index)
+
+    @property
+    def window(self):
+        return self.lut.center, self.lut.width
+
+    def set_window(self, center, width):
+        """Changes the VOI window; frames already windowed with it stay cached."""
+        # Swapped rather than mutated so decode threads keep a consistent LUT
+        self.lut = self.lut.with_window(center, width)
+
+    def adjust_window(self, delta_center, delta_width):
+        center, width = self.window
+        self.set_window(center + delta_center, width + delta_width)
+
+    def frame(self, index):
+        lut = self.lut
+        key = (index, lut.center, lut.width)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        frame = self.frames.frame(index)
+        if self.color:
+            output = to_uint8(frame, *self._color_range)
+        else:
+            output = lut.apply(frame)
+
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+            self._cache[key] = output
+            self._cached_bytes += output.nbytes
+            while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= evicted.nbytes
+        return output
@@ -0,0 +1,185 @@
+"""Thumbnail mosaics for paging through large volumes.
+
+Each slice is reduced once by a block mean in NumPy and the thumbnails of a
+page are tiled into a single array, so a page is one image for matplotlib to
+draw instead of one subplot per slice. Thumbnails keep the stored pixel
+values, which lets window/level changes re-use them, and are cached on disk
+per series in a ``.npy`` memory map that a background thread fills ahead of
+the pages being viewed.
+"""
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from dicom_frames import iter_frames
+from dicom_lut import WindowLevelLUT, to_uint8
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.dicom_viewer', 'thumbnails')
+# Longest side of a thumbnail in pixels
+DEFAULT_TILE = 128
+
+def block_mean(frame, factor):
+    """Downsamples frame by averaging factor x factor blocks (edges that do not fill a block are dropped)."""
+    if factor <= 1:
+        return frame
+    rows = frame.shape[0] // factor * factor
+    cols = frame.shape[1] // factor * factor
+    blocks = frame[:rows, :cols].reshape(rows // factor, factor, cols // factor, factor, *frame.shape[2:])
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+def _source_key(frames, ds):
+    """Returns a key identifying the pixel data behind frames, or None if it has no file."""
+    path = getattr(frames, 'filepath', None) or getattr(frames, 'path', None)
+    if not path or not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    uid = str(ds.get('SOPInstanceUID', '')) if ds is not None else ''
+    identity = f"{os.path.abspath(path)}|{stat.st_mtime}|{stat.st_size}|{uid}|{len(frames)}"
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+class ThumbnailMosaic:
+    """
+    Pages of slice thumbnails tiled into one uint8 image.
+
+    Args:
+        frames: Frame accessor (FrameAccessor, Volume, ...).
+        ds (Dataset): Header used for rescale and the default window.
+        columns, rows (int): Tiles per page.
+        tile (int): Longest thumbnail side in pixels.
+        cache_dir (str): Folder for the on-disk thumbnail cache, or None.
+    """
+
+    def __init__(self, frames, ds=None, columns=4, rows=4, tile=DEFAULT_TILE,
+                 cache_dir=DEFAULT_CACHE_DIR):
+        self.frames = frames
+        self.columns = columns
+        self.rows = rows
+        self._lock = threading.Lock()
+        self._prefetch_thread = None
+        self._stop = threading.Event()
+
+        first = np.asarray(frames[0])
+        self.factor = max(1, int(np.ceil(max(first.shape[:2]) / tile)))
+        sample = block_mean(first, self.factor)
+        self.tile_shape = sample.shape
+        self.dtype = first.dtype.newbyteorder('=')
+        self.color = first.ndim == 3
+
+        self.lut = WindowLevelLUT(ds, self.dtype)
+        if not self.color and self.lut.center is None:
+            self.lut.auto_window(first)
+        self._color_range = (None, None) if self.dtype == np.uint8 else (first.min(), first.max())
+
+        shape = (len(frames),) + self.tile_shape
+        self.thumbnails, self.done = self._open_cache(cache_dir, _source_key(frames, ds), shape)
+
+    def _open_cache(self, cache_dir, key, shape):
+        """Returns (thumbnails, done) arrays, memory-mapped from cache_dir when possible."""
+        if cache_dir and key:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                stem = os.path.join(cache_dir, f"{key}_{self.factor}")
+                mode = 'r+' if os.path.exists(stem + '.npy') and os.path.exists(stem + '.done.npy') else 'w+'
+                thumbnails = np.lib.format.open_memmap(stem + '.npy', mode=mode, dtype=self.dtype, shape=shape)
+                done = np.lib.format.open_memmap(stem + '.done.npy', mode=mode, dtype=bool, shape=shape[:1])
+                if thumbnails.shape == shape and thumbnails.dtype == self.dtype:
+                    return thumbnails, done
+            except (OSError, ValueError) as e:
+                print(f"Thumbnail cache unavailable: {str(e)}")
+        return np.zeros(shape, dtype=self.dtype), np.zeros(shape[0], dtype=bool)
+
+    @property
+    def per_page(self):
+        return self.columns * self.rows
+
+    @property
+    def pages(self):
+        return (len(self.frames) + self.per_page - 1) // self.per_page
+
+    @property
+    def window(self):
+        return self.lut.center, self.lut.width
+
+    def set_window(self, center, width):
+        self.lut = self.lut.with_window(center, width)
+
+    def thumbnail(self, index, frame=None):
+        """Returns the stored-value thumbnail of slice index, computing it (from frame, if given) on first use."""
+        if not self.done[index]:
+            if frame is None:
+                frame = self.frames.frame(index)
+            thumbnail = block_mean(np.asarray(frame), self.factor)
+            if thumbnail.dtype != self.dtype:
+                thumbnail = np.rint(thumbnail) if self.dtype.kind in 'ui' else thumbnail
+            with self._lock:
+                self.thumbnails[index] = thumbnail
+                self.done[index] = True
+        return self.thumbnails[index]
+
+    def page_range(self, page):
+        start = page * self.per_page
+        return start, min(start + self.per_page, len(self.frames))
+
+    def page(self, page):
+        """Returns page as one uint8 image of rows x columns tiles; unused tiles are black."""
+        start, stop = self.page_range(page)
+        height, width = self.tile_shape[:2]
+        raw = np.zeros((self.rows, height, self.columns, width) + self.tile_shape[2:], dtype=self.dtype)
+        for offset, index in enumerate(range(start, stop)):
+            raw[offset // self.columns, :, offset % self.columns] = self.thumbnail(index)
+        raw = raw.reshape((self.rows * height, self.columns * width) + self.tile_shape[2:])
+
+        if self.color:
+            image = to_uint8(raw, *self._color_range)
+        else:
+            image = self.lut.apply(raw)
+        if stop - start < self.per_page:
+            # Blank tiles stay black whatever the window
+            image = image.reshape(self.rows, height, self.columns, width, *self.tile_shape[2:])
+            for offset in range(stop - start, self.per_page):
+                image[offset // self.columns, :, offset % self.columns] = 0
+            image = image.reshape((self.rows * height, self.columns * width) + self.tile_shape[2:])
+        return image
+
+    def tile_origin(self, offset):
+        """Returns the (x, y) pixel position of the top-left corner of tile offset."""
+        height, width = self.tile_shape[:2]
+        return (offset % self.columns) * width, (offset // self.columns) * height
+
+    def prefetch(self, first_page=0):
+        """
+        Fills the thumbnails of every page in a background thread, starting at first_page.
+
+        Missing slices are decoded in parallel through ``iter_frames``.
+        """
+        if self._prefetch_thread is not None and self._prefetch_thread.is_alive():
+            return
+        order = list(range(first_page * self.per_page, len(self.frames))) + \
+            list(range(0, first_page * self.per_page))
+
+        def run():
+            missing = [index for index in order if not self.done[index]]
+            decoded = iter_frames(self.frames, missing)
+            try:
+                for index, frame in decoded:
+                    if self._stop.is_set():
+                        return
+                    self.thumbnail(index, frame)
+            finally:
+                decoded.close()
+            if isinstance(self.thumbnails, np.memmap):
+                self.thumbnails.flush()
+                self.done.flush()
+
+        self._prefetch_thread = threading.Thread(target=run, daemon=True)
+        self._prefetch_thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._prefetch_thread is not None:
+            self._prefetch_thread.join()
+        if isinstance(self.thumbnails, np.memmap):
+            self.thumbnails.flush()
+            self.done.flush()
@@ -0,0 +1,125 @@
+"""Multi-planar reconstruction viewer.
+
+Shows three linked orthogonal planes through a ``Volume``. Each plane is a
+strided view into the volume array, so moving the crosshair copies nothing
+until the window/level table is applied to the (at most three) planes that
+changed. Anisotropic voxels are not resampled in NumPy; each ``ImageView`` is
+given the plane's pixel aspect ratio and Qt scales the image while painting.
+"""
+import numpy as np
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QGridLayout, QLabel, QMainWindow, QVBoxLayout, QWidget
+
+from dicom_lut import WindowLevelLUT
+from dicom_render import ImageView
+
+PLANE_NAMES = ['Axial', 'Coronal', 'Sagittal']
+
+class MPRViewerWindow(QMainWindow):
+    """
+    Axial, coronal and sagittal views of a grayscale volume with a shared crosshair.
+
+    Left-click or drag in any view moves the crosshair, the mouse wheel steps
+    through that view's planes and right-dragging changes window/level.
+    """
+
+    def __init__(self, volume, ds=None, title="DICOM MPR Viewer", parent=None):
+        super().__init__(parent)
+        if volume.array.ndim != 3:
+            raise ValueError(f"MPR needs a grayscale volume, got shape {volume.shape}")
+        self.volume = volume
+        self.setWindowTitle(title)
+        self.setGeometry(150, 150, 1000, 800)
+
+        # (slice, row, column) of the crosshair
+        self.position = [size // 2 for size in volume.shape]
+        self.lut = WindowLevelLUT(ds if ds is not None else volume.header, volume.array.dtype)
+        if self.lut.center is None:
+            self.lut.auto_window(volume.plane(0, self.position[0]))
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout(central_widget)
+        grid = QGridLayout()
+        layout.addLayout(grid)
+
+        self.views = []
+        for axis, name in enumerate(PLANE_NAMES):
+            view = ImageView()
+            view.pick_mode = True
+            view.smooth = True
+            view.pixel_aspect = volume.plane_aspect(axis)
+            view.position_picked.connect(lambda x, y, axis=axis: self.on_position_picked(axis, x, y))
+            view.scrolled.connect(lambda steps, axis=axis: self.step(axis, steps))
+            view.window_dragged.connect(self.on_window_dragged)
+            label = QLabel(name)
+            grid.addWidget(label, 0 if axis < 2 else 2, axis % 2)
+            grid.addWidget(view, 1 if axis < 2 else 3, axis % 2)
+            self.views.append(view)
+        grid.setRowStretch(1, 1)
+        grid.setRowStretch(3, 1)
+
+        self.status_label = QLabel()
+        grid.addWidget(self.status_label, 3, 1, Qt.AlignTop | Qt.AlignLeft)
+        self.set_position(*self.position, force=True)
+
+    def refresh_plane(self, axis):
+        plane = self.volume.plane(axis, self.position[axis])
+        self.views[axis].set_frame(self.lut.apply(plane))
+
+    def set_position(self, slice_index, row, column, force=False):
+        """Moves the crosshair, re-rendering only the planes whose index changed."""
+        new = [int(np.clip(value, 0, size - 1))
+               for value, size in zip((slice_index, row, column), self.volume.shape)]
+        changed = [axis for axis in range(3) if force or new[axis] != self.position[axis]]
+        self.position = new
+        for axis in changed:
+            self.refresh_plane(axis)
+
+        slices = self.volume.shape[0]
+        flipped = slices - 1 - new[0]
+        crosshairs = [(new[2], new[1]), (new[2], flipped), (new[1], flipped)]
+        for view, crosshair in zip(self.views, crosshairs):
+            view.crosshair = crosshair
+            view.update()
+        self.update_status()
+
+    def update_status(self):
+        slice_index, row, column = self.position
+        value = self.volume.array[slice_index, row, column]
+        spacing = ' x '.join(f"{s:g}" for s in self.volume.spacing)
+        self.status_label.setText(
+            f"Slice {slice_index + 1}/{self.volume.shape[0]}\n"
+            f"Row {row + 1}, Column {column + 1}\n"
+            f"Value {value}\n"
+            f"W {self.lut.width:.0f} / L {self.lut.center:.0f}\n"
+            f"Voxel {spacing} mm")
+
+    def on_position_picked(self, axis, x, y):
+        slice_index, row, column = self.position
+        flipped = self.volume.shape[0] - 1 - int(y)
+        if axis == 0:
+            row, column = int(y), int(x)
+        elif axis == 1:
+            slice_index, column = flipped, int(x)
+        else:
+            slice_index, row = flipped, int(x)
+        self.set_position(slice_index, row, column)
+
+    def step(self, axis, steps):
+        position = list(self.position)
+        position[axis] += steps
+        self.set_position(*position)
+
+    def on_window_dragged(self, dx, dy):
+        step = max(self.lut.width, 1.0) / 200.0
+        self.lut = self.lut.with_window(self.lut.center + dy * step, self.lut.width + dx * step)
+        self.set_position(*self.position, force=True)
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key_Up, Qt.Key_PageUp):
+            self.step(0, 1)
+        elif event.key() in (Qt.Key_Down, Qt.Key_PageDown):
+            self.step(0, -1)
+        else:
+            super().keyPressEvent(event)
@@ -0,0 +1,157 @@
+"""Cine playback with background frame decoding.
+
+``PlaybackEngine`` keeps a ring of decoded frames ahead of the playhead on a
+thread pool and advances on a Qt timer at the file's own frame rate. The
+playhead follows the wall clock: when decoding falls behind, frames that
+were not ready in time are dropped instead of stalling the GUI thread.
+"""
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal
+
+from dicom_frames import DECODE_WORKERS, DEFAULT_FPS
+
+class PlaybackEngine(QObject):
+    """Plays frames from a frame accessor at a fixed rate, decoding ahead on worker threads."""
+
+    frame_ready = pyqtSignal(int, object)
+    playing_changed = pyqtSignal(bool)
+    finished = pyqtSignal()
+
+    def __init__(self, frames, fps=DEFAULT_FPS, prefetch=8, workers=None, loop=False, parent=None):
+        super().__init__(parent)
+        self.frames = frames
+        self.fps = fps
+        self.prefetch = prefetch
+        self.loop = loop
+        self.current = 0
+        self.dropped_frames = 0
+        self._pending = {}
+        self._shown = deque()
+        self._executor = ThreadPoolExecutor(max_workers=workers or DECODE_WORKERS)
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._tick)
+
+    @property
+    def is_playing(self):
+        return self._timer.isActive()
+
+    @property
+    def achieved_fps(self):
+        """Frames actually shown per second over the last second of playback."""
+        if len(self._shown) < 2:
+            return 0.0
+        span = self._shown[-1] - self._shown[0]
+        return (len(self._shown) - 1) / span if span > 0 else 0.0
+
+    def _schedule(self, start):
+        """Keeps the next `prefetch` frames from start queued or decoded."""
+        total = len(self.frames)
+        for offset in range(self.prefetch):
+            index = start + offset
+            if index >= total:
+                if not self.loop:
+                    break
+                index %= total
+            if index not in self._pending:
+                self._pending[index] = self._executor.submit(self.frames.frame, index)
+
+    def _evict(self, keep_from, ahead=None):
+        """Drops ring entries outside keep_from .. keep_from + ahead (default: prefetch), cancelling any not yet started."""
+        total = len(self.frames)
+        ahead = self.prefetch if ahead is None else ahead
+        for index in list(self._pending):
+            if (index - keep_from) % total > ahead:
+                self._pending.pop(index).cancel()
+
+    def play(self):
+        if self.is_playing:
+            return
+        if not self.loop and self.current >= len(self.frames) - 1:
+            self.current = 0
+        self._clock_frame = self.current
+        self._clock_start = time.perf_counter()
+        self._shown.clear()
+        self._schedule(self.current + 1)
+        self._timer.start(max(1, int(round(1000.0 / self.fps))))
+        self.playing_changed.emit(True)
+
+    def pause(self):
+        if not self.is_playing:
+            return
+        self._timer.stop()
+        self.playing_changed.emit(False)
+
+    def toggle(self):
+        if self.is_playing:
+            self.pause()
+        else:
+            self.play()
+
+    def seek(self, index):
+        """Moves the playhead, restarting the clock so playback continues from index."""
+        self.current = index
+        self._clock_frame = index
+        self._clock_start = time.perf_counter()
+        self._evict(index)
+        if self.is_playing:
+            self._schedule(index + 1)
+
+    def invalidate(self):
+        """Discards prefetched frames, e.g. after the window/level changed."""
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        if self.is_playing:
+            self._schedule(self.current + 1)
+
+    def _tick(self):
+        total = len(self.frames)
+        target = self._clock_frame + int((time.perf_counter() - self._clock_start) * self.fps)
+        if not self.loop and target >= total:
+            target = total - 1
+
+        # Show the newest decoded frame that is due; anything skipped over is dropped
+        shown = None
+        for index in range(target, self.current, -1):
+            future = self._pending.get(index % total)
+            if future is not None and future.done():
+                shown = index
+                break
+        # When behind, decode around the clock position rather than frames already due
+        start = max((shown if shown is not None else self.current) + 1, target)
+
+        if shown is not None:
+            self.dropped_frames += shown - self.current - 1
+            self.current = shown % total
+            # Kept up to the end of the window scheduled below, so its queued decodes survive
+            self._evict(self.current, start - shown + self.prefetch - 1)
+            now = time.perf_counter()
+            self._shown.append(now)
+            while now - self._shown[0] > 1.0:
+                self._shown.popleft()
+            try:
+                frame = self._pending[self.current].result()
+            except Exception as e:
+                print(f"Error decoding frame {self.current}: {str(e)}")
+                self.pause()
+                return
+            self.frame_ready.emit(self.current, frame)
+            if self.loop and shown >= total:
+                self._clock_frame -= total
+
+        self._schedule(start)
+
+        if not self.loop and self.current >= total - 1:
+            self.pause()
+            self.finished.emit()
+
+    def close(self):
+        self._timer.stop()
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=False)
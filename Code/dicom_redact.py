@@ -0,0 +1,188 @@
+"""Redaction of identifying text burned into pixel data.
+
+Rules pick rectangular regions by Modality and Manufacturer (and optionally
+image size), e.g. the banner an ultrasound scanner draws across the top of
+every frame. Regions are blanked on all frames at once with one slice
+assignment each. Native pixel data is edited in place through a writable
+memory map, so only the pages under the regions are touched; encapsulated
+(compressed) data has to be decoded, and is written back uncompressed.
+"""
+import os
+import struct
+import tempfile
+
+import numpy as np
+import pydicom
+from pydicom.uid import ExplicitVRLittleEndian
+
+from dicom_cache import FrameCache
+from dicom_frames import LEGACY_PYDICOM, FrameAccessor, UnsupportedLayout, decode_frames
+
+# Attributes that describe an encoding the rewritten Pixel Data no longer has
+ENCODING_KEYWORDS = ['ExtendedOffsetTable', 'ExtendedOffsetTableLengths']
+# Frames copied per write when pixel data is rewritten
+WRITE_CHUNK = 16
+
+class RedactionRule:
+    """
+    Regions to blank on images from one kind of device.
+
+    Args:
+        regions (list): [x, y, width, height] rectangles in pixels.
+        modality (str): Modality to match, or None for any.
+        manufacturer (str): Case-insensitive substring of Manufacturer, or None for any.
+        rows, columns (int): Image size to match, or None for any.
+    """
+
+    def __init__(self, regions, modality=None, manufacturer=None, rows=None, columns=None):
+        self.regions = [tuple(int(v) for v in region) for region in regions]
+        for region in self.regions:
+            if len(region) != 4 or region[2] <= 0 or region[3] <= 0:
+                raise ValueError(f"Region {region} is not [x, y, width, height]")
+        self.modality = modality
+        self.manufacturer = manufacturer
+        self.rows = rows
+        self.columns = columns
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['regions'], data.get('modality'), data.get('manufacturer'),
+                   data.get('rows'), data.get('columns'))
+
+    def to_dict(self):
+        data = {'regions': [list(region) for region in self.regions]}
+        for key in ('modality', 'manufacturer', 'rows', 'columns'):
+            if getattr(self, key) is not None:
+                data[key] = getattr(self, key)
+        return data
+
+    def matches(self, ds):
+        if self.modality is not None and str(ds.get('Modality', '')).upper() != self.modality.upper():
+            return False
+        if self.manufacturer is not None and \
+                self.manufacturer.lower() not in str(ds.get('Manufacturer', '')).lower():
+            return False
+        if self.rows is not None and ds.get('Rows') != self.rows:
+            return False
+        if self.columns is not None and ds.get('Columns') != self.columns:
+            return False
+        return True
+
+def regions_for(ds, rules):
+    """Returns the regions of every rule matching ds."""
+    return [region for rule in rules if rule.matches(ds) for region in rule.regions]
+
+def _fill_value(ds, dtype):
+    """Returns the stored value that displays as black."""
+    if str(ds.get('PhotometricInterpretation', '')) == 'MONOCHROME1':
+        bits = int(ds.get('BitsStored', dtype.itemsize * 8))
+        if dtype.kind == 'i':
+            return (1 << (bits - 1)) - 1
+        return (1 << bits) - 1
+    return 0
+
+def redact_array(array, regions, fill=0):
+    """
+    Blanks regions on every frame of a (frames, rows, columns[, samples]) array in place.
+
+    Regions are clipped to the image; each costs one slice assignment for all frames.
+    """
+    rows, columns = array.shape[1:3]
+    for x, y, width, height in regions:
+        top, bottom = max(0, y), min(rows, y + height)
+        left, right = max(0, x), min(columns, x + width)
+        if top < bottom and left < right:
+            array[:, top:bottom, left:right] = fill
+    return array
+
+def _write_native(path, ds, pixels):
+    """
+    Rewrites path as Explicit VR Little Endian with pixels as its Pixel Data.
+
+    pixels is copied in chunks of frames, so it may be a memory map larger than RAM.
+    """
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    samples = int(ds.get('SamplesPerPixel', 1))
+    if samples > 1:
+        # Decoders hand back interleaved RGB
+        ds.PhotometricInterpretation = 'RGB'
+        ds.PlanarConfiguration = 0
+    ds.BitsAllocated = pixels.dtype.itemsize * 8
+    for keyword in ENCODING_KEYWORDS:
+        if keyword in ds:
+            del ds[keyword]
+
+    length = pixels.nbytes
+    vr = b'OB' if pixels.dtype.itemsize == 1 else b'OW'
+    partial = path + '.redacting'
+    try:
+        with open(partial, 'wb') as dst:
+            if LEGACY_PYDICOM:
+                ds.is_little_endian = True
+                ds.is_implicit_VR = False
+                ds.save_as(dst, write_like_original=False)
+            else:
+                ds.save_as(dst, enforce_file_format=True)
+            dst.write(struct.pack('<HH2sHL', 0x7FE0, 0x0010, vr, 0, length + length % 2))
+            for start in range(0, len(pixels), WRITE_CHUNK):
+                chunk = np.ascontiguousarray(pixels[start:start + WRITE_CHUNK],
+                                             dtype=pixels.dtype.newbyteorder('<'))
+                dst.write(memoryview(chunk).cast('B'))
+            if length % 2:
+                dst.write(b'\0')
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+def redact_file(path, regions):
+    """
+    Blanks regions on every frame of the DICOM file at path, in place.
+
+    Returns:
+        str: 'in place' when native pixel data was edited through a memory
+        map, 'rewritten' when the file had to be decoded and written uncompressed.
+    """
+    header = pydicom.dcmread(path, stop_before_pixels=True)
+    try:
+        frames = FrameAccessor(path, FrameCache(memory_bytes=0, directory=None), writable=True)
+    except UnsupportedLayout:
+        frames = None
+
+    if frames is not None and not frames.encapsulated:
+        try:
+            array = frames.native_array(raw=True)
+            redact_array(array, regions, _fill_value(header, array.dtype))
+        finally:
+            frames.close()
+        return 'in place'
+
+    if frames is not None:
+        # Decoded into a temporary memory map so long loops never sit in RAM
+        handle, scratch = tempfile.mkstemp(suffix='.npy')
+        os.close(handle)
+        try:
+            try:
+                sample = frames.frame(0)
+                pixels = np.lib.format.open_memmap(scratch, mode='w+', dtype=sample.dtype.newbyteorder('='),
+                                                   shape=(len(frames),) + sample.shape)
+                decode_frames(frames, out=pixels)
+            finally:
+                frames.close()
+            redact_array(pixels, regions, _fill_value(header, pixels.dtype))
+            _write_native(path, header, pixels)
+            del pixels
+        finally:
+            os.remove(scratch)
+        return 'rewritten'
+
+    # Layouts the frame accessor cannot map (deflated, 1-bit, YBR native ...) go through pydicom
+    ds = pydicom.dcmread(path)
+    samples = int(ds.get('SamplesPerPixel', 1))
+    frame_shape = (int(ds.Rows), int(ds.Columns)) + ((samples,) if samples > 1 else ())
+    pixels = ds.pixel_array.reshape((-1,) + frame_shape)
+    redact_array(pixels, regions, _fill_value(ds, pixels.dtype))
+    del ds.PixelData
+    _write_native(path, ds, pixels)
+    return 'rewritten'
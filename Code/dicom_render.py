@@ -0,0 +1,320 @@
+"""Fast image rendering for the viewer windows.
+
+Frames are handed to Qt as ``QImage`` objects that wrap the NumPy buffer
+directly (no copy) and are painted by ``ImageView``. Where matplotlib is
+still used, ``BlitManager`` redraws only the artists that change over a
+cached background instead of re-rendering the whole figure.
+``PerformanceOverlay`` shows recent decode and render times and the frame
+rate over an ``ImageView`` (see ``dicom_trace``).
+"""
+import sys
+import time
+from collections import deque
+
+import numpy as np
+from PyQt5.QtCore import Qt, QPointF, QRectF, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QImage, QPainter, QPen
+from PyQt5.QtWidgets import (QApplication, QHBoxLayout, QLabel, QMainWindow, QPushButton,
+                             QSizePolicy, QSlider, QVBoxLayout, QWidget)
+
+from dicom_playback import PlaybackEngine
+from dicom_trace import metrics, overlay_requested, span
+
+# How often the performance overlay refreshes, in milliseconds
+OVERLAY_REFRESH_MS = 500
+
+def array_to_qimage(frame):
+    """
+    Wraps a uint8 frame in a QImage without copying the pixels.
+
+    Args:
+        frame (numpy.ndarray): (rows, cols) grayscale or (rows, cols, 3) RGB uint8 data.
+
+    Returns:
+        QImage: Image sharing frame's memory. The caller must keep frame alive
+        for as long as the image is used.
+    """
+    if frame.dtype != np.uint8:
+        raise ValueError(f"Expected uint8 frame, got {frame.dtype}")
+    if not frame.flags['C_CONTIGUOUS']:
+        frame = np.ascontiguousarray(frame)
+
+    rows, cols = frame.shape[:2]
+    if frame.ndim == 2:
+        image_format = QImage.Format_Grayscale8
+    elif frame.ndim == 3 and frame.shape[2] == 3:
+        image_format = QImage.Format_RGB888
+    else:
+        raise ValueError(f"Unsupported frame shape {frame.shape}")
+
+    image = QImage(frame.data, cols, rows, frame.strides[0], image_format)
+    image.ndarray = frame  # keeps the buffer alive alongside the image
+    return image
+
+class PerformanceOverlay(QLabel):
+    """Recent decode and render times and the frames per second of one view, in its top-left corner."""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setStyleSheet("color: #00ff00; background-color: rgba(0, 0, 0, 160); "
+                           "font-family: monospace; padding: 4px;")
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.move(6, 6)
+        # Times the view was handed a new frame during the last second
+        self._shown = deque()
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start(OVERLAY_REFRESH_MS)
+        self.refresh()
+
+    def frame_shown(self):
+        self._shown.append(time.perf_counter())
+
+    def refresh(self):
+        now = time.perf_counter()
+        while self._shown and self._shown[0] < now - 1.0:
+            self._shown.popleft()
+        decodes, decode_seconds = metrics.recent('decode')
+        renders, render_seconds = metrics.recent('render')
+        decode = f"{decode_seconds * 1000:6.1f} ms" if decodes else "     - ms"
+        render = f"{render_seconds * 1000:6.1f} ms" if renders else "     - ms"
+        self.setText(f"decode {decode}\nrender {render}\nfps    {len(self._shown):6d}")
+        self.adjustSize()
+
+class ImageView(QWidget):
+    """
+    Paints a uint8 frame scaled to fit, keeping its aspect ratio.
+
+    Left-dragging adjusts window/level. With pick_mode set, the left button
+    picks image positions instead and the right button adjusts window/level.
+    """
+
+    scrolled = pyqtSignal(int)
+    window_dragged = pyqtSignal(int, int)
+    position_picked = pyqtSignal(float, float)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._image = None
+        self._drag_origin = None
+        self._picking = False
+        self.pixel_aspect = 1.0
+        self.smooth = False
+        self.pick_mode = False
+        # (x, y) in image pixels, drawn as a crosshair when set
+        self.crosshair = None
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.setMinimumSize(128, 128)
+        self.overlay = None
+        self.set_overlay(overlay_requested())
+
+    def set_overlay(self, visible):
+        """Shows or hides the performance overlay."""
+        if visible and self.overlay is None:
+            self.overlay = PerformanceOverlay(self)
+            self.overlay.show()
+        elif not visible and self.overlay is not None:
+            self.overlay.deleteLater()
+            self.overlay = None
+
+    def set_frame(self, frame):
+        """Shows a uint8 frame; see array_to_qimage for the accepted shapes."""
+        self._image = array_to_qimage(frame)
+        if self.overlay is not None:
+            self.overlay.frame_shown()
+        self.update()
+
+    def image_rect(self):
+        """Returns the widget rectangle the image is drawn into."""
+        if self._image is None:
+            return QRectF(self.rect())
+        width = self._image.width()
+        height = self._image.height() * self.pixel_aspect
+        scale = min(self.width() / width, self.height() / height)
+        target_width, target_height = width * scale, height * scale
+        return QRectF((self.width() - target_width) / 2, (self.height() - target_height) / 2,
+                      target_width, target_height)
+
+    def to_image(self, point):
+        """Maps a widget position to (x, y) image pixel coordinates."""
+        rect = self.image_rect()
+        scale = self._image.width() / rect.width() if self._image is not None and rect.width() else 1.0
+        return (point.x() - rect.x()) * scale, (point.y() - rect.y()) * scale / self.pixel_aspect
+
+    def paintEvent(self, event):
+        with span('render', 'render'):
+            painter = QPainter(self)
+            painter.fillRect(self.rect(), Qt.black)
+            if self._image is not None:
+                painter.setRenderHint(QPainter.SmoothPixmapTransform, self.smooth)
+                rect = self.image_rect()
+                painter.drawImage(rect, self._image)
+                if self.crosshair is not None:
+                    scale = rect.width() / self._image.width()
+                    x = rect.x() + (self.crosshair[0] + 0.5) * scale
+                    y = rect.y() + (self.crosshair[1] + 0.5) * scale * self.pixel_aspect
+                    painter.setPen(QPen(QColor(0, 255, 0, 160), 1))
+                    painter.drawLine(QPointF(rect.left(), y), QPointF(rect.right(), y))
+                    painter.drawLine(QPointF(x, rect.top()), QPointF(x, rect.bottom()))
+            painter.end()
+
+    def _window_button(self):
+        return Qt.RightButton if self.pick_mode else Qt.LeftButton
+
+    def mousePressEvent(self, event):
+        if event.button() == self._window_button():
+            self._drag_origin = event.pos()
+        elif self.pick_mode and event.button() == Qt.LeftButton and self._image is not None:
+            self._picking = True
+            self.position_picked.emit(*self.to_image(event.pos()))
+
+    def mouseMoveEvent(self, event):
+        if self._picking:
+            self.position_picked.emit(*self.to_image(event.pos()))
+        # Dragging adjusts window/level: horizontal is width, vertical is center
+        elif self._drag_origin is not None:
+            delta = event.pos() - self._drag_origin
+            self._drag_origin = event.pos()
+            self.window_dragged.emit(delta.x(), delta.y())
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == self._window_button():
+            self._drag_origin = None
+        elif event.button() == Qt.LeftButton:
+            self._picking = False
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() // 120
+        if steps:
+            self.scrolled.emit(-steps)
+
+class CineViewerWindow(QMainWindow):
+    """
+    Multi-frame viewer painting frames through ImageView, with slider and playback.
+
+    frames is a WindowedFrames accessor, so frames arrive display-ready from
+    the playback threads and dragging on the image changes window/level.
+    """
+
+    def __init__(self, frames, fps, title="DICOM Viewer", parent=None):
+        super().__init__(parent)
+        self.frames = frames
+        self.setWindowTitle(title)
+        self.setGeometry(150, 150, 900, 750)
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout(central_widget)
+
+        self.view = ImageView()
+        self.view.scrolled.connect(lambda steps: self.slider.setValue(self.slider.value() + steps))
+        self.view.window_dragged.connect(self.on_window_dragged)
+        layout.addWidget(self.view)
+
+        controls = QHBoxLayout()
+        self.play_button = QPushButton('Play')
+        self.slider = QSlider(Qt.Horizontal)
+        self.slider.setRange(0, len(frames) - 1)
+        self.frame_label = QLabel()
+        self.stats_label = QLabel()
+        controls.addWidget(self.play_button)
+        controls.addWidget(self.slider)
+        controls.addWidget(self.frame_label)
+        controls.addWidget(self.stats_label)
+        layout.addLayout(controls)
+
+        self.engine = PlaybackEngine(frames, fps=fps)
+        self.engine.frame_ready.connect(self.on_frame_ready)
+        self.engine.playing_changed.connect(
+            lambda playing: self.play_button.setText('Pause' if playing else 'Play'))
+        self.play_button.clicked.connect(self.engine.toggle)
+        self.slider.valueChanged.connect(self.on_slider_changed)
+
+        self.show_frame(0, frames[0])
+
+    def show_frame(self, index, image):
+        self.view.set_frame(image)
+        self.frame_label.setText(f"Frame {index + 1}/{len(self.frames)}")
+
+    def on_window_dragged(self, dx, dy):
+        if self.frames.color:
+            return
+        center, width = self.frames.window
+        step = max(width, 1.0) / 200.0
+        self.frames.set_window(center + dy * step, width + dx * step)
+        self.engine.invalidate()
+        index = self.slider.value()
+        self.show_frame(index, self.frames[index])
+        self.stats_label.setText(f"W {self.frames.window[1]:.0f} / L {self.frames.window[0]:.0f}")
+
+    def on_slider_changed(self, index):
+        if index != self.engine.current or not self.engine.is_playing:
+            self.engine.seek(index)
+            self.show_frame(index, self.frames[index])
+
+    def on_frame_ready(self, index, image):
+        self.slider.blockSignals(True)
+        self.slider.setValue(index)
+        self.slider.blockSignals(False)
+        self.show_frame(index, image)
+        self.stats_label.setText(f"{self.engine.achieved_fps:.1f} fps, "
+                                 f"{self.engine.dropped_frames} dropped")
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Space:
+            self.engine.toggle()
+        elif event.key() == Qt.Key_Right:
+            self.slider.setValue(self.slider.value() + 1)
+        elif event.key() == Qt.Key_Left:
+            self.slider.setValue(self.slider.value() - 1)
+        else:
+            super().keyPressEvent(event)
+
+    def closeEvent(self, event):
+        self.engine.close()
+        super().closeEvent(event)
+
+class BlitManager:
+    """Redraws only a set of animated matplotlib artists over a cached background."""
+
+    def __init__(self, canvas, artists=()):
+        self.canvas = canvas
+        self._background = None
+        self._artists = []
+        for artist in artists:
+            self.add_artist(artist)
+        self._cid = canvas.mpl_connect('draw_event', self._on_draw)
+
+    def add_artist(self, artist):
+        artist.set_animated(True)
+        self._artists.append(artist)
+
+    def _on_draw(self, event):
+        # A full draw happened (first show, resize, widget hover); re-capture the background
+        with span('render', 'render', full=True):
+            self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+            self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self._artists:
+            if artist.get_visible():
+                self.canvas.figure.draw_artist(artist)
+
+    def update(self):
+        """Blits the animated artists; falls back to a full draw before the first one."""
+        if self._background is None:
+            self.canvas.draw_idle()
+            return
+        with span('render', 'render'):
+            self.canvas.restore_region(self._background)
+            self._draw_animated()
+            self.canvas.blit(self.canvas.figure.bbox)
+            self.canvas.flush_events()
+
+def ensure_application():
+    """Returns the running QApplication and whether this call had to create it."""
+    app = QApplication.instance()
+    if app is not None:
+        return app, False
+    return QApplication(sys.argv), True
@@ -0,0 +1,195 @@
+"""Synthetic DICOM generators for benchmarks.
+
+Generators write Explicit VR Little Endian files with native pixel data,
+except ``make_jpeg2000_multiframe``, and deterministic content, so runs can be
+compared against each other.
+"""
+import io
+import os
+
+import numpy as np
+import pydicom
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.encaps import encapsulate
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid, PYDICOM_IMPLEMENTATION_UID
+
+from dicom_frames import LEGACY_PYDICOM
+
+SECONDARY_CAPTURE = '1.2.840.10008.5.1.4.1.1.7'
+CT_IMAGE = '1.2.840.10008.5.1.4.1.1.2'
+MULTIFRAME_GRAYSCALE = '1.2.840.10008.5.1.4.1.1.7.3'
+JPEG2000_LOSSLESS = '1.2.840.10008.1.2.4.90'
+
+def _new_dataset(path, sop_class_uid):
+    """Creates a FileDataset with file meta and patient/study identifiers filled in."""
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = sop_class_uid
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    file_meta.ImplementationClassUID = PYDICOM_IMPLEMENTATION_UID
+
+    ds = FileDataset(path, {}, file_meta=file_meta, preamble=b"\0" * 128)
+    ds.SOPClassUID = sop_class_uid
+    ds.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+    ds.PatientName = "Synthetic^Patient"
+    ds.PatientID = "SYN0001"
+    ds.PatientBirthDate = "19700101"
+    ds.PatientSex = "O"
+    ds.InstitutionName = "Synthetic Hospital"
+    ds.ReferringPhysicianName = "Synthetic^Referrer"
+    ds.AccessionNumber = "ACC0001"
+    ds.StudyID = "1"
+    ds.StudyDate = "20240101"
+    ds.Modality = "OT"
+    return ds
+
+def _set_pixels(ds, pixels):
+    """Stores a uint16 (frames, rows, cols) or (rows, cols) array as native pixel data."""
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.Rows, ds.Columns = pixels.shape[-2:]
+    ds.BitsAllocated = 16
+    ds.BitsStored = 12
+    ds.HighBit = 11
+    ds.PixelRepresentation = 0
+    if pixels.ndim == 3:
+        ds.NumberOfFrames = pixels.shape[0]
+    ds.PixelData = np.ascontiguousarray(pixels, dtype='<u2').tobytes()
+
+def _save(ds, path):
+    """Writes ds as a conformant file on both pydicom 2.x and 3.x."""
+    if LEGACY_PYDICOM:
+        ds.is_little_endian = True
+        ds.is_implicit_VR = False
+        ds.save_as(path, write_like_original=False)
+    else:
+        ds.save_as(path, enforce_file_format=True)
+    return path
+
+def _set_ct_geometry(ds, position):
+    """Fills in CT patient geometry, rescale and window for a slice at position (mm)."""
+    ds.Modality = "CT"
+    ds.ImagePositionPatient = [0.0, 0.0, float(position)]
+    ds.ImageOrientationPatient = [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
+    ds.PixelSpacing = [0.7, 0.7]
+    ds.SliceThickness = 1.0
+    ds.RescaleSlope = 1
+    ds.RescaleIntercept = -1024
+    ds.WindowCenter = 40
+    ds.WindowWidth = 400
+
+def make_single_frame(path, rows=512, cols=512, seed=0):
+    """Writes a single-frame CT slice of rows x cols and returns its path."""
+    rng = np.random.default_rng(seed)
+    ds = _new_dataset(path, CT_IMAGE)
+    _set_ct_geometry(ds, 0.0)
+    _set_pixels(ds, rng.integers(0, 4096, size=(rows, cols), dtype=np.uint16))
+    return _save(ds, path)
+
+def make_series(directory, files=100, rows=256, cols=256, seed=0):
+    """
+    Writes a CT series of one slice per file, 1 mm apart, and returns the paths in slice order.
+
+    Every file shares the Study and Series Instance UIDs; file names do not
+    follow slice order, so readers have to sort by position.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    study_uid, series_uid = generate_uid(), generate_uid()
+    paths = []
+    for index in range(files):
+        path = os.path.join(directory, f"{(index * 7919) % files:05d}_{index}.dcm")
+        ds = _new_dataset(path, CT_IMAGE)
+        ds.StudyInstanceUID = study_uid
+        ds.SeriesInstanceUID = series_uid
+        ds.SeriesNumber = 1
+        ds.InstanceNumber = index + 1
+        _set_ct_geometry(ds, index)
+        _set_pixels(ds, rng.integers(0, 4096, size=(rows, cols), dtype=np.uint16))
+        paths.append(_save(ds, path))
+    return paths
+
+def make_multiframe(path, frames=100, rows=512, cols=512, seed=0):
+    """Writes a multi-frame grayscale file of frames x rows x cols and returns its path."""
+    rng = np.random.default_rng(seed)
+    ds = _new_dataset(path, MULTIFRAME_GRAYSCALE)
+    ds.Modality = "US"
+    ds.FrameTime = "33.3"
+    _set_pixels(ds, rng.integers(0, 4096, size=(frames, rows, cols), dtype=np.uint16))
+    return _save(ds, path)
+
+def make_jpeg2000_multiframe(path, frames=100, rows=512, cols=512, seed=0):
+    """
+    Writes a multi-frame grayscale file with every frame JPEG 2000 (lossless) compressed.
+
+    Frames are smooth moving patterns plus noise, so they compress roughly
+    like real cine loops. Needs Pillow built with OpenJPEG.
+    """
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    ds = _new_dataset(path, MULTIFRAME_GRAYSCALE)
+    ds.file_meta.TransferSyntaxUID = JPEG2000_LOSSLESS
+    ds.Modality = "US"
+    ds.FrameTime = "33.3"
+    _set_pixels(ds, np.zeros((frames, rows, cols), dtype=np.uint16))
+
+    y, x = np.mgrid[0:rows, 0:cols].astype(np.float32)
+    encoded = []
+    for index in range(frames):
+        phase = index * 2 * np.pi / 30
+        pattern = 1024 * (np.sin(x / 23 + phase) + np.cos(y / 31 - phase)) + 2048
+        pixels = pattern + rng.normal(0, 40, size=(rows, cols))
+        buffer = io.BytesIO()
+        Image.fromarray(np.clip(pixels, 0, 4095).astype(np.uint16)).save(
+            buffer, 'JPEG2000', irreversible=False, no_jp2=True)
+        encoded.append(buffer.getvalue())
+    ds.PixelData = encapsulate(encoded)
+    ds['PixelData'].is_undefined_length = True
+    ds['PixelData'].VR = 'OB'
+    return _save(ds, path)
+
+def make_header(elements=1000, seed=0):
+    """
+    Returns a dataset of roughly elements elements for header-processing benchmarks.
+
+    About a third are private, a third sit in nested sequence items (with
+    referenced UIDs and person names) and the rest are standard attributes.
+    """
+    rng = np.random.default_rng(seed)
+    ds = _new_dataset('header.dcm', SECONDARY_CAPTURE)
+    ds.StudyInstanceUID = generate_uid()
+    ds.SeriesInstanceUID = generate_uid()
+    ds.FrameOfReferenceUID = generate_uid()
+    ds.OperatorsName = "Synthetic^Operator"
+    per_item = 6
+    items = max(1, elements // 3 // per_item)
+    for group in range(elements // 3):
+        # Odd groups are private; a creator reserves block 0x10 of each
+        private_group = 0x0009 + 2 * (group // 200)
+        if group % 200 == 0:
+            ds.add_new((private_group, 0x0010), 'LO', 'SYNTHETIC')
+        ds.add_new((private_group, 0x1000 + group % 200), 'LO', f"private {rng.integers(1 << 30)}")
+    sequence = []
+    for _ in range(items):
+        item = pydicom.Dataset()
+        item.ReferencedSOPClassUID = SECONDARY_CAPTURE
+        item.ReferencedSOPInstanceUID = generate_uid()
+        item.PerformingPhysicianName = "Synthetic^Physician"
+        item.CodeValue = str(rng.integers(1 << 20))
+        item.CodeMeaning = "Synthetic code"
+        item.CodingSchemeDesignator = "99SYN"
+        sequence.append(item)
+    ds.ReferencedImageSequence = sequence
+    for index in range(max(0, elements - len(ds) - items * per_item)):
+        # Filler in an even (non-private) group that no rule touches
+        ds.add_new((0x001A, 0x1000 + index), 'LO', f"value {index}")
+    return ds
+
+def make_header_file(path, elements=10000, rows=64, cols=64, seed=0):
+    """Writes a small image whose header is make_header(elements) and returns its path."""
+    rng = np.random.default_rng(seed)
+    ds = make_header(elements, seed)
+    ds.filename = path
+    _set_pixels(ds, rng.integers(0, 4096, size=(rows, cols), dtype=np.uint16))
+    return _save(ds, path)
@@ -0,0 +1,172 @@
+"""Formatting of DICOM element values for the tag views.
+
+Datasets are read with values over ``DEFER_SIZE`` left on disk, and
+``iter_elements`` walks a dataset without reading them: a deferred value
+is represented by a ``DeferredElement`` that knows its tag, VR and length.
+``format_value`` is called only when a row is painted and caps what it
+builds: text is cut at a per-VR number of characters, multi-valued elements
+at ``MAX_VALUES`` values and binary values at a short hex preview, so a
+100 MB blob costs the same as a short string. ``full_value`` loads the
+element (if deferred) and returns the whole value for the Expand action.
+"""
+from pydicom.dataelem import RawDataElement
+from pydicom.multival import MultiValue
+from pydicom.uid import UID
+
+from dicom_frames import LEGACY_PYDICOM
+
+# Values larger than this are read from the file only when they are needed
+DEFER_SIZE = '64 KB'
+
+# Characters shown of a text value, by VR; other VRs use DEFAULT_CHARS
+VALUE_CHARS = {'LT': 256, 'ST': 256, 'UT': 256, 'UC': 256, 'UR': 256}
+DEFAULT_CHARS = 128
+# Values shown of a multi-valued element
+MAX_VALUES = 16
+# Bytes previewed of a binary value
+PREVIEW_BYTES = 16
+# Bytes of a binary value written out in full by full_value; longer ones are cut
+EXPAND_BYTES = 1 << 20
+
+def raw_element(dataset, tag):
+    """Returns the element at tag as stored, without reading a deferred value."""
+    if LEGACY_PYDICOM:
+        # pydicom 2.x reads deferred values in get_item
+        return dataset._dict[tag]
+    return dataset.get_item(tag, keep_deferred=True)
+
+def is_deferred(raw):
+    return isinstance(raw, RawDataElement) and raw.value is None and raw.length != 0
+
+class DeferredElement:
+    """Stands in for an element whose value has not been read from the file."""
+
+    __slots__ = ('dataset', 'tag', 'VR', 'length', '_name')
+
+    def __init__(self, dataset, raw):
+        self.dataset = dataset
+        self.tag = raw.tag
+        self.length = raw.length
+        self.VR = raw.VR or self._dictionary_VR()
+        self._name = None
+
+    def _dictionary_VR(self):
+        from pydicom.datadict import dictionary_VR
+
+        try:
+            return dictionary_VR(self.tag)
+        except KeyError:
+            return 'UN'
+
+    def _header(self):
+        """An empty element with this tag and VR, for its name and keyword."""
+        from pydicom.dataelem import DataElement
+
+        elem = DataElement(self.tag, self.VR, None)
+        if self.tag.is_private and self.tag.element >> 8:
+            creator = self.dataset.get((self.tag.group << 16) | (self.tag.element >> 8))
+            elem.private_creator = creator.value if creator is not None else None
+        return elem
+
+    @property
+    def name(self):
+        if self._name is None:
+            self._name = self._header().name
+        return self._name
+
+    @property
+    def keyword(self):
+        return self._header().keyword
+
+    @property
+    def loaded(self):
+        return not is_deferred(raw_element(self.dataset, self.tag))
+
+    def load(self):
+        """Reads the value and returns the real element (also kept in the dataset)."""
+        return self.dataset[self.tag]
+
+def element_at(dataset, tag):
+    """Returns dataset's element at tag, or a DeferredElement if its value is still on disk."""
+    raw = raw_element(dataset, tag)
+    if not isinstance(raw, RawDataElement):
+        return raw
+    if is_deferred(raw):
+        return DeferredElement(dataset, raw)
+    return dataset[tag]
+
+def iter_elements(dataset):
+    """Yields the elements of dataset in tag order without reading deferred values."""
+    for tag in sorted(dataset.keys()):
+        yield element_at(dataset, tag)
+
+def _size(length):
+    if length >= 1 << 20:
+        return f"{length / (1 << 20):.1f} MB"
+    if length >= 1 << 10:
+        return f"{length / (1 << 10):.1f} KB"
+    return f"{length} bytes"
+
+def _hex(data):
+    return ' '.join(f"{byte:02x}" for byte in data)
+
+def format_value(elem):
+    """
+    Returns the displayed text of an element's value, capped by VR.
+
+    Returns:
+        tuple: (text, whether part of the value was left out).
+    """
+    if isinstance(elem, DeferredElement):
+        if elem.loaded:
+            return format_value(elem.load())
+        return f"<{_size(elem.length)}, not loaded>", True
+    vr = elem.VR
+    if vr == 'SQ':
+        return f"Sequence with {len(elem.value)} item(s)", False
+    value = elem.value
+    if value is None:
+        return '', False
+
+    if isinstance(value, (bytes, bytearray)):
+        if len(value) <= PREVIEW_BYTES:
+            return repr(value), False
+        return f"{_size(len(value))}: {_hex(value[:PREVIEW_BYTES])} ...", True
+
+    if isinstance(value, (list, MultiValue)):
+        if len(value) > MAX_VALUES:
+            shown = '\\'.join(str(item) for item in value[:MAX_VALUES])
+            return f"{shown}\\... ({len(value)} values)", True
+        text = repr(value)
+    elif isinstance(value, UID):
+        return value.name, False
+    else:
+        text = repr(value)
+
+    limit = VALUE_CHARS.get(vr, DEFAULT_CHARS)
+    if len(text) > limit:
+        if isinstance(value, str):
+            return f"{value[:limit]!r}... ({len(value)} characters)", True
+        return text[:limit] + '...', True
+    return text, False
+
+def full_value(elem):
+    """
+    Returns the complete text of an element's value, reading it if it was deferred.
+
+    Binary values are written as a hex dump of up to EXPAND_BYTES bytes.
+    """
+    if isinstance(elem, DeferredElement):
+        elem = elem.load()
+    value = elem.value
+    if str(elem.VR) == 'SQ':
+        return '\n'.join(str(item) for item in value)
+    if isinstance(value, (bytes, bytearray)):
+        lines = [f"{offset:08x}  {_hex(value[offset:offset + 16])}"
+                 for offset in range(0, min(len(value), EXPAND_BYTES), 16)]
+        if len(value) > EXPAND_BYTES:
+            lines.append(f"... {len(value) - EXPAND_BYTES} more bytes")
+        return '\n'.join(lines)
+    if elem.VM > 1:
+        return '\\'.join(str(item) for item in value)
+    return str(value)
@@ -0,0 +1,191 @@
+"""Classification of DICOM elements into the viewer's tag groups.
+
+Which group(s) a standard tag belongs to is worked out once per process from
+the pydicom data dictionary: the dictionary group of the tag (0010 is patient
+information, 0018 acquisition, 0028 image presentation), the words of its
+keyword (``PatientBirthDate`` is Patient, ``OperatorsName`` is Physician) and
+the attributes of the information object modules each group stands for
+(PS3.3 C.7), which catch tags like Rows or AccessionNumber whose keyword says
+nothing about their module.
+
+A dataset is then indexed in one pass by ``TagGroupIndex``: each element is
+looked up by its tag, sequences are walked so nested elements are found too,
+and of the standard elements only those that land in a group (or are
+sequences to walk) are converted from their raw form.
+Showing a group afterwards is a dictionary lookup.
+"""
+import functools
+import re
+
+from dicom_tag_format import DeferredElement, element_at, raw_element
+from dicom_trace import traced
+
+GROUPS = ['Patient', 'Study', 'Modality', 'Physician', 'Image']
+
+# Dictionary groups whose every tag belongs to one of the viewer's groups
+DICTIONARY_GROUPS = {
+    0x0010: 'Patient',
+    0x0018: 'Modality',
+    0x0028: 'Image',
+}
+
+# Keyword words placing a tag in a group
+GROUP_WORDS = {
+    'Patient': {'Patient', 'Patients', 'Birth'},
+    'Study': {'Study', 'Studies', 'Series'},
+    'Modality': {'Modality', 'Modalities', 'Protocol', 'Acquisition'},
+    'Physician': {'Physician', 'Physicians', 'Operator', 'Operators', 'Institution', 'Institutional'},
+    'Image': {'Image', 'Images', 'Pixel', 'Window', 'Bits'},
+}
+
+# Module attributes (PS3.3 C.7) whose keyword does not name their group
+MODULE_KEYWORDS = {
+    # Patient, Patient Study
+    'Patient': ['EthnicGroup', 'Occupation', 'SmokingStatus', 'PregnancyStatus', 'LastMenstrualDate',
+                'MedicalAlerts', 'Allergies', 'ResponsiblePerson', 'ResponsiblePersonRole',
+                'ResponsibleOrganization', 'QualityControlSubject', 'StrainDescription',
+                'AdmittingDiagnosesDescription'],
+    # General Study, General Series, Frame of Reference
+    'Study': ['AccessionNumber', 'IssuerOfAccessionNumberSequence', 'ReferringPhysicianName',
+              'ProcedureCodeSequence', 'Laterality', 'BodyPartExamined', 'PatientPosition',
+              'RequestAttributesSequence', 'PerformedProcedureStepID', 'PerformedProcedureStepStartDate',
+              'PerformedProcedureStepStartTime', 'PerformedProcedureStepDescription',
+              'FrameOfReferenceUID', 'PositionReferenceIndicator'],
+    # General Equipment, Enhanced General Equipment
+    'Modality': ['Manufacturer', 'ManufacturerModelName', 'StationName', 'DeviceSerialNumber',
+                 'SoftwareVersions', 'DateOfLastCalibration', 'TimeOfLastCalibration',
+                 'GantryID', 'UDISequence'],
+    # General Study, General Series, General Equipment
+    'Physician': ['ReferringPhysicianName', 'PerformingPhysicianName', 'NameOfPhysiciansReadingStudy',
+                  'PhysiciansOfRecord', 'RequestingPhysician', 'InstitutionName', 'InstitutionAddress',
+                  'InstitutionalDepartmentName'],
+    # General Image, Image Plane, Multi-frame, Cine, SOP Common
+    'Image': ['InstanceNumber', 'ContentDate', 'ContentTime', 'LossyImageCompression',
+              'LossyImageCompressionRatio', 'LossyImageCompressionMethod', 'BurnedInAnnotation',
+              'SliceLocation', 'FrameIncrementPointer', 'SOPClassUID', 'SOPInstanceUID'],
+}
+
+KEYWORD_WORDS = re.compile(r'[A-Z][a-z]+|[A-Z]+(?![a-z])|[0-9]+')
+
+def _word_groups(words):
+    return tuple(group for group in GROUPS if not GROUP_WORDS[group].isdisjoint(words))
+
+def keyword_groups(keyword):
+    """Returns the groups a dictionary keyword names, e.g. ('Patient',) for PatientBirthDate."""
+    return _word_groups(KEYWORD_WORDS.findall(keyword))
+
+@functools.lru_cache(maxsize=4096)
+def name_groups(name):
+    """Returns the groups an element name names; used for private tags, which have no keyword."""
+    return _word_groups(re.findall(r'[A-Za-z]+', name.title()))
+
+def _ordered(groups):
+    return tuple(group for group in GROUPS if group in groups)
+
+@functools.lru_cache(maxsize=None)
+def tag_groups():
+    """Returns {tag: (tuple of groups, is a sequence)} for every tag in the data dictionary."""
+    from pydicom.datadict import DicomDictionary, keyword_dict
+
+    module_groups = {}
+    for group, keywords in MODULE_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in keyword_dict:
+                module_groups.setdefault(keyword_dict[keyword], set()).add(group)
+
+    table = {}
+    for tag, entry in DicomDictionary.items():
+        groups = set(keyword_groups(entry[4])) | module_groups.get(tag, set())
+        if tag >> 16 in DICTIONARY_GROUPS:
+            groups.add(DICTIONARY_GROUPS[tag >> 16])
+        table[tag] = (_ordered(groups), entry[0] == 'SQ')
+    return table
+
+@functools.lru_cache(maxsize=None)
+def _repeater_dictionary_groups():
+    """Returns the dictionary groups holding repeating tags, as regexes over the group's hex digits."""
+    from pydicom.datadict import RepeatersDictionary
+
+    return re.compile('|'.join(sorted({key[:4].lower().replace('x', '.') for key in RepeatersDictionary})))
+
+@functools.lru_cache(maxsize=4096)
+def _repeater_groups(tag):
+    """Like tag_groups, for standard tags outside DicomDictionary (e.g. 60xx overlays)."""
+    from pydicom.datadict import dictionary_keyword, dictionary_VR, repeater_has_tag
+
+    # Most unknown tags are in groups without repeaters, which one match rules out
+    if not _repeater_dictionary_groups().fullmatch(f"{tag >> 16:04x}") or not repeater_has_tag(tag):
+        return (), False
+    groups = set(keyword_groups(dictionary_keyword(tag)))
+    if tag >> 16 in DICTIONARY_GROUPS:
+        groups.add(DICTIONARY_GROUPS[tag >> 16])
+    return _ordered(groups), dictionary_VR(tag) == 'SQ'
+
+@functools.lru_cache(maxsize=4096)
+def _private_groups(tag, creator):
+    """Groups and whether it is a sequence (None if unknown) for a private tag, from the private dictionary."""
+    from pydicom.datadict import get_private_entry
+
+    try:
+        vr, _, name, _ = get_private_entry(tag, creator)
+    except KeyError:
+        return (), None
+    return name_groups(name), vr == 'SQ'
+
+class TagGroupIndex:
+    """The elements of a dataset, nested ones included, listed by tag group."""
+
+    @traced('tag_groups', 'tags')
+    def __init__(self, dataset):
+        self.dataset = dataset
+        # group -> ([elements], [dataset or sequence item holding each element])
+        self.groups = {group: ([], []) for group in GROUPS}
+        self._index(dataset, frozenset())
+
+    def _index(self, dataset, covered):
+        """
+        Adds dataset's elements to their groups, descending into sequences.
+
+        covered holds the groups of the enclosing sequences: an element in one
+        of them is already shown as part of its sequence, so it is not listed again.
+        """
+        table = tag_groups()
+        for tag in sorted(dataset.keys()):
+            # Tags are classified without converting (or reading) their value
+            if tag.is_private:
+                groups, is_sequence = self._private(dataset, tag)
+            else:
+                groups, is_sequence = table.get(tag) or _repeater_groups(tag)
+            if not groups and not is_sequence:
+                continue
+
+            elem = element_at(dataset, tag)
+            for group in groups:
+                if group not in covered:
+                    elements, owners = self.groups[group]
+                    elements.append(elem)
+                    owners.append(dataset)
+            # Sequences too long to have been read are listed but not searched
+            if is_sequence and elem.VR == 'SQ' and not isinstance(elem, DeferredElement):
+                inner = covered | set(groups)
+                for item in elem.value:
+                    self._index(item, inner)
+
+    def _private(self, dataset, tag):
+        if tag.element >> 8 == 0:
+            # A private creator
+            return (), False
+        creator_tag = (tag.group << 16) | (tag.element >> 8)
+        creator = dataset[creator_tag].value if creator_tag in dataset else None
+        groups, is_sequence = _private_groups(tag, creator) if isinstance(creator, str) else ((), None)
+        if is_sequence is None:
+            # Not in the private dictionary: a sequence if read as one, or of undefined length
+            raw = raw_element(dataset, tag)
+            is_sequence = raw.VR == 'SQ' or getattr(raw, 'length', 0) == 0xFFFFFFFF
+        return groups, is_sequence
+
+    def elements_for(self, group):
+        return self.groups[group][0] if group in self.groups else []
+
+    def owners_for(self, group):
+        return self.groups[group][1] if group in self.groups else []
@@ -0,0 +1,206 @@
+"""In-memory search index over the elements of a DICOM dataset.
+
+Every element (including those nested in sequences) becomes one entry whose
+lower-cased search text holds its tag, keyword, name, VR and a capped
+value. Substring queries go through a trigram inverted index built with
+NumPy; tag patterns such as ``(0010,xxxx)`` are matched with a vectorized
+mask over the tag numbers, and ``re:`` queries run one regex scan over the
+concatenated text (one line per entry, so ``^`` anchors at an entry). Typing a longer version of the previous query only
+re-checks the previous matches.
+"""
+import re
+
+import numpy as np
+
+from dicom_tag_format import DeferredElement, iter_elements
+from dicom_trace import traced
+
+# Characters of each value that are searchable; long values are truncated
+MAX_VALUE_CHARS = 128
+# Binary VRs contribute their tag, name and VR but not their bytes
+BINARY_VRS = {'OB', 'OW', 'OF', 'OD', 'OL', 'OV', 'UN'}
+SEPARATOR = b'\n'
+# Candidate sets up to this size are verified entry by entry; larger ones by a buffer scan
+VERIFY_LIMIT = 30000
+
+TAG_PATTERN = re.compile(r'^\(?([0-9a-fx]{4}),([0-9a-fx]{4})\)?$', re.IGNORECASE)
+TAG_RANGE = re.compile(r'^\(?([0-9a-f]{4}),?([0-9a-f]{4})\)?\s*-\s*\(?([0-9a-f]{4}),?([0-9a-f]{4})\)?$',
+                       re.IGNORECASE)
+
+def _walk(elements, owner):
+    """Yields (owner, element) for every element, descending into sequence items that are loaded."""
+    if hasattr(elements, 'keys'):
+        # A dataset or sequence item; deferred values stay on disk
+        elements = iter_elements(elements)
+    for elem in elements:
+        yield owner, elem
+        if elem.VR == 'SQ' and not isinstance(elem, DeferredElement):
+            for item in elem.value:
+                yield from _walk(item, item)
+
+def entry_text(elem):
+    """Returns the lower-cased text an element is searched by."""
+    if elem.VR == 'SQ' or elem.VR in BINARY_VRS or isinstance(elem, DeferredElement):
+        value = ''
+    else:
+        value = str(elem.value)[:MAX_VALUE_CHARS]
+    return (f"({elem.tag.group:04x},{elem.tag.element:04x}) {elem.keyword} "
+            f"{elem.name} {elem.VR} {value}").lower().replace('\n', ' ')
+
+def _trigram_codes(data):
+    """Returns the 24-bit code of every trigram in a uint8 array."""
+    data = data.astype(np.uint32)
+    return (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+
+class TagSearchIndex:
+    """Searchable snapshot of a dataset's elements."""
+
+    @traced('tag_index', 'tags')
+    def __init__(self, dataset=None, elements=None, owners=None):
+        if elements is not None and owners is not None:
+            # Elements from different datasets, e.g. a tag group taken from nested sequences
+            entries = [entry for elem, owner in zip(elements, owners) for entry in _walk((elem,), owner)]
+        else:
+            source = elements if elements is not None else dataset
+            entries = list(_walk(source, dataset)) if source is not None else []
+        # owners[i] is the dataset (or sequence item) holding elements[i]
+        self.owners = [owner for owner, _ in entries]
+        self.elements = [elem for _, elem in entries]
+        self.tags = np.fromiter((int(elem.tag) for elem in self.elements), dtype=np.uint32,
+                                count=len(self.elements))
+        self.texts = [entry_text(elem).encode('utf-8') for elem in self.elements]
+
+        # Entries laid end to end; offsets[i] is where entry i starts
+        self.buffer = SEPARATOR.join(self.texts)
+        self.lengths = np.fromiter((len(text) + 1 for text in self.texts), dtype=np.int64,
+                                   count=len(self.texts))
+        self.offsets = np.concatenate(([0], np.cumsum(self.lengths)[:-1])) if len(self.texts) else self.lengths
+        self._build_trigrams()
+        self._last_query = None
+        self._last_result = None
+
+    def _build_trigrams(self):
+        """Builds the sorted, de-duplicated (trigram << 32 | entry) posting array."""
+        if len(self.buffer) < 3:
+            self.postings = np.zeros(0, dtype=np.uint64)
+            return
+        data = np.frombuffer(self.buffer, dtype=np.uint8)
+        codes = _trigram_codes(data)
+        entries = np.repeat(np.arange(len(self.texts), dtype=np.uint64), self.lengths)[:len(codes)]
+        keys = (codes.astype(np.uint64) << np.uint64(32)) | entries
+        keys.sort()
+        self.postings = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+
+    def __len__(self):
+        return len(self.elements)
+
+    def _posting_bounds(self, code):
+        """Returns the (low, high) slice of postings holding trigram code."""
+        low = np.searchsorted(self.postings, np.uint64(code) << np.uint64(32))
+        high = np.searchsorted(self.postings, np.uint64(code + 1) << np.uint64(32))
+        return low, high
+
+    def _candidates(self, term):
+        """Returns the entries holding term's rarest trigram, or None if there are too many."""
+        codes = set(_trigram_codes(np.frombuffer(term, dtype=np.uint8)).tolist())
+        low, high = min((self._posting_bounds(code) for code in codes), key=lambda b: b[1] - b[0])
+        if len(term) > 3 and high - low > VERIFY_LIMIT:
+            # Even the rarest trigram is common; a buffer scan is cheaper than verifying
+            return None
+        return (self.postings[low:high] & np.uint64(0xFFFFFFFF)).astype(np.int64)
+
+    def _substring(self, term, within=None):
+        texts = self.texts
+        if within is not None and len(within) <= VERIFY_LIMIT:
+            return [i for i in within if term in texts[i]]
+        if len(term) >= 3:
+            candidates = self._candidates(term)
+            if candidates is not None and len(term) == 3:
+                return candidates.tolist()
+            if candidates is not None and len(candidates) <= VERIFY_LIMIT:
+                return [i for i in candidates.tolist() if term in texts[i]]
+        return self._scan(term)
+
+    def _entries_at(self, positions):
+        """Maps byte positions in the buffer to sorted, unique entry ids."""
+        if not len(positions):
+            return []
+        entries = np.searchsorted(self.offsets, positions, side='right') - 1
+        # positions are sorted, so duplicates are adjacent
+        return entries[np.concatenate(([True], entries[1:] != entries[:-1]))].tolist()
+
+    def _scan(self, term):
+        """Finds term with a vectorized comparison over the whole buffer."""
+        data = np.frombuffer(self.buffer, dtype=np.uint8)
+        count = len(data) - len(term) + 1
+        if count <= 0:
+            return []
+        hits = np.zeros(len(data), dtype=bool)
+        np.equal(data[:count], term[0], out=hits[:count])
+        scratch = np.empty(count, dtype=bool)
+        for shift in range(1, len(term)):
+            np.equal(data[shift:shift + count], term[shift], out=scratch)
+            np.logical_and(hits[:count], scratch, out=hits[:count])
+        # Terms never contain the separator, so a hit always lies inside one entry
+        return np.flatnonzero(np.logical_or.reduceat(hits, self.offsets)).tolist()
+
+    def _regex(self, pattern):
+        regex = re.compile(pattern.encode('utf-8'), re.IGNORECASE | re.MULTILINE)
+        starts = [match.start() for match in regex.finditer(self.buffer)]
+        return self._entries_at(np.asarray(starts, dtype=np.int64))
+
+    def _tag_mask(self, group, element):
+        """Matches tags against a pattern where 'x' is a wildcard hex digit."""
+        pattern = (group + element).lower()
+        mask = int(''.join('0' if c == 'x' else 'f' for c in pattern), 16)
+        value = int(pattern.replace('x', '0'), 16)
+        return np.flatnonzero((self.tags & np.uint32(mask)) == np.uint32(value)).tolist()
+
+    def _tag_range(self, match):
+        low = int(match.group(1) + match.group(2), 16)
+        high = int(match.group(3) + match.group(4), 16)
+        return np.flatnonzero((self.tags >= low) & (self.tags <= high)).tolist()
+
+    def search(self, query):
+        """
+        Returns the ids of matching entries in dataset order.
+
+        Args:
+            query (str): A substring, a tag pattern such as ``(0010,xxxx)``, a
+                tag range such as ``(0008,0000)-(0008,00ff)``, or ``re:<regex>``.
+
+        Returns:
+            list: Entry ids, or None for an empty query (no filtering).
+        """
+        query = query.strip()
+        if not query:
+            self._last_query = self._last_result = None
+            return None
+
+        if query.lower().startswith('re:'):
+            try:
+                return self._regex(query[3:])
+            except re.error:
+                return []
+
+        match = TAG_RANGE.match(query)
+        if match:
+            return self._tag_range(match)
+        match = TAG_PATTERN.match(query)
+        if match:
+            return self._tag_mask(match.group(1), match.group(2))
+
+        term = query.lower().encode('utf-8')
+        within = None
+        if self._last_query is not None and term.startswith(self._last_query):
+            # Extending the previous query can only narrow its matches
+            within = self._last_result
+        result = self._substring(term, within)
+        self._last_query, self._last_result = term, result
+        return result
+
+    def elements_for(self, ids):
+        return [self.elements[i] for i in ids]
+
+    def owners_for(self, ids):
+        return [self.owners[i] for i in ids]
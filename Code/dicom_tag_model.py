@@ -0,0 +1,313 @@
+"""Lazy item model exposing a DICOM dataset to a QTreeView.
+
+Rows are pulled from the dataset in batches through ``canFetchMore`` /
+``fetchMore`` as the view scrolls, and sequence items are only walked when
+they are expanded, so opening a view costs the same regardless of how many
+elements the dataset holds. Values are formatted in ``data()``, i.e. only for
+rows that are actually painted, and capped by ``dicom_tag_format``; values
+deferred when the file was read stay on disk until ``expand`` loads one.
+
+Edited cells are validated against their VR as they are committed and kept
+as ``TagEdit`` records keyed by (containing dataset, tag), so writing them
+back touches only the edited elements.
+"""
+from collections import namedtuple
+from itertools import islice
+
+from PyQt5.QtCore import QAbstractItemModel, QModelIndex, Qt, pyqtSignal
+from PyQt5.QtGui import QFont
+from pydicom import config
+
+from dicom_tag_format import DeferredElement, format_value, full_value, iter_elements
+from dicom_trace import span
+
+try:
+    from pydicom.valuerep import validate_value
+except ImportError:  # pydicom < 2.3 has no VR validation
+    validate_value = None
+
+# VRs whose values are not editable as text in the table
+NON_EDITABLE_VRS = {'SQ', 'OB', 'OW', 'OF', 'OD', 'OL', 'OV', 'UN', 'AT'}
+FLOAT_VRS = {'DS', 'FL', 'FD'}
+INT_VRS = {'IS', 'SS', 'US', 'SL', 'UL', 'SV', 'UV'}
+# VRs whose value is a single string that may contain backslashes
+SINGLE_VALUE_VRS = {'LT', 'ST', 'UT', 'UR'}
+
+TagEdit = namedtuple('TagEdit', ['dataset', 'tag', 'text', 'value'])
+
+def parse_value(elem, text):
+    """
+    Converts text typed into the table to a value for elem, checking it against the VR.
+
+    Args:
+        elem (DataElement): The element being edited.
+        text (str): The new value; multiple values are separated by backslashes.
+
+    Returns:
+        The converted value (a list for multi-valued input).
+
+    Raises:
+        ValueError: If text is not a valid value for the element's VR.
+    """
+    vr = str(elem.VR)
+    cleaned = text.strip()
+    while cleaned.startswith(("'", '"')) and cleaned.endswith(("'", '"')) and len(cleaned) > 1:
+        cleaned = cleaned[1:-1].strip()
+
+    parts = [cleaned] if vr in SINGLE_VALUE_VRS else cleaned.split('\\')
+    values = []
+    for part in parts:
+        part = part.strip()
+        if vr in FLOAT_VRS:
+            value = float(part.replace(',', '.'))
+        elif vr in INT_VRS:
+            value = int(part.split('.')[0])
+        else:
+            value = part
+        if validate_value is not None:
+            validate_value(vr, str(value) if vr in ('DS', 'IS') else value, config.RAISE)
+        values.append(value)
+    return values[0] if len(values) == 1 else values
+
+class _TagNode:
+    """One row of the tree: a data element, or an item of a sequence."""
+
+    __slots__ = ('parent', 'row', 'element', 'dataset', 'owner', 'children', 'exhausted', '_source')
+
+    def __init__(self, parent, row, element=None, dataset=None, owner=None):
+        self.parent = parent
+        self.row = row
+        self.element = element
+        self.dataset = dataset
+        # The dataset element belongs to, used to key its edits
+        self.owner = owner
+        self.children = []
+        self.exhausted = False
+        self._source = None
+
+    def has_children(self):
+        if self.children:
+            return True
+        if self.dataset is not None:
+            return len(self.dataset) > 0
+        if isinstance(self.element, DeferredElement):
+            # Only sequences longer than the defer size are deferred, so they have items
+            return self.element.VR == 'SQ'
+        return self.element is not None and self.element.VR == 'SQ' and len(self.element.value) > 0
+
+    def source(self):
+        """Returns the iterator children are fetched from, starting it on first use."""
+        if self._source is None:
+            if self.dataset is not None:
+                self._source = (_TagNode(self, 0, element=elem, owner=self.dataset)
+                                for elem in iter_elements(self.dataset))
+            else:
+                if isinstance(self.element, DeferredElement):
+                    # Expanding a deferred sequence reads it
+                    self.element = self.element.load()
+                self._source = (_TagNode(self, 0, dataset=item) for item in self.element.value)
+        return self._source
+
+class DicomTagModel(QAbstractItemModel):
+    """Tag/Name/VR/Value tree over a dataset, or over a subset of its elements."""
+
+    COLUMNS = ['Tag', 'Name', 'VR', 'Value']
+    VALUE_COLUMN = 3
+
+    # Emitted with a message when an edited value is rejected
+    edit_rejected = pyqtSignal(str)
+
+    def __init__(self, dataset, elements=None, owners=None, batch_size=256, parent=None):
+        super().__init__(parent)
+        self.dataset = dataset
+        self.batch_size = batch_size
+        # Pending edits: (id(containing dataset), tag) -> TagEdit
+        self.edits = {}
+        self._root = self._new_root(elements, owners)
+
+    def _new_root(self, elements, owners=None):
+        root = _TagNode(None, 0, dataset=self.dataset)
+        if elements is not None:
+            if owners is None:
+                owners = [self.dataset] * len(elements)
+            root._source = (_TagNode(root, 0, element=elem, owner=owner)
+                            for elem, owner in zip(elements, owners))
+        return root
+
+    def set_elements(self, elements, owners=None):
+        """
+        Shows only the given elements as top-level rows; None shows the whole dataset.
+
+        owners lists the dataset holding each element and defaults to the
+        model's dataset.
+        """
+        self.beginResetModel()
+        self._root = self._new_root(elements, owners)
+        self.endResetModel()
+
+    def _edit_key(self, node):
+        return id(node.owner), node.element.tag
+
+    def _node(self, index):
+        return index.internalPointer() if index.isValid() else self._root
+
+    def node_index(self, node, column=0):
+        if node is self._root:
+            return QModelIndex()
+        return self.createIndex(node.row, column, node)
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self._node(parent)
+        if 0 <= row < len(node.children) and 0 <= column < len(self.COLUMNS):
+            return self.createIndex(row, column, node.children[row])
+        return QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self.node_index(index.internalPointer().parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self._node(parent).children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.COLUMNS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return False
+        return self._node(parent).has_children()
+
+    def canFetchMore(self, parent):
+        node = self._node(parent)
+        return not node.exhausted and node.has_children()
+
+    def fetchMore(self, parent):
+        node = self._node(parent)
+        batch = list(islice(node.source(), self.batch_size))
+        if len(batch) < self.batch_size:
+            node.exhausted = True
+        if not batch:
+            return
+        first = len(node.children)
+        self.beginInsertRows(parent, first, first + len(batch) - 1)
+        for row, child in enumerate(batch, first):
+            child.row = row
+        node.children.extend(batch)
+        self.endInsertRows()
+
+    def fetch_all(self, parent=QModelIndex()):
+        """Fetches every remaining row under parent (not recursive)."""
+        while self.canFetchMore(parent):
+            self.fetchMore(parent)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        elem = index.internalPointer().element
+        if (index.column() == self.VALUE_COLUMN and elem is not None
+                and elem.VR not in NON_EDITABLE_VRS and not isinstance(elem, DeferredElement)):
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def row_text(self, node):
+        """Returns the displayed text of a row's columns."""
+        with span('tag_format', 'tags'):
+            return self._row_text(node)
+
+    def _row_text(self, node):
+        elem = node.element
+        if elem is None:
+            return [f"Item {node.row + 1}", '', '', f"{len(node.dataset)} element(s)"]
+        tag = f"({elem.tag.group:04X},{elem.tag.element:04X})"
+        if self._edit_key(node) in self.edits:
+            value = self.edits[self._edit_key(node)].text
+        else:
+            value = format_value(elem)[0]
+        return [tag, elem.name, str(elem.VR), value]
+
+    def is_truncated(self, index):
+        """Returns whether the value shown at index leaves part of the element's value out."""
+        node = self._node(index)
+        if node.element is None or self._edit_key(node) in self.edits:
+            return False
+        return format_value(node.element)[1]
+
+    def expand(self, index):
+        """
+        Loads the full value of the element at index, reading it if it was deferred.
+
+        Returns:
+            str: The whole value as text, or None if index is not an element.
+        """
+        node = self._node(index)
+        if node.element is None:
+            return None
+        if isinstance(node.element, DeferredElement):
+            node.element = node.element.load()
+            self.dataChanged.emit(self.node_index(node), self.node_index(node, self.VALUE_COLUMN))
+        return full_value(node.element)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            try:
+                return self.row_text(node)[index.column()]
+            except Exception as e:
+                return f"Error reading tag: {str(e)}" if index.column() == self.VALUE_COLUMN else ''
+        if role == Qt.ToolTipRole and index.column() == self.VALUE_COLUMN and self.is_truncated(index):
+            return "Shortened; use Expand Value to see the whole value"
+        if role == Qt.EditRole and index.column() == self.VALUE_COLUMN and node.element is not None:
+            edit = self.edits.get(self._edit_key(node))
+            return edit.text if edit is not None else full_value(node.element)
+        if role == Qt.FontRole and node.element is not None and self._edit_key(node) in self.edits:
+            font = QFont()
+            font.setItalic(True)
+            return font
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or index.column() != self.VALUE_COLUMN:
+            return False
+        node = index.internalPointer()
+        elem = node.element
+        if elem is None:
+            return False
+        text = str(value)
+        key = self._edit_key(node)
+        # Compared in the backslash-separated form the editor is filled with
+        if text == full_value(elem):
+            self.edits.pop(key, None)
+        else:
+            try:
+                parsed = parse_value(elem, text)
+            except (ValueError, TypeError) as e:
+                self.edit_rejected.emit(f"Invalid value for {elem.name} ({elem.VR}): {str(e)}")
+                return False
+            self.edits[key] = TagEdit(node.owner, elem.tag, text, parsed)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def apply_edits(self):
+        """Writes the pending edits into their datasets and returns how many were applied."""
+        for edit in self.edits.values():
+            edit.dataset[edit.tag].value = edit.value
+        count = len(self.edits)
+        self.clear_edits()
+        return count
+
+    def clear_edits(self):
+        self.edits.clear()
+        if self._root.children:
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(len(self._root.children) - 1, len(self.COLUMNS) - 1))
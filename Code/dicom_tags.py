@@ -1,38 +1,44 @@
-from PyQt5.QtWidgets import QMainWindow, QTextEdit, QVBoxLayout, QWidget, QLineEdit, QPushButton, QLabel, QHBoxLayout, QApplication, QMessageBox, QDialog, QComboBox
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-import sys
+from PyQt5.QtWidgets import QMainWindow, QTreeView, QVBoxLayout, QWidget, QLineEdit, QPushButton, QLabel, QHBoxLayout, QMessageBox, QDialog, QHeaderView, QPlainTextEdit
+from PyQt5.QtCore import Qt, QModelIndex, QThread, pyqtSignal
 import os
-from dicom_display import display_tags 
+from dicom_tag_model import DicomTagModel
+from dicom_tag_index import TagSearchIndex
 import warnings
 from pydicom import config
 
 warnings.filterwarnings('ignore', category=UserWarning, module='pydicom.valuerep')
 config.convert_wrong_values = True
 
-class TagLoaderThread(QThread):
-    progress = pyqtSignal(str)
-    finished = pyqtSignal()
+class TagIndexThread(QThread):
+    """Builds the search index off the GUI thread."""
+    built = pyqtSignal(object)
 
-    def __init__(self, tag_info):
+    def __init__(self, dicom_dataset, elements=None, owners=None):
         super().__init__()
-        self.tag_info = tag_info
-        self.chunk_size = 50
+        self.dicom_dataset = dicom_dataset
+        self.elements = elements
+        self.owners = owners
 
     def run(self):
-        lines = self.tag_info.split('\n')
-        for i in range(0, len(lines), self.chunk_size):
-            chunk = '\n'.join(lines[i:i + self.chunk_size])
-            self.progress.emit(chunk)
-        self.finished.emit()
+        self.built.emit(TagSearchIndex(self.dicom_dataset, self.elements, self.owners))
 
 class TagViewerWindow(QMainWindow):
-    def __init__(self, tag_info, dicom_dataset=None):
+    def __init__(self, dicom_dataset, elements=None, owners=None):
         super().__init__()
-        self.tag_info = tag_info
         self.dicom_dataset = dicom_dataset
+        self.elements = elements
+        # The dataset (or sequence item) holding each of elements; defaults to dicom_dataset
+        self.owners = owners
+        self.index = None
+        self.matches = None
+        self.search_row = -1
         self.setAttribute(Qt.WA_DeleteOnClose, False)
         self.initUI()
 
+        self.index_thread = TagIndexThread(self.dicom_dataset, self.elements, self.owners)
+        self.index_thread.built.connect(self.on_index_built)
+        self.index_thread.start()
+
    
 
     def initUI(self):
@@ -46,6 +52,8 @@ class TagViewerWindow(QMainWindow):
         search_frame = QHBoxLayout()
         search_label = QLabel('Search Tag:')
         self.search_entry = QLineEdit()
+        self.search_entry.setPlaceholderText('text, (0010,xxxx), (0008,0000)-(0008,00ff) or re:regex')
+        self.result_label = QLabel('Indexing...')
         search_button = QPushButton('Search')
         next_button = QPushButton('Next')
 
@@ -53,190 +61,132 @@ class TagViewerWindow(QMainWindow):
         search_frame.addWidget(self.search_entry)
         search_frame.addWidget(search_button)
         search_frame.addWidget(next_button)
-
-        self.text_edit = QTextEdit()
-        self.text_edit.setReadOnly(True)
+        search_frame.addWidget(self.result_label)
+
+        # Rows are fetched from the dataset as the view scrolls; sequences load when expanded
+        self.model = DicomTagModel(self.dicom_dataset, self.elements, self.owners)
+        self.model.edit_rejected.connect(lambda message: QMessageBox.warning(self, "Invalid Value", message))
+        self.tree_view = QTreeView()
+        self.tree_view.setModel(self.model)
+        self.tree_view.setUniformRowHeights(True)
+        self.tree_view.setAlternatingRowColors(True)
+        self.tree_view.setEditTriggers(QTreeView.DoubleClicked | QTreeView.EditKeyPressed)
+        header = self.tree_view.header()
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        header.setStretchLastSection(True)
+        header.resizeSection(0, 110)
+        header.resizeSection(1, 260)
+        header.resizeSection(2, 40)
 
         layout.addLayout(search_frame)
-        layout.addWidget(self.text_edit)
+        layout.addWidget(self.tree_view)
 
         edit_frame = QHBoxLayout()
         save_button = QPushButton('Save Changes')
-        # swap_button = QPushButton('Swap Tags')
+        expand_button = QPushButton('Expand Value')
         
         edit_frame.addWidget(save_button)
-        # edit_frame.addWidget(swap_button)
+        edit_frame.addWidget(expand_button)
         layout.addLayout(edit_frame)
 
         search_button.clicked.connect(self.search)
         next_button.clicked.connect(self.find_next)
         self.search_entry.returnPressed.connect(self.search)
+        self.search_entry.textChanged.connect(self.search)
 
         save_button.clicked.connect(self.save_current_changes)
-        # swap_button.clicked.connect(self.show_swap_dialog)
-
-        self.loader_thread = TagLoaderThread(self.tag_info)
-        self.loader_thread.progress.connect(self.append_text)
-        self.loader_thread.finished.connect(self.loading_finished)
-        self.loader_thread.start()
-
-    def append_text(self, text):
-        self.text_edit.append(text)
-
-    def loading_finished(self):
-        print("Tag loading completed")
-
-    def search(self):
-        search_term = self.search_entry.text().strip().lower()
-        if not search_term:
+        expand_button.clicked.connect(self.expand_value)
+
+    def select_row(self, row):
+        while row >= self.model.rowCount() and self.model.canFetchMore(QModelIndex()):
+            self.model.fetchMore(QModelIndex())
+        index = self.model.index(row, 0)
+        self.tree_view.setCurrentIndex(index)
+        self.tree_view.scrollTo(index)
+
+    def on_index_built(self, index):
+        self.index = index
+        self.result_label.setText(f"{len(index)} tags")
+        self.search()
+
+    def search(self, *args):
+        """Filters the table to the elements matching the search box."""
+        if self.index is None:
+            # Applied once the index is built
             return
 
-        cursor = self.text_edit.textCursor()
-        cursor.movePosition(cursor.Start)
-        self.text_edit.setTextCursor(cursor)
-
-        format = self.text_edit.currentCharFormat()
-        format.setBackground(Qt.white)
-        cursor.select(cursor.Document)
-        cursor.mergeCharFormat(format)
+        matches = self.index.search(self.search_entry.text())
+        if matches == self.matches:
+            return
+        self.matches = matches
+        if matches is None:
+            self.model.set_elements(self.elements, self.owners)
+            self.result_label.setText(f"{len(self.index)} tags")
+            self.search_row = -1
+            return
 
-        while self.text_edit.find(search_term):
-            format = self.text_edit.currentCharFormat()
-            format.setBackground(Qt.yellow)
-            self.text_edit.mergeCurrentCharFormat(format)
+        self.model.set_elements(self.index.elements_for(matches), self.index.owners_for(matches))
+        self.result_label.setText(f"{len(matches)} match{'es' if len(matches) != 1 else ''}")
+        self.search_row = 0 if matches else -1
+        if matches:
+            self.select_row(0)
 
     def find_next(self):
-        search_term = self.search_entry.text().strip().lower()
-        if not search_term:
+        if not self.matches:
             return
-        
-        self.text_edit.find(search_term)
-
-    
-        
-    # def show_swap_dialog(self):
-    #     dialog = TagSwapDialog(self.dicom_dataset, self.text_edit, self)  # Pass text_edit
-    #     dialog.exec_()
-    #     if dialog.swapped:
-    #         self.text_edit.clear()
-    #         self.loader_thread = TagLoaderThread(display_tags(self.dicom_dataset))
-    #         self.loader_thread.progress.connect(self.append_text)
-    #         self.loader_thread.start()
+        # Rows are the matches, so the next match is the next row
+        self.search_row = (self.search_row + 1) % len(self.matches)
+        self.select_row(self.search_row)
+
+    def expand_value(self, *args):
+        """Shows the whole value of the selected element, reading it from the file if it was deferred."""
+        index = self.tree_view.currentIndex()
+        if not index.isValid():
+            QMessageBox.information(self, "Info", "Select a tag first")
+            return
+        try:
+            text = self.model.expand(index)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to load value: {str(e)}")
+            return
+        if text is None:
+            return
+        name = self.model.index(index.row(), 1, index.parent()).data()
+        dialog = ValueDialog(name, text, self)
+        dialog.exec_()
 
     def save_current_changes(self, *args):
-        """Wrapper method to handle saving changes from the text editor"""
+        """Applies the values edited in the table and saves a modified copy"""
         try:
-            current_text = self.text_edit.toPlainText()
-            changes_made = False
-            
-            # Parse the current text to find modified tags
-            for line in current_text.split('\n'):
-                if ': ' in line:
-                    tag_name, value = line.split(': ', 1)
-                    # Find the tag in the dataset
-                    for elem in self.dicom_dataset:
-                        if elem.name == tag_name:
-                            # Only try to save if the value is different
-                            if str(elem.repval) != value:
-                                try:
-                                    # Directly modify the value
-                                    vr = elem.VR
-                                    cleaned_value = value.strip()
-                                    while cleaned_value.startswith(("'", '"')) and cleaned_value.endswith(("'", '"')):
-                                        cleaned_value = cleaned_value[1:-1].strip()
-                                    
-                                    if vr in ['DS', 'FL', 'FD']:  # Float types
-                                        elem.value = float(cleaned_value.replace(',', '.'))
-                                    elif vr in ['IS']:  # Integer types
-                                        elem.value = int(cleaned_value.split('.')[0])
-                                    elif elem.tag == (0x0028, 0x0006):  # Planar Configuration
-                                        elem.value = int(cleaned_value)  # Ensure it's an integer
-                                    else:
-                                        elem.value = cleaned_value
-                                
-                                    changes_made = True
-                                except Exception as e:
-                                    QMessageBox.critical(self, "Error", 
-                                        f"Failed to save value for {tag_name}: {str(e)}")
-                            break
-
-            if changes_made:
-                # Save the modified dataset
-                original_path = self.dicom_dataset.filename
-                save_path = os.path.join(os.path.dirname(original_path), 
-                                       f"modified_{os.path.basename(original_path)}")
-                self.dicom_dataset.save_as(save_path)
-                QMessageBox.information(self, "Success", 
-                    f"Changes saved successfully!\nFile saved to:\n{save_path}")
-            else:
+            # Edits were validated when entered, so applying them is a direct tag lookup each
+            if not self.model.apply_edits():
                 QMessageBox.information(self, "Info", "No changes detected")
+                return
+
+            # Save the modified dataset
+            original_path = self.dicom_dataset.filename
+            save_path = os.path.join(os.path.dirname(original_path), 
+                                   f"modified_{os.path.basename(original_path)}")
+            self.dicom_dataset.save_as(save_path)
+            QMessageBox.information(self, "Success", 
+                f"Changes saved successfully!\nFile saved to:\n{save_path}")
                 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save changes: {str(e)}")
     
-# class TagSwapDialog(QDialog):
-#     def __init__(self, dicom_dataset, text_edit, parent=None):
-#         super().__init__(parent)
-#         self.dicom_dataset = dicom_dataset
-#         self.text_edit = text_edit  # Store the reference to text_edit
-#         self.swapped = False
-#         self.initUI()
-
-#     def initUI(self):
-#         self.setWindowTitle('Swap Tags')
-#         self.setGeometry(200, 200, 400, 150)
-
-#         layout = QVBoxLayout(self)
-
-#         # Create combo boxes for tag selection
-#         self.combo1 = QComboBox()
-#         self.combo2 = QComboBox()
-
-#         # Populate combo boxes with tag names
-#         tag_names = [elem.name for elem in self.dicom_dataset]
-#         self.combo1.addItems(tag_names)
-#         self.combo2.addItems(tag_names)
-
-#         layout.addWidget(QLabel('Select first tag:'))
-#         layout.addWidget(self.combo1)
-#         layout.addWidget(QLabel('Select second tag:'))
-#         layout.addWidget(self.combo2)
-
-#         # Add swap button
-#         swap_button = QPushButton('Swap Tags')
-#         swap_button.clicked.connect(self.swap_tags)
-#         layout.addWidget(swap_button)
-
-#     def swap_tags(self):
-#         try:
-#             tag1_name = self.combo1.currentText()
-#             tag2_name = self.combo2.currentText()
-
-#             if tag1_name == tag2_name:
-#                 QMessageBox.warning(self, "Warning", "Please select different tags.")
-#                 return
-
-#             # Find the elements
-#             elem1 = None
-#             elem2 = None
-#             for elem in self.dicom_dataset:
-#                 if elem.name == tag1_name:
-#                     elem1 = elem
-#                 elif elem.name == tag2_name:
-#                     elem2 = elem
-
-#             # Swap values
-#             if elem1 and elem2:
-#                 temp_value = elem1.value
-#                 elem1.value = elem2.value
-#                 elem2.value = temp_value
-                
-#                 # Mark changes as made
-#                 self.text_edit.append(f"{elem1.name}: {elem1.value}")
-#                 self.text_edit.append(f"{elem2.name}: {elem2.value}")
-#                 QMessageBox.information(self, "Success", "Tags swapped successfully!")
-#             else:
-#                 QMessageBox.warning(self, "Error", "Could not find selected tags.")
-
-#         except Exception as e:
-#             QMessageBox.critical(self, "Error", f"Failed to swap tags: {str(e)}")
+class ValueDialog(QDialog):
+    """Read-only view of an element's whole value."""
+
+    def __init__(self, name, text, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(name)
+        self.setGeometry(150, 150, 700, 500)
+        layout = QVBoxLayout(self)
+        text_edit = QPlainTextEdit()
+        text_edit.setReadOnly(True)
+        text_edit.setLineWrapMode(QPlainTextEdit.NoWrap)
+        text_edit.setPlainText(text)
+        layout.addWidget(text_edit)
+        close_button = QPushButton('Close')
+        close_button.clicked.connect(self.accept)
+        layout.addWidget(close_button)
@@ -0,0 +1,298 @@
+"""Lightweight tracing of the viewer's hot paths.
+
+Code marks its expensive steps with ``span`` (a context manager) or
+``traced`` (a decorator):
+
+    with span('decode', 'decode', frame=index):
+        frame = self._decode(index)
+
+While recording is off, ``span`` returns a shared no-op object and ``traced``
+calls straight through, so instrumented code costs one flag check. Once on,
+every span adds its duration to the ``metrics`` registry (which the
+performance overlay reads) and, when events are kept, a Chrome trace event
+that ``write_chrome_trace`` saves for chrome://tracing or Perfetto.
+``file_scope`` groups the spans of one file and records its peak memory.
+
+Set ``DICOM_VIEWER_TRACE=trace.json`` to record from startup and write the
+trace at exit (``DICOM_VIEWER_TRACE_MEMORY=1`` adds tracemalloc peaks, which
+slows Python allocations), and ``DICOM_VIEWER_OVERLAY=1`` to show the overlay
+on every image view.
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+TRACE_ENV = 'DICOM_VIEWER_TRACE'
+TRACE_MEMORY_ENV = 'DICOM_VIEWER_TRACE_MEMORY'
+OVERLAY_ENV = 'DICOM_VIEWER_OVERLAY'
+# Durations kept per metric for the recent averages the overlay shows
+RECENT_SAMPLES = 256
+
+class Metric:
+    """Running count, total, min and max of one span's durations, in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        # (end time, duration) of the latest spans
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def add(self, end, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.recent.append((end, seconds))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+class MetricsRegistry:
+    """Metrics by span name, plus a summary of every file traced through file_scope."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.files = []
+
+    def record(self, name, seconds, end=None):
+        end = time.perf_counter() if end is None else end
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric()
+            metric.add(end, seconds)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def recent(self, name, window=1.0):
+        """Returns (count, mean seconds) of the spans of name that ended in the last window seconds."""
+        metric = self._metrics.get(name)
+        if metric is None:
+            return 0, 0.0
+        since = time.perf_counter() - window
+        with self._lock:
+            durations = [seconds for end, seconds in metric.recent if end >= since]
+        return len(durations), (sum(durations) / len(durations) if durations else 0.0)
+
+    def snapshot(self):
+        """Returns {name: {count, total_ms, mean_ms, min_ms, max_ms}}."""
+        with self._lock:
+            return {name: {'count': metric.count, 'total_ms': metric.total * 1000,
+                           'mean_ms': metric.mean * 1000, 'min_ms': metric.min * 1000,
+                           'max_ms': metric.max * 1000}
+                    for name, metric in self._metrics.items()}
+
+    def summary(self):
+        lines = [f"{'span':<16} {'count':>8} {'mean ms':>10} {'max ms':>10} {'total ms':>10}"]
+        for name, values in sorted(self.snapshot().items()):
+            lines.append(f"{name:<16} {values['count']:>8} {values['mean_ms']:>10.2f} "
+                         f"{values['max_ms']:>10.2f} {values['total_ms']:>10.1f}")
+        for entry in self.files:
+            lines.append(f"{os.path.basename(entry['path'])}: {entry['seconds'] * 1000:.0f} ms, "
+                         f"peak RSS {entry['peak_rss_mb']:.0f} MB")
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+            self.files = []
+
+metrics = MetricsRegistry()
+
+class _State:
+    recording = False
+    keep_events = False
+    origin = time.perf_counter_ns()
+    events = []
+
+_state = _State()
+
+class _NullSpan:
+    """What span returns while recording is off: entering and leaving it does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('name', 'category', 'args', 'start')
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        metrics.record(self.name, (end - self.start) / 1e9, end / 1e9)
+        if _state.keep_events:
+            # list.append is atomic, so spans from any thread can add events without a lock
+            _state.events.append({'name': self.name, 'cat': self.category, 'ph': 'X',
+                                  'ts': (self.start - _state.origin) / 1000,
+                                  'dur': (end - self.start) / 1000, 'pid': os.getpid(),
+                                  'tid': threading.get_ident(), 'args': self.args})
+        return False
+
+def span(name, category='viewer', **args):
+    """Returns a context manager timing its block as name; args are shown in the trace."""
+    if not _state.recording:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+def traced(name=None, category='viewer'):
+    """Decorator timing every call of a function as a span (default name: its qualified name)."""
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.recording:
+                return func(*args, **kwargs)
+            with _Span(label, category, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def counter(name, **values):
+    """Adds a Chrome trace counter sample (e.g. memory) when events are kept."""
+    if _state.keep_events:
+        _state.events.append({'name': name, 'ph': 'C', 'ts': (time.perf_counter_ns() - _state.origin) / 1000,
+                              'pid': os.getpid(), 'args': values})
+
+def _reset_peak_rss():
+    """Resets the kernel's peak RSS of this process where supported (Linux)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as refs:
+            refs.write('5')
+    except OSError:
+        pass
+
+def _peak_rss_mb():
+    """Returns the peak resident set size in MB since the last reset (process lifetime elsewhere)."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if os.uname().sysname == 'Darwin' else peak / 1024
+
+class _FileScope:
+    def __init__(self, path):
+        self.path = path
+        self.span = _Span('file', 'file', {'path': path})
+
+    def __enter__(self):
+        _reset_peak_rss()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.span.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.span.__exit__(*exc_info)
+        entry = {'path': self.path, 'seconds': (time.perf_counter_ns() - self.span.start) / 1e9,
+                 'peak_rss_mb': _peak_rss_mb()}
+        if tracemalloc.is_tracing():
+            entry['peak_traced_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        self.span.args.update(entry)
+        metrics.files.append(entry)
+        counter('memory', **{key: value for key, value in entry.items() if key.endswith('_mb')})
+        return False
+
+def file_scope(path):
+    """Returns a context manager tracing the work on one file and its peak memory."""
+    if not _state.recording:
+        return _NULL_SPAN
+    return _FileScope(path)
+
+def enable(events=True, memory=False):
+    """
+    Starts recording spans.
+
+    Args:
+        events (bool): Keep Chrome trace events as well as metrics.
+        memory (bool): Trace Python allocations with tracemalloc for per-file peaks.
+    """
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _state.keep_events = _state.keep_events or events
+    _state.recording = True
+
+def disable():
+    _state.recording = False
+    _state.keep_events = False
+
+def is_recording():
+    return _state.recording
+
+def clear():
+    """Drops the recorded events and metrics."""
+    _state.events = []
+    metrics.reset()
+
+def write_chrome_trace(path):
+    """Writes the recorded events as Chrome trace-event JSON and returns the number of events."""
+    events = list(_state.events)
+    pid = os.getpid()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    metadata = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'DICOM Viewer'}}]
+    for tid in sorted({event['tid'] for event in events if 'tid' in event}):
+        metadata.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                         'args': {'name': names.get(tid, f"thread {tid}")}})
+    with open(path, 'w') as output:
+        json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms',
+                   'otherData': {'metrics': metrics.snapshot(), 'files': metrics.files}}, output)
+    return len(events)
+
+_overlay = [False]
+
+def overlay_requested():
+    """Returns whether image views should show the performance overlay."""
+    return _overlay[0]
+
+def set_overlay(enabled):
+    """Turns the overlay on for image views created from now on; it needs metrics, so recording starts."""
+    _overlay[0] = enabled
+    if enabled:
+        enable(events=False)
+
+def _write_at_exit(path):
+    count = write_chrome_trace(path)
+    print(f"Trace written to {path} ({count} events)")
+
+def enable_from_environment():
+    """Applies DICOM_VIEWER_TRACE, DICOM_VIEWER_TRACE_MEMORY and DICOM_VIEWER_OVERLAY."""
+    path = os.environ.get(TRACE_ENV)
+    if path:
+        enable(events=True, memory=os.environ.get(TRACE_MEMORY_ENV) == '1')
+        atexit.register(_write_at_exit, path)
+    if os.environ.get(OVERLAY_ENV) == '1':
+        set_overlay(True)
+
+enable_from_environment()
@@ -1,21 +1,45 @@
-print("dicom_viewer.py is being imported")
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QPushButton, 
                              QVBoxLayout, QHBoxLayout, QLineEdit, QLabel, 
-                             QFileDialog, QMessageBox)
-from PyQt5.QtCore import Qt
-from dicom_display import load_dicom_file, display_dicom, display_m2d, display_3d, display_tags
-from dicom_tags import TagViewerWindow
-from dicom_anonymizer import anonymize_dicom
+                             QFileDialog, QMessageBox, QInputDialog, QProgressDialog, QCheckBox)
+from PyQt5.QtCore import Qt, QTimer
+from dicom_display import choose_dicom_file
+from dicom_trace import overlay_requested, set_overlay
 import os
 import sys
+import threading
+
+# Modules the viewer needs only once a file is opened. They pull in pydicom,
+# NumPy and matplotlib, so they are imported on first use instead of at startup,
+# and pre-loaded on a background thread once the window is up (unless
+# DICOM_VIEWER_PRELOAD=0).
+PRELOAD_MODULES = ['dicom_loader', 'dicom_frames', 'dicom_lut', 'dicom_tags']
 
 class DICOMViewer(QMainWindow):
     def __init__(self):
         super().__init__()
         self.current_file = None
         self.current_ds = None
+        self.group_index = None
         self.tag_window = None
+        self.image_window = None
+        self.current_frames = None
+        self.loader = None
+        self.load_progress = None
+        self.series_thread = None
+        self.series_progress = None
         self.initUI()
+        if os.environ.get('DICOM_VIEWER_PRELOAD', '1') != '0':
+            QTimer.singleShot(0, self.preload_modules)
+
+    def preload_modules(self):
+        """Imports PRELOAD_MODULES in the background so the first file opens without the import delay."""
+        def run():
+            for name in PRELOAD_MODULES:
+                try:
+                    __import__(name)
+                except Exception as e:
+                    print(f"Could not pre-load {name}: {str(e)}")
+        threading.Thread(target=run, name='preload', daemon=True).start()
 
     def initUI(self):
         self.setWindowTitle('DICOM Viewer')
@@ -32,6 +56,12 @@ class DICOMViewer(QMainWindow):
         title_label.setStyleSheet("font-size: 16px; font-weight: bold;")
         layout.addWidget(title_label)
 
+        # Summary of the loaded file's header, shown as soon as it is parsed
+        self.header_label = QLabel('No file loaded')
+        self.header_label.setAlignment(Qt.AlignCenter)
+        self.header_label.setWordWrap(True)
+        layout.addWidget(self.header_label)
+
         # Anonymization prefix
         prefix_layout = QHBoxLayout()
         prefix_label = QLabel('Anonymization Prefix:')
@@ -48,6 +78,16 @@ class DICOMViewer(QMainWindow):
         open_button.clicked.connect(self.open_and_display)
         layout.addWidget(open_button)
 
+        series_button = QPushButton('Open Series Folder')
+        series_button.setStyleSheet(button_style)
+        series_button.clicked.connect(self.open_series_folder)
+        layout.addWidget(series_button)
+
+        mpr_button = QPushButton('MPR View')
+        mpr_button.setStyleSheet(button_style)
+        mpr_button.clicked.connect(self.open_mpr)
+        layout.addWidget(mpr_button)
+
         # Add tag group buttons
         tag_groups_layout = QHBoxLayout()
         
@@ -90,83 +130,258 @@ class DICOMViewer(QMainWindow):
         anonymize_button.clicked.connect(self.anonymize)
         layout.addWidget(anonymize_button)
 
+        # Decode/render times and FPS over image views opened from now on
+        overlay_check = QCheckBox('Show performance overlay')
+        overlay_check.setChecked(overlay_requested())
+        overlay_check.toggled.connect(set_overlay)
+        layout.addWidget(overlay_check)
+
     def open_and_display(self):
+        """Loads a file on a worker thread, showing its header first and the image as soon as its frames are open."""
+        filepath = choose_dicom_file(self)
+        if not filepath:
+            return
+        
+        from dicom_loader import STAGES, FileLoaderThread
+        
+        self.stop_loading()
+        self.loader = FileLoaderThread(filepath, self)
+        self.loader.header_loaded.connect(lambda ds: self.on_header_loaded(ds, filepath))
+        self.loader.progress.connect(self.on_load_progress)
+        self.loader.ready.connect(self.on_ready)
+        self.loader.loaded.connect(self.on_loaded)
+        self.loader.failed.connect(self.on_load_failed)
+        self.loader.cancelled.connect(self.on_load_cancelled)
+        self.loader.finished.connect(self.loader.deleteLater)
+        
+        # Not modal, so the tag views can be used while frames decode
+        self.load_progress = QProgressDialog(f"{STAGES[0]}...", "Cancel", 0, 0, self)
+        self.load_progress.setWindowTitle("Loading DICOM")
+        self.load_progress.setAutoReset(False)
+        self.load_progress.setAutoClose(False)
+        self.load_progress.setMinimumDuration(500)
+        self.load_progress.canceled.connect(self.loader.cancel)
+        self.loader.start()
+
+    def stop_loading(self):
+        """Cancels a load in progress; its results are ignored."""
+        if self.loader is None:
+            return
+        for signal in (self.loader.header_loaded, self.loader.progress, self.loader.ready,
+                       self.loader.loaded, self.loader.failed, self.loader.cancelled):
+            signal.disconnect()
+        self.loader.cancel()
+        self.loader = None
+        self.close_load_progress()
+
+    def close_load_progress(self):
+        if self.load_progress is not None:
+            self.load_progress.canceled.disconnect()
+            self.load_progress.close()
+            self.load_progress = None
+
+    def on_header_loaded(self, ds, filepath):
+        self.current_ds = ds
+        self.current_file = filepath
+        self.current_frames = None
+        
+        rows, columns = ds.get('Rows'), ds.get('Columns')
+        frames = ds.get('NumberOfFrames') or 1
+        size = f"{rows} x {columns}, {frames} frame(s)" if rows and columns else "no image"
+        file_meta = getattr(ds, 'file_meta', None)
+        transfer_syntax = file_meta.get('TransferSyntaxUID') if file_meta is not None else None
+        syntax = transfer_syntax.name if transfer_syntax else 'Unknown transfer syntax'
+        self.header_label.setText(f"{os.path.basename(filepath)}\n"
+                                  f"{ds.get('PatientName', '')} - {ds.get('Modality', '')} - {size}\n"
+                                  f"{syntax}")
+
+    def on_load_progress(self, stage, done, total):
+        if self.load_progress is None:
+            return
+        from dicom_loader import STAGES
+        if total:
+            self.load_progress.setLabelText(f"{STAGES[stage]} ({done}/{total})...")
+        else:
+            self.load_progress.setLabelText(f"{STAGES[stage]}...")
+        self.load_progress.setMaximum(total)
+        self.load_progress.setValue(done)
+
+    def on_ready(self, ds, frames):
+        # Frames still being prefetched are decoded on demand; Cancel only stops the prefetch
+        self.show_image(ds, frames)
+    
+    def on_loaded(self, ds, frames):
+        self.loader = None
+        self.close_load_progress()
+
+    def on_load_failed(self, message):
+        self.loader = None
+        self.close_load_progress()
+        QMessageBox.critical(self, "Error", message)
+
+    def on_load_cancelled(self):
+        self.loader = None
+        self.close_load_progress()
+        print("Loading cancelled")
+
+    def closeEvent(self, event):
+        if self.loader is not None:
+            loader = self.loader
+            self.stop_loading()
+            loader.wait()
+        if self.series_thread is not None:
+            self.series_thread.cancel()
+            self.series_thread.wait()
+        super().closeEvent(event)
+
+    def show_image(self, ds, frames):
+        """Picks a display for frames based on their shape."""
+        from dicom_display import display_dicom, display_m2d, display_3d
+        
         try:
-            ds, filepath = load_dicom_file()
-            if ds is not None:
-                self.current_ds = ds
-                self.current_file = filepath
-                
-                try:
-                    pixel_array = ds.pixel_array
-                    shape = pixel_array.shape
-                    
-                    print(f"Image shape: {shape}")
-                    
-                    if len(shape) == 4 and shape[-1] == 3:  # Multi-frame color
-                        print(f"Displaying multi-frame color image with {shape[0]} frames")
-                        display_m2d(ds)
-                    elif len(shape) == 2:  # Single image
-                        print("Displaying single image")
-                        display_dicom(ds)
-                    elif len(shape) == 3:
-                        if shape[2] == 3:  # Single RGB image
-                            print("Displaying RGB image")
-                            display_dicom(ds)
-                        else:  # 3D volume
-                            print(f"Displaying 3D volume with {shape[0]} slices")
-                            display_3d(ds)
-                    else:
-                        QMessageBox.warning(self, "Warning", 
-                                          f"Unsupported image format with shape {shape}")
-                        
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", 
-                                       f"Error displaying image: {str(e)}")
-                    print(f"Full error: {str(e)}")
+            self.current_frames = frames
+            shape = frames.shape
+            
+            print(f"Image shape: {shape}")
+            
+            if len(shape) == 4 and shape[-1] == 3:  # Multi-frame color
+                print(f"Displaying multi-frame color image with {shape[0]} frames")
+                self.image_window = display_m2d(ds, frames)
+            elif len(shape) == 2:  # Single image
+                print("Displaying single image")
+                display_dicom(ds, frames)
+            elif len(shape) == 3:
+                if shape[2] == 3:  # Single RGB image
+                    print("Displaying RGB image")
+                    display_dicom(ds, frames)
+                else:  # 3D volume
+                    print(f"Displaying 3D volume with {shape[0]} slices")
+                    display_3d(ds, frames)
             else:
-                QMessageBox.critical(self, "Error", filepath)
+                QMessageBox.warning(self, "Warning", 
+                                  f"Unsupported image format with shape {shape}")
+                
         except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
+            QMessageBox.critical(self, "Error", 
+                               f"Error displaying image: {str(e)}")
+            print(f"Full error: {str(e)}")
+
+    def open_series_folder(self):
+        """Indexes a folder through the series catalog on a worker thread and displays one of its series."""
+        folder = QFileDialog.getExistingDirectory(self, "Open DICOM Series Folder")
+        if not folder or self.series_thread is not None:
+            return
+        
+        from dicom_loader import SeriesScanThread
+        
+        self.series_thread = SeriesScanThread(folder, self)
+        self.series_progress = QProgressDialog("Reading DICOM headers...", "Cancel", 0, 0, self)
+        self.series_progress.setWindowModality(Qt.WindowModal)
+        self.series_progress.setMinimumDuration(500)
+        self.series_progress.canceled.connect(self.series_thread.cancel)
+        self.series_thread.progress.connect(self.on_series_progress)
+        self.series_thread.scanned.connect(lambda stats, series: self.on_series_scanned(folder, stats, series))
+        self.series_thread.failed.connect(self.on_series_failed)
+        self.series_thread.cancelled.connect(self.on_series_cancelled)
+        self.series_thread.finished.connect(self.series_thread.deleteLater)
+        self.series_thread.start()
+
+    def on_series_progress(self, done, total):
+        if self.series_progress is not None:
+            self.series_progress.setMaximum(total)
+            self.series_progress.setValue(done)
+
+    def close_series_progress(self):
+        self.series_thread = None
+        if self.series_progress is not None:
+            self.series_progress.canceled.disconnect()
+            self.series_progress.close()
+            self.series_progress = None
+
+    def on_series_scanned(self, folder, stats, series):
+        self.close_series_progress()
+        print(f"Catalog scan: {stats.files} files, {stats.parsed} parsed, "
+              f"{stats.unchanged} unchanged in {stats.seconds:.2f} s")
+        if not series:
+            QMessageBox.warning(self, "Warning", "No DICOM images found in this folder.")
+            return
+        
+        from dicom_catalog import series_label
+        from dicom_loader import SeriesLoaderThread
+        
+        chosen = series[0]
+        if len(series) > 1:
+            labels = [series_label(info) for info in series]
+            label, ok = QInputDialog.getItem(self, "Select Series", "Series:", labels, 0, False)
+            if not ok:
+                return
+            chosen = series[labels.index(label)]
+        
+        self.series_thread = SeriesLoaderThread(folder, chosen.series_uid, self)
+        self.series_progress = QProgressDialog("Assembling volume...", "Cancel", 0, chosen.instances, self)
+        self.series_progress.setWindowModality(Qt.WindowModal)
+        self.series_progress.setMinimumDuration(500)
+        self.series_progress.canceled.connect(self.series_thread.cancel)
+        self.series_thread.progress.connect(self.on_series_progress)
+        self.series_thread.loaded.connect(self.on_series_loaded)
+        self.series_thread.failed.connect(self.on_series_failed)
+        self.series_thread.cancelled.connect(self.on_series_cancelled)
+        self.series_thread.finished.connect(self.series_thread.deleteLater)
+        self.series_thread.start()
+
+    def on_series_loaded(self, ds, path, frames):
+        self.close_series_progress()
+        self.current_ds = ds
+        self.current_file = path
+        self.show_image(ds, frames)
+
+    def on_series_failed(self, message):
+        self.close_series_progress()
+        QMessageBox.critical(self, "Error", message)
+
+    def on_series_cancelled(self):
+        self.close_series_progress()
+        print("Loading cancelled")
+
+    def open_mpr(self):
+        """Shows the loaded volume as three linked orthogonal planes."""
+        frames = self.current_frames
+        if frames is None or len(frames.shape) != 3 or frames.shape[-1] == 3:
+            QMessageBox.warning(self, "Warning", "Please load a grayscale 3D volume first.")
+            return
+        
+        from dicom_display import display_mpr
+        from dicom_volume import Volume, volume_from_frames
+        
+        try:
+            volume = frames if isinstance(frames, Volume) else volume_from_frames(frames, self.current_ds)
+            self.image_window = display_mpr(volume, self.current_ds)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error opening MPR view: {str(e)}")
 
     def explore_tag_group(self, group):
         if self.current_ds is None:
             QMessageBox.warning(self, "Warning", "Please load a DICOM file first.")
             return
             
-        tag_info = self.get_group_tags(self.current_ds, group)
+        elements, owners = self.get_group_tags(self.current_ds, group)
+        if not elements:
+            QMessageBox.information(self, "Info", f"No {group} tags found.")
+            return
         window_title = f'{group} DICOM Tags'
-        self.tag_window = TagViewerWindow(tag_info, self.current_ds)
+        from dicom_tags import TagViewerWindow
+        self.tag_window = TagViewerWindow(self.current_ds, elements, owners)
         self.tag_window.setWindowTitle(window_title)
         self.tag_window.show()
 
     def get_group_tags(self, ds, group):
-        """Returns tags for specific DICOM groups."""
-        tag_list = []
-        
-        group_keywords = {
-            'Patient': ['Patient', 'Birth'],
-            'Study': ['Study', 'Series'],
-            'Modality': ['Modality', 'Protocol', 'Acquisition'],
-            'Physician': ['Physician', 'Operator', 'Institution'],
-            'Image': ['Image', 'Pixel', 'Window', 'Bits']
-        }
-        
-        keywords = group_keywords.get(group, [])
-        
-        for elem in ds:
-            try:
-                element_name = elem.name.lower()
-                if any(keyword.lower() in element_name for keyword in keywords):
-                    tag_str = f"{elem.name}: {elem.repval}"
-                    tag_list.append(tag_str)
-            except Exception as e:
-                continue
-        
-        if not tag_list:
-            tag_list.append(f"No {group} tags found.")
-            
-        return "\n".join(tag_list)
+        """Returns the data elements belonging to a specific DICOM group, and the dataset holding each."""
+        from dicom_tag_groups import TagGroupIndex
+        
+        # Indexed once per dataset; switching groups is then a lookup
+        if self.group_index is None or self.group_index.dataset is not ds:
+            self.group_index = TagGroupIndex(ds)
+        return self.group_index.elements_for(group), self.group_index.owners_for(group)
 
     def anonymize(self):
         if self.current_file is None:
@@ -178,9 +393,9 @@ class DICOMViewer(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please enter an anonymization prefix.")
             return
         
+        from dicom_anonymizer import anonymize_dicom, anonymized_path
         if anonymize_dicom(self.current_file, prefix):
-            save_path = os.path.join(os.path.dirname(self.current_file), 
-                                   f"anonymized_{os.path.basename(self.current_file)}")
+            save_path = anonymized_path(self.current_file)
             QMessageBox.information(self, "Success", 
                                   f"File anonymized successfully!\nSaved to:\n{save_path}")
         else:
@@ -192,8 +407,8 @@ class DICOMViewer(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please load a DICOM file first.")
             return
             
-        tag_info = display_tags(self.current_ds)
-        self.tag_window = TagViewerWindow(tag_info, self.current_ds)
+        from dicom_tags import TagViewerWindow
+        self.tag_window = TagViewerWindow(self.current_ds)
         self.tag_window.setWindowTitle('All DICOM Tags')
         self.tag_window.show()
 
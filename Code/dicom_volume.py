@@ -0,0 +1,335 @@
+"""Assembly of 3D volumes from DICOM series.
+
+``build_volume`` takes the files of a series in slice order (as returned by
+``dicom_catalog``) and copies each slice into a preallocated ``.npy`` memory
+map, so a volume of any size is written without ever being held in RAM.
+Multi-frame files contribute one slice per frame. Native slices are copied straight from their own memory map and compressed
+ones are decoded one at a time, on a thread pool. Finished volumes are kept in
+an on-disk cache keyed by the files' paths, mtimes and sizes and re-open
+instantly. ``volume_from_frames`` wraps a single multi-frame file the same way,
+without copying when its pixel data is native.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pydicom
+
+from dicom_cache import FrameCache
+from dicom_frames import DECODE_WORKERS, FRAME_DEFER_SIZE, decode_frames, open_frames
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.dicom_viewer', 'volumes')
+# Least recently used volumes are deleted once the cache grows past this size
+DEFAULT_CACHE_LIMIT = 8 * 1024 ** 3
+
+def _floats(value, count):
+    """Returns value as a list of count floats, or None if it does not have that many."""
+    if value is None:
+        return None
+    try:
+        values = [float(v) for v in value]
+    except (TypeError, ValueError):
+        return None
+    return values if len(values) == count else None
+
+def _functional_group(ds, sequence, keyword):
+    """Returns keyword from the first item of a Shared Functional Groups sequence, if present."""
+    shared = ds.get('SharedFunctionalGroupsSequence')
+    if not shared or sequence not in shared[0] or not shared[0][sequence].value:
+        return None
+    return shared[0][sequence][0].get(keyword)
+
+def _pixel_spacing(ds):
+    spacing = _floats(ds.get('PixelSpacing'), 2)
+    if spacing is None:
+        spacing = _floats(_functional_group(ds, 'PixelMeasuresSequence', 'PixelSpacing'), 2)
+    if spacing is None:
+        spacing = _floats(ds.get('ImagerPixelSpacing'), 2)
+    return spacing or [1.0, 1.0]
+
+def _orientation(ds):
+    orientation = _floats(ds.get('ImageOrientationPatient'), 6)
+    if orientation is None:
+        orientation = _floats(_functional_group(ds, 'PlaneOrientationSequence',
+                                                'ImageOrientationPatient'), 6)
+    return orientation or [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
+
+def _frame_positions(ds):
+    """Returns the Image Position (Patient) of every frame of a multi-frame dataset, or None."""
+    per_frame = ds.get('PerFrameFunctionalGroupsSequence')
+    if not per_frame:
+        return None
+    positions = []
+    for item in per_frame:
+        plane = item.get('PlanePositionSequence')
+        position = _floats(plane[0].get('ImagePositionPatient'), 3) if plane else None
+        if position is None:
+            return None
+        positions.append(position)
+    return positions
+
+def _slice_spacing(positions, normal, ds):
+    """Returns the slice spacing from the positions along normal, falling back to the header."""
+    if positions is not None and len(positions) > 1:
+        distances = np.asarray(positions, dtype=float) @ normal
+        steps = np.abs(np.diff(distances))
+        steps = steps[steps > 1e-6]
+        if len(steps):
+            return float(np.median(steps))
+    for keyword in ('SpacingBetweenSlices', 'SliceThickness'):
+        value = ds.get(keyword)
+        if value not in (None, ''):
+            return abs(float(value)) or 1.0
+    return 1.0
+
+class Volume:
+    """
+    A (slices, rows, columns[, samples]) image volume with its patient geometry.
+
+    Attributes:
+        array (numpy.ndarray): The voxels, usually a read-only memory map.
+        spacing (tuple): Voxel size in mm along (slice, row, column).
+        origin (tuple): Image Position (Patient) of the first slice.
+        orientation (numpy.ndarray): 3x3 matrix whose rows are the row, column
+            and slice direction cosines.
+        header (Dataset): Header of the first slice, for windowing and display.
+
+    Volumes also work as frame accessors, one frame per slice.
+    """
+
+    def __init__(self, array, spacing, origin=None, orientation=None, header=None, path=None):
+        self.array = array
+        self.spacing = tuple(float(s) for s in spacing)
+        self.origin = tuple(origin) if origin is not None else (0.0, 0.0, 0.0)
+        self.orientation = np.eye(3) if orientation is None else np.asarray(orientation, dtype=float)
+        self.header = header
+        self.path = path
+        self.encapsulated = False
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    @property
+    def frame_shape(self):
+        return self.array.shape[1:]
+
+    @property
+    def number_of_frames(self):
+        return self.array.shape[0]
+
+    def __len__(self):
+        return self.array.shape[0]
+
+    def __getitem__(self, index):
+        return self.frame(index)
+
+    def frame(self, index):
+        return self.array[index]
+
+    def plane(self, axis, index):
+        """
+        Returns one plane through the volume as a strided view (no copy).
+
+        axis 0 gives the acquired (axial) slices; 1 and 2 cut across the
+        slices along rows (coronal) and columns (sagittal), with the slice
+        axis flipped so the last slice is at the top.
+        """
+        if axis == 0:
+            return self.array[index]
+        if axis == 1:
+            return self.array[::-1, index]
+        return self.array[::-1, :, index]
+
+    def plane_aspect(self, axis):
+        """Returns the height/width ratio of one pixel of a plane along axis."""
+        slice_spacing, row_spacing, column_spacing = self.spacing
+        if axis == 0:
+            return row_spacing / column_spacing
+        if axis == 1:
+            return slice_spacing / column_spacing
+        return slice_spacing / row_spacing
+
+    def close(self):
+        self.array = None
+
+def _geometry(orientation):
+    """Returns the 3x3 direction matrix for an Image Orientation (Patient) value."""
+    row, column = np.asarray(orientation[:3]), np.asarray(orientation[3:])
+    return np.vstack([row, column, np.cross(row, column)])
+
+def volume_from_frames(frames, ds):
+    """
+    Returns a Volume over the frames of a single multi-frame dataset.
+
+    Native pixel data is used in place through the frame accessor's memory
+    map; otherwise the frames are decoded in parallel into one array.
+    """
+    native = frames.native_array() if hasattr(frames, 'native_array') else None
+    array = native if native is not None else decode_frames(frames)
+    row_spacing, column_spacing = _pixel_spacing(ds)
+    orientation = _geometry(_orientation(ds))
+    positions = _frame_positions(ds)
+    spacing = (_slice_spacing(positions, orientation[2], ds), row_spacing, column_spacing)
+    origin = positions[0] if positions else _floats(ds.get('ImagePositionPatient'), 3)
+    return Volume(array, spacing, origin, orientation, header=ds)
+
+def _cache_key(paths):
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}|{stat.st_mtime}|{stat.st_size}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def _trim_cache(cache_dir, limit, keep=None):
+    """Deletes the least recently used volumes, other than keep, until the cache fits in limit bytes."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.npy') and entry.path != keep:
+            stat = entry.stat()
+            entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        for stale in (path, path[:-4] + '.json'):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+        total -= size
+
+def _frame_count(path):
+    ds = pydicom.dcmread(path, stop_before_pixels=True, specific_tags=['NumberOfFrames'])
+    return int(ds.get('NumberOfFrames') or 1)
+
+def _read_slices(path, start, count, output):
+    """
+    Copies the count frames of path into output[start:start + count].
+
+    Returns:
+        list: The Image Position (Patient) of each frame, or None entries where unknown.
+    """
+    # Pixel Data stays deferred unless the file has to be decoded through pydicom
+    ds = pydicom.dcmread(path, defer_size=FRAME_DEFER_SIZE)
+    frames = open_frames(ds, frame_cache=FrameCache(memory_bytes=0, directory=None))
+    try:
+        if frames.number_of_frames != count:
+            raise ValueError(f"{path} has {frames.number_of_frames} frames, expected {count}")
+        for index in range(count):
+            frame = frames.frame(index)
+            if frame.shape != output.shape[1:]:
+                raise ValueError(f"Slice {start + index + 1} has shape {frame.shape}, "
+                                 f"expected {output.shape[1:]}")
+            output[start + index] = frame
+    finally:
+        frames.close()
+    if count == 1:
+        return [_floats(ds.get('ImagePositionPatient'), 3)]
+    return _frame_positions(ds) or [None] * count
+
+def build_volume(paths, cache_dir=DEFAULT_CACHE_DIR, workers=None, progress=None,
+                 cache_limit=DEFAULT_CACHE_LIMIT, frame_counts=None):
+    """
+    Assembles a Volume from the files of a series given in slice order.
+
+    Args:
+        paths (list): File paths, sorted along the slice direction. The frames
+            of a multi-frame file become consecutive slices.
+        cache_dir (str): Folder holding built volumes, or None to build into a
+            temporary file. That file is unlinked as soon as it is mapped on
+            POSIX systems; elsewhere it is left in the temporary folder.
+        workers (int): Slice-reading threads (default: DECODE_WORKERS).
+        progress (callable): Called as progress(done, total) files from the
+            calling thread; an exception it raises stops the build.
+        cache_limit (int): Bytes of volumes kept in cache_dir.
+        frame_counts (list): Frames in each file, as from
+            SeriesCatalog.instance_frames(); read from the headers if not given.
+
+    Returns:
+        Volume: Backed by a read-only memory map of the assembled ``.npy`` file.
+    """
+    paths = list(paths)
+    if not paths:
+        raise ValueError("No slices to assemble")
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        key = _cache_key(paths)
+        array_path = os.path.join(cache_dir, f"{key}.npy")
+        meta_path = os.path.join(cache_dir, f"{key}.json")
+        if os.path.exists(array_path) and os.path.exists(meta_path):
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            header = pydicom.dcmread(paths[0], stop_before_pixels=True)
+            return Volume(np.load(array_path, mmap_mode='r'), meta['spacing'], meta['origin'],
+                          meta['orientation'], header=header, path=array_path)
+    else:
+        handle, array_path = tempfile.mkstemp(suffix='.npy')
+        os.close(handle)
+
+    if frame_counts is None:
+        frame_counts = [_frame_count(path) for path in paths]
+    starts = np.concatenate(([0], np.cumsum(frame_counts)))
+
+    first = open_frames(pydicom.dcmread(paths[0], defer_size=FRAME_DEFER_SIZE),
+                        frame_cache=FrameCache(memory_bytes=0, directory=None))
+    try:
+        sample = first.frame(0)
+        shape, dtype = (int(starts[-1]),) + sample.shape, sample.dtype.newbyteorder('=')
+    finally:
+        first.close()
+
+    # Written under a temporary name so an interrupted build is never picked up from the cache
+    partial_path = array_path + '.partial'
+    output = np.lib.format.open_memmap(partial_path, mode='w+', dtype=dtype, shape=shape)
+    positions = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers or DECODE_WORKERS) as executor:
+            futures = [executor.submit(_read_slices, path, int(starts[index]),
+                                       int(frame_counts[index]), output)
+                       for index, path in enumerate(paths)]
+            try:
+                for index, future in enumerate(futures):
+                    positions.extend(future.result())
+                    if progress is not None:
+                        progress(index + 1, len(paths))
+            except BaseException:
+                # Slices not started yet are skipped rather than read into a volume being discarded
+                for future in futures:
+                    future.cancel()
+                raise
+        output.flush()
+    except BaseException:
+        del output
+        os.remove(partial_path)
+        raise
+    del output
+    os.replace(partial_path, array_path)
+
+    header = pydicom.dcmread(paths[0], stop_before_pixels=True)
+    row_spacing, column_spacing = _pixel_spacing(header)
+    orientation = _geometry(_orientation(header))
+    if any(position is None for position in positions):
+        positions = None
+    spacing = (_slice_spacing(positions, orientation[2], header), row_spacing, column_spacing)
+    origin = positions[0] if positions else (0.0, 0.0, 0.0)
+    volume = Volume(np.load(array_path, mmap_mode='r'), spacing, origin, orientation,
+                    header=header, path=array_path)
+
+    if cache_dir:
+        with open(meta_path, 'w') as meta_file:
+            json.dump({'spacing': volume.spacing, 'origin': list(volume.origin),
+                       'orientation': volume.orientation.tolist()}, meta_file)
+        # The volume just built stays even if it alone is over the limit, so the next open reuses it
+        _trim_cache(cache_dir, cache_limit, keep=array_path)
+    else:
+        # Unlinking is safe on POSIX once mapped; elsewhere the file is left to the temp folder
+        try:
+            os.remove(array_path)
+        except OSError:
+            pass
+    return volume
@@ -0,0 +1,14 @@
+"""The viewer's modules are flat scripts in Code/, imported by name."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Code'))
+
+@pytest.fixture(scope='session')
+def qapp():
+    """A QApplication for widget tests; set QT_QPA_PLATFORM=offscreen to run without a display."""
+    from PyQt5.QtWidgets import QApplication
+
+    return QApplication.instance() or QApplication([])
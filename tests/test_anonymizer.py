@@ -0,0 +1,60 @@
+import pydicom
+import pytest
+
+from dicom_anonymizer import anonymize_file, anonymized_path
+from dicom_synthetic import _save, make_jpeg2000_multiframe, make_multiframe
+
+@pytest.fixture(params=['native', 'jpeg2000'])
+def source(request, tmp_path):
+    path = str(tmp_path / f"{request.param}.dcm")
+    if request.param == 'native':
+        return make_multiframe(path, frames=3, rows=16, cols=16)
+    return make_jpeg2000_multiframe(path, frames=3, rows=16, cols=16)
+
+def test_anonymized_path(tmp_path):
+    assert anonymized_path('/data/a.dcm') == '/data/anonymized_a.dcm'
+    assert anonymized_path('/data/a.dcm', str(tmp_path)) == str(tmp_path / 'anonymized_a.dcm')
+
+def test_header_only_keeps_pixel_bytes(source, tmp_path):
+    output = anonymize_file(source, 'TEST', str(tmp_path / 'out.dcm'), header_only=True)
+
+    original = pydicom.dcmread(source)
+    anonymized = pydicom.dcmread(output)
+    assert anonymized.PixelData == original.PixelData
+    assert anonymized.file_meta.TransferSyntaxUID == original.file_meta.TransferSyntaxUID
+    assert str(anonymized.PatientName) == 'TEST_Anonymous'
+    assert anonymized.PatientID == 'TEST_ID'
+    assert 'InstitutionName' not in anonymized
+    assert 'AccessionNumber' not in anonymized
+
+def test_header_only_matches_full_rewrite(source, tmp_path):
+    header = pydicom.dcmread(anonymize_file(source, 'TEST', str(tmp_path / 'header.dcm'), header_only=True))
+    full = pydicom.dcmread(anonymize_file(source, 'TEST', str(tmp_path / 'full.dcm'), header_only=False))
+    assert header.PixelData == full.PixelData
+    assert sorted(header.keys()) == sorted(full.keys())
+
+def _add_trailing(path):
+    """Rewrites path with a private group, a sequence and padding stored after Pixel Data."""
+    ds = pydicom.dcmread(path)
+    ds.add_new(0x7FE10010, 'LO', 'ACME')
+    ds.add_new(0x7FE11001, 'LO', 'private note')
+    item = pydicom.Dataset()
+    item.InstitutionName = 'Trailing Hospital'
+    ds.add_new(0x7FE11002, 'SQ', [item])
+    ds.add_new(0xFFFCFFFC, 'OB', b'\0' * 16)
+    return _save(ds, path)
+
+def test_header_only_anonymizes_elements_after_pixel_data(source, tmp_path):
+    _add_trailing(source)
+    output = anonymize_file(source, 'TEST', str(tmp_path / 'out.dcm'), header_only=True)
+
+    with open(output, 'rb') as f:
+        assert b'Trailing Hospital' not in f.read()
+    anonymized = pydicom.dcmread(output)
+    assert anonymized.PixelData == pydicom.dcmread(source).PixelData
+    assert anonymized[0x7FE11001].value == 'private note'
+    assert 'InstitutionName' not in anonymized[0x7FE11002].value[0]
+    assert 0xFFFCFFFC not in anonymized
+
+    full = pydicom.dcmread(anonymize_file(source, 'TEST', str(tmp_path / 'full.dcm'), header_only=False))
+    assert sorted(anonymized.keys()) == sorted(tag for tag in full.keys() if tag != 0xFFFCFFFC)
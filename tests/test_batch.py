@@ -0,0 +1,37 @@
+import os
+
+import pydicom
+
+from dicom_batch import batch_anonymize, find_dicom_files, output_path_for
+from dicom_synthetic import make_series, make_single_frame
+
+def test_find_dicom_files_skips_earlier_outputs(tmp_path):
+    make_single_frame(str(tmp_path / 'a.dcm'), rows=4, cols=4)
+    make_single_frame(str(tmp_path / 'anonymized_a.dcm'), rows=4, cols=4)
+    assert find_dicom_files(str(tmp_path)) == [str(tmp_path / 'a.dcm')]
+    assert find_dicom_files(str(tmp_path / 'a.dcm')) == [str(tmp_path / 'a.dcm')]
+
+def test_output_path_mirrors_the_tree(tmp_path):
+    root = str(tmp_path / 'in')
+    path = os.path.join(root, 'study', 'a.dcm')
+    assert output_path_for(path, root) == os.path.join(root, 'study', 'anonymized_a.dcm')
+    assert output_path_for(path, root, str(tmp_path / 'out')) == str(tmp_path / 'out' / 'study' / 'anonymized_a.dcm')
+
+def test_batch_anonymize_tree(tmp_path):
+    root = tmp_path / 'in'
+    paths = make_series(str(root / 'series'), files=5, rows=4, cols=4)
+    (root / 'notes.txt').write_text('not a DICOM file')
+    output = tmp_path / 'out'
+
+    results = []
+    stats = batch_anonymize(str(root), 'TEST', str(output), workers=2,
+                            progress=lambda result, stats: results.append(result))
+
+    assert (stats.total, stats.done, stats.failed, stats.skipped) == (6, 6, 0, 1)
+    assert {result.status for result in results} == {'ok', 'skipped'}
+    for path in paths:
+        written = output / 'series' / f"anonymized_{os.path.basename(path)}"
+        ds = pydicom.dcmread(str(written))
+        assert str(ds.PatientName) == 'TEST_Anonymous'
+        assert 'InstitutionName' not in ds
+        assert ds.PixelData == pydicom.dcmread(path).PixelData
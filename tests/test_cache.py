@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+from dicom_cache import FrameCache
+
+def frame(value, size=16):
+    return np.full((size, size), value, dtype=np.uint16)
+
+def test_memory_level_evicts_least_recently_used():
+    cache = FrameCache(memory_bytes=3 * frame(0).nbytes, directory=None)
+    for index in range(3):
+        cache.put('1.2.3', index, frame(index))
+    assert cache.get('1.2.3', 0) is not None
+    cache.put('1.2.3', 3, frame(3))
+
+    assert cache.get('1.2.3', 1) is None
+    assert [cache.get('1.2.3', index)[0, 0] for index in (0, 2, 3)] == [0, 2, 3]
+    assert cache.hits == {'memory': 4, 'disk': 0, 'miss': 1}
+
+def test_frames_persist_across_caches(tmp_path):
+    directory = str(tmp_path / 'frames')
+    FrameCache(directory=directory).put('1.2.3', 4, frame(7), variant='jpeg')
+
+    cache = FrameCache(directory=directory)
+    cached = cache.get('1.2.3', 4, variant='jpeg')
+    assert isinstance(cached, np.memmap) and not cached.flags.writeable
+    np.testing.assert_array_equal(cached, frame(7))
+    assert cache.get('1.2.3', 4) is None
+    assert cache.get('1.2.3', 4, variant='jpeg') is cached
+    assert cache.hits == {'memory': 1, 'disk': 1, 'miss': 1}
+
+def test_frames_not_persisted_stay_in_memory(tmp_path):
+    directory = str(tmp_path / 'frames')
+    FrameCache(directory=directory).put('1.2.3', 0, frame(1), persist=False)
+    assert not os.path.exists(directory)
+
+def test_keys_that_are_not_uids_are_hashed(tmp_path):
+    directory = tmp_path / 'frames'
+    cache = FrameCache(memory_bytes=0, directory=str(directory))
+    cache.put('../outside', 0, frame(1))
+    [folder] = os.listdir(directory)
+    assert len(folder) == 40
+    assert not (tmp_path / 'outside').exists()
+    np.testing.assert_array_equal(cache.get('../outside', 0), frame(1))
+
+def test_disk_level_is_trimmed_oldest_first(tmp_path):
+    directory = str(tmp_path / 'frames')
+    probe = FrameCache(memory_bytes=0, directory=str(tmp_path / 'probe'))
+    probe.put('1', 0, frame(0))
+    file_size = os.path.getsize(os.path.join(str(tmp_path / 'probe'), '1', '0.npy'))
+
+    cache = FrameCache(memory_bytes=0, directory=directory, disk_bytes=int(file_size * 3.5))
+    for index in range(3):
+        cache.put('1.2.3', index, frame(index))
+        path = os.path.join(directory, '1.2.3', f'{index}.npy')
+        os.utime(path, (1000 + index, 1000 + index))
+    cache.put('1.2.3', 3, frame(3))
+
+    # Four files exceed the cap; trimming to 90% of it removes the oldest
+    assert sorted(os.listdir(os.path.join(directory, '1.2.3'))) == ['1.npy', '2.npy', '3.npy']
+    assert cache.get('1.2.3', 0) is None
@@ -0,0 +1,81 @@
+import shutil
+
+import pytest
+from pydicom.dataset import Dataset
+
+from dicom_catalog import SeriesCatalog, slice_position
+from dicom_synthetic import make_series
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = SeriesCatalog(str(tmp_path / 'catalog.sqlite'))
+    yield catalog
+    catalog.close()
+
+def test_slice_position_follows_the_slice_normal():
+    ds = Dataset()
+    ds.ImagePositionPatient = [12.5, -3.0, 40.0]
+    assert slice_position(ds) == 40.0
+    # Sagittal: rows along y, columns along -z, so the normal is -x
+    ds.ImageOrientationPatient = [0.0, 1.0, 0.0, 0.0, 0.0, -1.0]
+    assert slice_position(ds) == -12.5
+    assert slice_position(Dataset()) is None
+
+def test_instances_are_in_slice_order(catalog, tmp_path):
+    folder = str(tmp_path / 'series')
+    paths = make_series(folder, files=12, rows=4, cols=4)
+    # File names do not follow slice order
+    assert sorted(paths) != paths
+
+    stats = catalog.scan(folder)
+    assert (stats.files, stats.parsed, stats.errors) == (12, 12, 0)
+    [info] = catalog.series(folder)
+    assert info.instances == 12
+    assert catalog.instances(info.series_uid, folder) == paths
+    assert catalog.instance_frames(info.series_uid, folder) == [(path, 1) for path in paths]
+
+    assert catalog.scan(folder).unchanged == 12
+
+def test_instances_are_limited_to_root(catalog, tmp_path):
+    folder = str(tmp_path / 'series')
+    make_series(folder, files=3, rows=4, cols=4)
+    copy = shutil.copytree(folder, str(tmp_path / 'copy'))
+    catalog.scan(folder)
+    catalog.scan(copy)
+    [info] = catalog.series(folder)
+
+    assert len(catalog.instances(info.series_uid)) == 6
+    scoped = catalog.instances(info.series_uid, copy)
+    assert len(scoped) == 3
+    assert all(path.startswith(copy) for path in scoped)
+
+def test_stopped_scan_keeps_committed_batches(catalog, tmp_path, monkeypatch):
+    monkeypatch.setattr('dicom_catalog.COMMIT_BATCH', 4)
+    folder = str(tmp_path / 'series')
+    make_series(folder, files=12, rows=4, cols=4)
+
+    def stop(done, total):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        catalog.scan(folder, progress=stop)
+    [info] = catalog.series(folder)
+    assert info.instances == 4
+
+    stats = catalog.scan(folder)
+    assert (stats.parsed, stats.unchanged) == (8, 4)
+
+def test_cancelled_scan_thread_reports_cancelled(tmp_path, monkeypatch):
+    from dicom_loader import SeriesScanThread
+
+    monkeypatch.setattr('dicom_catalog.DEFAULT_CATALOG', str(tmp_path / 'catalog.sqlite'))
+    folder = str(tmp_path / 'series')
+    make_series(folder, files=3, rows=4, cols=4)
+    thread = SeriesScanThread(folder)
+    events = []
+    thread.scanned.connect(lambda stats, series: events.append('scanned'))
+    thread.cancelled.connect(lambda: events.append('cancelled'))
+
+    thread.cancel()
+    thread.run()
+    assert events == ['cancelled']
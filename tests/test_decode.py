@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from dicom_cache import FrameCache
+from dicom_frames import FrameAccessor, decode_frames, iter_frames
+from dicom_synthetic import make_jpeg2000_multiframe
+
+FRAMES = 8
+
+@pytest.fixture(scope='module')
+def path(tmp_path_factory):
+    return make_jpeg2000_multiframe(str(tmp_path_factory.mktemp('decode') / 'j2k.dcm'),
+                                    frames=FRAMES, rows=24, cols=32)
+
+@pytest.fixture
+def frames(path, tmp_path):
+    frames = FrameAccessor(path, FrameCache(memory_bytes=0, directory=str(tmp_path / 'frames')))
+    yield frames
+    frames.close()
+
+@pytest.fixture(scope='module')
+def serial(path):
+    frames = FrameAccessor(path, FrameCache(memory_bytes=0, directory=None))
+    try:
+        return decode_frames(frames, workers=1)
+    finally:
+        frames.close()
+
+@pytest.mark.parametrize('pool', ['thread', 'process'])
+def test_parallel_decode_matches_serial(frames, serial, pool):
+    calls = []
+    decoded = decode_frames(frames, workers=3, pool=pool,
+                            progress=lambda done, total: calls.append((done, total)))
+    assert decoded.shape == (FRAMES, 24, 32)
+    np.testing.assert_array_equal(decoded, serial)
+    assert calls == [(done, FRAMES) for done in range(1, FRAMES + 1)]
+
+@pytest.mark.parametrize('pool', ['thread', 'process'])
+def test_frames_are_yielded_in_the_order_asked(frames, serial, pool):
+    indices = [5, 0, 7, 2, 2]
+    yielded = list(iter_frames(frames, indices, workers=2, pool=pool))
+    assert [index for index, _ in yielded] == indices
+    for index, frame in yielded:
+        np.testing.assert_array_equal(frame, serial[index])
+
+def test_decode_fills_the_given_array(frames, serial):
+    out = np.zeros((3, 24, 32), dtype=serial.dtype)
+    assert decode_frames(frames, [6, 1, 4], out=out, workers=2) is out
+    np.testing.assert_array_equal(out, serial[[6, 1, 4]])
+
+def test_closing_early_stops_decoding(frames):
+    decoded = iter_frames(frames, workers=2, pool='thread')
+    assert next(decoded)[0] == 0
+    decoded.close()
+    # At most the frames in flight (two tasks per worker) were decoded
+    assert frames.frame_cache.hits['miss'] <= 1 + 2 * 2
@@ -0,0 +1,177 @@
+import json
+import os
+
+import pydicom
+import pytest
+from pydicom.dataset import Dataset
+from pydicom.uid import CTImageStorage, generate_uid
+
+from dicom_batch import batch_deidentify
+from dicom_deid import DEFAULT_PROFILE, DeidProfile, MappingStore, deidentify_dataset
+from dicom_synthetic import _save, make_series, make_single_frame
+
+def test_remap_is_idempotent(tmp_path):
+    path = str(tmp_path / 'map.sqlite')
+    uids = [generate_uid() for _ in range(3)]
+    store = MappingStore(path)
+    try:
+        first = store.remap(uids)
+        assert set(first) == set(uids)
+        assert len(set(first.values())) == len(uids)
+        assert not set(first.values()) & set(uids)
+        assert store.remap(uids[1:] + [uids[0]]) == first
+    finally:
+        store.close()
+
+    # Another store on the same file (another worker or a later run) sees the same replacements
+    store = MappingStore(path)
+    try:
+        assert store.remap(uids) == first
+    finally:
+        store.close()
+
+def test_date_shift_is_kept_per_patient(tmp_path):
+    path = str(tmp_path / 'map.sqlite')
+    store = MappingStore(path)
+    try:
+        days = store.date_shift('|SYN0001')
+        assert days < 0
+        assert store.date_shift('|SYN0001') == days
+    finally:
+        store.close()
+    store = MappingStore(path)
+    try:
+        assert store.date_shift('|SYN0001') == days
+    finally:
+        store.close()
+
+@pytest.fixture
+def profile():
+    return DeidProfile('test', {
+        'PatientName': ['replace', '{prefix}_Anonymous'],
+        'InstitutionName': 'remove',
+        'AccessionNumber': 'empty',
+        'StudyDate': 'shift',
+        'AcquisitionDateTime': 'shift',
+        'StudyInstanceUID': 'uid',
+        'PatientSex': 'keep',
+    }, date_shift_days=-10, remap_uids=False)
+
+def _dataset():
+    ds = Dataset()
+    ds.PatientName = 'Doe^Jane'
+    ds.PatientSex = 'F'
+    ds.InstitutionName = 'General Hospital'
+    ds.AccessionNumber = 'ACC42'
+    ds.StudyDate = '20240105'
+    ds.AcquisitionDateTime = '20240105120000'
+    ds.StudyInstanceUID = generate_uid()
+    ds.FrameOfReferenceUID = generate_uid()
+    ds.SOPClassUID = CTImageStorage
+    ds.add_new(0x00091010, 'LO', 'private')
+    item = Dataset()
+    item.InstitutionName = 'Referring Hospital'
+    item.StudyDate = '20231231'
+    item.add_new(0x00111010, 'LO', 'nested private')
+    ds.ReferencedStudySequence = [item]
+    return ds
+
+def test_compiled_profile_applies_each_action(profile, tmp_path):
+    ds = _dataset()
+    original_uid, frame_of_reference = ds.StudyInstanceUID, ds.FrameOfReferenceUID
+    store = MappingStore(str(tmp_path / 'map.sqlite'))
+    try:
+        profile.compiled().apply(ds, store, prefix='TEST')
+    finally:
+        store.close()
+
+    assert str(ds.PatientName) == 'TEST_Anonymous'
+    assert ds.PatientSex == 'F'
+    assert 'InstitutionName' not in ds
+    assert ds.AccessionNumber == ''
+    assert ds.StudyDate == '20231226'
+    assert ds.AcquisitionDateTime == '20231226120000'
+    assert ds.StudyInstanceUID != original_uid
+    # Only listed UIDs are remapped when remap_uids is off
+    assert ds.FrameOfReferenceUID == frame_of_reference
+    assert 0x00091010 not in ds
+
+    # Rules and private removal reach into sequence items
+    [item] = ds.ReferencedStudySequence
+    assert 'InstitutionName' not in item
+    assert item.StudyDate == '20231221'
+    assert 0x00111010 not in item
+
+def test_remap_uids_keeps_registered_uids(tmp_path):
+    ds = _dataset()
+    frame_of_reference = ds.FrameOfReferenceUID
+    store = MappingStore(str(tmp_path / 'map.sqlite'))
+    try:
+        DeidProfile('uids', {}, date_shift_days=0).compiled().apply(ds, store)
+    finally:
+        store.close()
+    assert ds.FrameOfReferenceUID != frame_of_reference
+    assert ds.SOPClassUID == CTImageStorage
+
+def test_private_tags_can_be_kept():
+    kept = DeidProfile('keep', {'InstitutionName': 'remove'}, remove_private=False,
+                       date_shift_days=0, remap_uids=False)
+    ds = kept.compiled().apply(_dataset())
+    assert ds[0x00091010].value == 'private'
+    assert ds.ReferencedStudySequence[0][0x00111010].value == 'nested private'
+    assert 'InstitutionName' not in ds.ReferencedStudySequence[0]
+
+def test_profiles_round_trip_through_json(profile, tmp_path):
+    path = tmp_path / 'profile.json'
+    path.write_text(json.dumps(profile.to_dict()))
+    loaded = DeidProfile.load(str(path))
+    assert loaded.to_dict() == profile.to_dict()
+
+    with pytest.raises(ValueError):
+        DeidProfile('bad', {'PatientName': 'scramble'})
+    with pytest.raises(ValueError):
+        DeidProfile('bad', {'NotAKeyword': 'remove'})
+
+def test_files_of_a_study_share_new_uids(tmp_path):
+    paths = make_series(str(tmp_path / 'series'), files=2, rows=4, cols=4)
+    originals = [pydicom.dcmread(path, stop_before_pixels=True) for path in paths]
+    store = MappingStore(str(tmp_path / 'map.sqlite'))
+    try:
+        exported = [deidentify_dataset(pydicom.dcmread(path, stop_before_pixels=True), DEFAULT_PROFILE,
+                                       store, 'TEST') for path in paths]
+    finally:
+        store.close()
+
+    first, second = exported
+    assert first.StudyInstanceUID == second.StudyInstanceUID != originals[0].StudyInstanceUID
+    assert first.SeriesInstanceUID == second.SeriesInstanceUID != originals[0].SeriesInstanceUID
+    assert first.SOPInstanceUID != second.SOPInstanceUID
+    assert first.file_meta.MediaStorageSOPInstanceUID == first.SOPInstanceUID
+    # Registered UIDs such as the SOP Class are not remapped
+    assert first.SOPClassUID == originals[0].SOPClassUID
+    assert str(first.PatientName) == 'TEST_Anonymous'
+    assert first.PatientIdentityRemoved == 'YES'
+
+def test_batch_deidentifies_elements_after_pixel_data(tmp_path):
+    (tmp_path / 'in').mkdir()
+    source = make_single_frame(str(tmp_path / 'in' / 'a.dcm'), rows=4, cols=4)
+    ds = pydicom.dcmread(source)
+    ds.add_new(0x7FE10010, 'LO', 'ACME')
+    ds.add_new(0x7FE11001, 'LO', 'private note')
+    item = pydicom.Dataset()
+    item.InstitutionName = 'Trailing Hospital'
+    ds.add_new(0x7FE11002, 'SQ', [item])
+    _save(ds, source)
+
+    output = tmp_path / 'out'
+    stats = batch_deidentify(str(tmp_path / 'in'), 'TEST', str(output),
+                             store_path=str(tmp_path / 'map.sqlite'), workers=1)
+    assert stats.done == 1 and stats.failed == 0
+
+    [written] = [os.path.join(folder, name) for folder, _, names in os.walk(output) for name in names]
+    with open(written, 'rb') as f:
+        content = f.read()
+    assert b'private note' not in content and b'Trailing Hospital' not in content
+    deidentified = pydicom.dcmread(written)
+    assert not any(tag.group == 0x7FE1 for tag in deidentified.keys())
+    assert deidentified.PixelData == ds.PixelData
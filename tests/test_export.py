@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pydicom
+import pytest
+from PIL import Image
+
+from dicom_export import export_frames, main, make_windower
+from dicom_frames import open_frames
+from dicom_synthetic import make_jpeg2000_multiframe, make_multiframe, make_series
+
+@pytest.fixture(params=['native', 'jpeg2000'])
+def source(request, tmp_path):
+    path = str(tmp_path / 'cine.dcm')
+    if request.param == 'native':
+        return make_multiframe(path, frames=5, rows=12, cols=16)
+    return make_jpeg2000_multiframe(path, frames=5, rows=12, cols=16)
+
+@pytest.fixture
+def opened(source):
+    ds = pydicom.dcmread(source)
+    frames = open_frames(ds)
+    yield frames, ds
+    frames.close()
+
+@pytest.mark.parametrize('fmt', ['npy', 'npz'])
+def test_arrays_keep_the_stored_values(opened, tmp_path, fmt):
+    frames, ds = opened
+    output = str(tmp_path / f'out.{fmt}')
+    stats = export_frames(frames, ds, output, fmt, workers=2)
+    assert (stats.frames, stats.total) == (5, 5)
+
+    exported = np.load(output)
+    if fmt == 'npz':
+        exported = exported['pixels']
+    np.testing.assert_array_equal(exported, ds.pixel_array)
+    assert not os.path.exists(output + '.partial')
+
+def test_png_frames_are_windowed(opened, tmp_path):
+    frames, ds = opened
+    output = tmp_path / 'png'
+    stats = export_frames(frames, ds, str(output), 'png', indices=[1, 3], encoders=2)
+    assert stats.frames == 2
+    assert sorted(os.listdir(output)) == ['0002.png', '0004.png']
+    # Without a window in the header, the first exported frame sets it
+    window = make_windower(ds, ds.pixel_array[1])
+    np.testing.assert_array_equal(np.asarray(Image.open(output / '0004.png')),
+                                  window(ds.pixel_array[3]))
+
+def test_raw_frames_are_back_to_back(opened, tmp_path):
+    frames, ds = opened
+    output = str(tmp_path / 'out.raw')
+    export_frames(frames, ds, output, 'raw', center=2048, width=1024)
+    expected = make_windower(ds, ds.pixel_array[0], 2048, 1024)
+    with open(output, 'rb') as f:
+        data = np.frombuffer(f.read(), dtype=np.uint8).reshape(5, 12, 16)
+    np.testing.assert_array_equal(data, np.stack([expected(frame) for frame in ds.pixel_array]))
+
+def test_stopped_export_leaves_no_file(opened, tmp_path):
+    frames, ds = opened
+    output = str(tmp_path / 'out.npy')
+
+    def stop(done, total):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        export_frames(frames, ds, output, 'npy', progress=stop)
+    assert os.listdir(tmp_path) == ['cine.dcm']
+
+def test_png_needs_windowed_frames(opened, tmp_path):
+    frames, ds = opened
+    with pytest.raises(ValueError):
+        export_frames(frames, ds, str(tmp_path / 'png'), 'png', windowed=False)
+
+def test_folder_exports_each_series_in_slice_order(tmp_path):
+    paths = make_series(str(tmp_path / 'in' / 'series'), files=4, rows=6, cols=8)
+    output = tmp_path / 'out'
+    assert main([str(tmp_path / 'in'), '--format', 'npy', '--output', str(output),
+                 '--catalog', str(tmp_path / 'catalog.sqlite'), '--quiet']) == 0
+
+    [name] = os.listdir(output)
+    assert name.startswith('CT_1_') and name.endswith('.npy')
+    expected = np.stack([pydicom.dcmread(path).pixel_array for path in paths])
+    np.testing.assert_array_equal(np.load(output / name), expected)
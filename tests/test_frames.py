@@ -0,0 +1,77 @@
+import numpy as np
+import pydicom
+import pytest
+from pydicom.encaps import encapsulate, encapsulate_extended
+
+from dicom_cache import FrameCache
+from dicom_frames import LEGACY_PYDICOM, FrameAccessor
+from dicom_synthetic import _save, make_jpeg2000_multiframe, make_multiframe
+
+FRAMES = 4
+
+def _accessor(path):
+    # No disk cache, so every frame comes from the file
+    return FrameAccessor(path, FrameCache(memory_bytes=0, directory=None))
+
+def _encoded_frames(ds):
+    if LEGACY_PYDICOM:
+        from pydicom.encaps import generate_pixel_data_frame
+        return list(generate_pixel_data_frame(ds.PixelData, FRAMES))
+    from pydicom.encaps import generate_frames
+    return list(generate_frames(ds.PixelData, number_of_frames=FRAMES))
+
+@pytest.fixture(scope='module')
+def jpeg2000(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('frames') / 'j2k.dcm')
+    return make_jpeg2000_multiframe(path, frames=FRAMES, rows=24, cols=32)
+
+def _rewrite(ds, path, pixel_data, extended=None):
+    """Writes ds with new encapsulated Pixel Data (and an Extended Offset Table) to path."""
+    ds.PixelData = pixel_data
+    ds['PixelData'].is_undefined_length = True
+    ds['PixelData'].VR = 'OB'
+    if extended is not None:
+        ds.ExtendedOffsetTable, ds.ExtendedOffsetTableLengths = extended
+    return _save(ds, path)
+
+def _layouts(ds):
+    frames = _encoded_frames(ds)
+    pixel_data, offsets, lengths = encapsulate_extended(frames)
+    return {
+        'basic_offset_table': (encapsulate(frames, fragments_per_frame=3, has_bot=True), None),
+        'extended_offset_table': (pixel_data, (offsets, lengths)),
+        'one_fragment_per_frame': (encapsulate(frames, has_bot=False), None),
+        'codestream_starts': (encapsulate(frames, fragments_per_frame=3, has_bot=False), None),
+    }
+
+@pytest.mark.parametrize('layout', ['basic_offset_table', 'extended_offset_table',
+                                    'one_fragment_per_frame', 'codestream_starts'])
+def test_encapsulated_frames_are_located(jpeg2000, tmp_path, layout):
+    original = pydicom.dcmread(jpeg2000)
+    expected, encoded = original.pixel_array, _encoded_frames(original)
+    pixel_data, extended = _layouts(original)[layout]
+    path = _rewrite(pydicom.dcmread(jpeg2000), str(tmp_path / f"{layout}.dcm"), pixel_data, extended)
+    frames = _accessor(path)
+    try:
+        assert frames.encapsulated
+        assert len(frames) == FRAMES
+        assert frames.frame_bytes(2) == encoded[2]
+        # Out of order, so no frame is found by walking from the previous one
+        for index in (3, 0, 2, 1, -1):
+            np.testing.assert_array_equal(frames.frame(index), expected[index])
+    finally:
+        frames.close()
+
+def test_native_frames_are_mapped(tmp_path):
+    path = make_multiframe(str(tmp_path / 'native.dcm'), frames=FRAMES, rows=8, cols=12)
+    expected = pydicom.dcmread(path).pixel_array
+    frames = _accessor(path)
+    try:
+        assert not frames.encapsulated
+        assert frames.shape == (FRAMES, 8, 12)
+        for index in range(FRAMES):
+            np.testing.assert_array_equal(frames.frame(index), expected[index])
+        with pytest.raises(IndexError):
+            frames.frame(FRAMES)
+    finally:
+        frames.close()
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from pydicom.dataset import Dataset
+
+from dicom_lut import WindowedFrames, WindowLevelLUT, voi_linear
+
+def _ct(photometric='MONOCHROME2'):
+    ds = Dataset()
+    ds.RescaleSlope = 2
+    ds.RescaleIntercept = -1024
+    ds.WindowCenter = [40, 400]
+    ds.WindowWidth = [400, 2000]
+    ds.PhotometricInterpretation = photometric
+    return ds
+
+def test_voi_linear_follows_the_standard():
+    # PS3.3 C.11.2.1.2: below c - 0.5 - (w - 1) / 2 is black, above c - 0.5 + (w - 1) / 2 white
+    values = np.array([-200.0, -159.5, 39.5, 239.0, 240.0, 1000.0])
+    assert voi_linear(values, 40, 400).tolist() == [0, 0, 127, 255, 255, 255]
+
+@pytest.mark.parametrize('dtype', [np.uint16, np.int16, np.uint8])
+def test_table_matches_float_path(dtype):
+    info = np.iinfo(dtype)
+    frame = np.random.default_rng(0).integers(info.min, info.max, size=(32, 32), endpoint=True).astype(dtype)
+    lut = WindowLevelLUT(_ct(), dtype)
+    assert lut.uses_table
+    assert (lut.center, lut.width) == (40.0, 400.0)
+
+    expected = voi_linear(frame.astype(np.float32) * 2 - 1024, 40, 400)
+    np.testing.assert_array_equal(lut.apply(frame), expected)
+    # Big endian frames look up the same table
+    np.testing.assert_array_equal(lut.apply(frame.astype(frame.dtype.newbyteorder('>'))), expected)
+
+def test_monochrome1_is_inverted():
+    frame = np.arange(0, 4096, 16, dtype=np.uint16).reshape(16, 16)
+    normal = WindowLevelLUT(_ct(), np.uint16).apply(frame)
+    inverted = WindowLevelLUT(_ct('MONOCHROME1'), np.uint16).apply(frame)
+    np.testing.assert_array_equal(inverted, 255 - normal)
+
+def test_wide_data_uses_float_math():
+    frame = np.array([[0, 600, 1 << 20]], dtype=np.uint32)
+    lut = WindowLevelLUT(_ct(), np.uint32)
+    assert not lut.uses_table
+    np.testing.assert_array_equal(lut.apply(frame), voi_linear(frame * 2.0 - 1024, 40, 400))
+
+def test_auto_window_without_voi_module():
+    frame = np.array([[100, 200], [300, 500]], dtype=np.uint16)
+    output = WindowLevelLUT(None, np.uint16).apply(frame)
+    assert output.min() == 0 and output.max() == 255
+
+def test_windowed_frames_cache_per_window():
+    frames = np.random.default_rng(1).integers(0, 4096, size=(3, 8, 8), dtype=np.uint16)
+
+    class Frames:
+        def __len__(self):
+            return len(frames)
+
+        def __getitem__(self, index):
+            return frames[index]
+
+        def frame(self, index):
+            return frames[index]
+
+    windowed = WindowedFrames(Frames(), _ct(), cache_bytes=2 * 64)
+    first = windowed.frame(0)
+    assert windowed.frame(0) is first
+    windowed.set_window(100, 50)
+    assert windowed.window == (100.0, 50.0)
+    np.testing.assert_array_equal(windowed.frame(0), voi_linear(frames[0] * 2.0 - 1024, 100, 50))
+    windowed.frame(1)
+    # Two 64-byte frames fit; the first window's output was evicted
+    assert (0, 40.0, 400.0) not in windowed._cache
+    assert windowed._cached_bytes <= 2 * 64
@@ -0,0 +1,59 @@
+import numpy as np
+import pydicom
+import pytest
+
+from dicom_frames import open_frames
+from dicom_mosaic import ThumbnailMosaic, block_mean
+from dicom_synthetic import make_multiframe
+from dicom_volume import Volume
+
+def test_block_mean_drops_partial_blocks():
+    frame = np.arange(5 * 7, dtype=np.uint16).reshape(5, 7)
+    reduced = block_mean(frame, 2)
+    assert reduced.shape == (2, 3)
+    assert reduced[0, 0] == frame[:2, :2].mean()
+    assert reduced[1, 2] == frame[2:4, 4:6].mean()
+    assert block_mean(frame, 1) is frame
+
+def test_pages_tile_thumbnails_and_blank_the_rest():
+    # Every slice is flat at its own index, so each tile shows which slice it holds
+    array = np.repeat(np.arange(1, 6, dtype=np.uint16), 64).reshape(5, 8, 8)
+    mosaic = ThumbnailMosaic(Volume(array, (1.0, 1.0, 1.0)), columns=2, rows=2, tile=4,
+                             cache_dir=None)
+    mosaic.set_window(3, 4)
+    assert mosaic.factor == 2 and mosaic.tile_shape == (4, 4)
+    assert mosaic.pages == 2
+
+    first = mosaic.page(0)
+    assert first.shape == (8, 8)
+    tiles = [first[y:y + 4, x:x + 4] for x, y in map(mosaic.tile_origin, range(4))]
+    expected = mosaic.lut.apply(np.arange(1, 5, dtype=np.uint16))
+    for tile, value in zip(tiles, expected):
+        assert (tile == value).all()
+
+    last = mosaic.page(1)
+    assert (last[:4, :4] == mosaic.lut.apply(np.array([5], dtype=np.uint16))[0]).all()
+    assert (last[:4, 4:] == 0).all() and (last[4:] == 0).all()
+
+@pytest.fixture
+def frames(tmp_path):
+    ds = pydicom.dcmread(make_multiframe(str(tmp_path / 'cine.dcm'), frames=6, rows=16, cols=16))
+    frames = open_frames(ds)
+    yield frames
+    frames.close()
+
+def test_prefetched_thumbnails_persist_in_the_cache(frames, tmp_path):
+    cache_dir = str(tmp_path / 'thumbnails')
+    mosaic = ThumbnailMosaic(frames, columns=2, rows=2, tile=8, cache_dir=cache_dir)
+    assert not mosaic.done.any()
+    mosaic.prefetch(first_page=1)
+    mosaic._prefetch_thread.join()
+    mosaic.close()
+    assert mosaic.done.all()
+    expected = [block_mean(frames.frame(index), 2) for index in range(6)]
+
+    reopened = ThumbnailMosaic(frames, columns=2, rows=2, tile=8, cache_dir=cache_dir)
+    assert reopened.done.all()
+    for index in range(6):
+        np.testing.assert_array_equal(reopened.thumbnails[index], np.rint(expected[index]))
+    reopened.close()
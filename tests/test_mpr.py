@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from dicom_volume import Volume
+
+@pytest.fixture
+def volume():
+    array = np.arange(4 * 5 * 6, dtype=np.int16).reshape(4, 5, 6)
+    return Volume(array, (2.0, 0.5, 1.0))
+
+def test_planes_are_views_with_the_last_slice_on_top(volume):
+    for axis, index in ((0, 1), (1, 2), (2, 3)):
+        assert np.shares_memory(volume.plane(axis, index), volume.array)
+    np.testing.assert_array_equal(volume.plane(0, 1), volume.array[1])
+    np.testing.assert_array_equal(volume.plane(1, 2)[0], volume.array[3, 2])
+    np.testing.assert_array_equal(volume.plane(2, 3)[:, 0], volume.array[::-1, 0, 3])
+    assert volume.plane(1, 2).shape == (4, 6)
+    assert volume.plane(2, 3).shape == (4, 5)
+
+def test_plane_aspect_follows_the_spacing(volume):
+    assert volume.plane_aspect(0) == 0.5
+    assert volume.plane_aspect(1) == 2.0
+    assert volume.plane_aspect(2) == 4.0
+
+@pytest.fixture
+def window(qapp, volume):
+    from dicom_mpr import MPRViewerWindow
+
+    window = MPRViewerWindow(volume)
+    window.refreshed = []
+    refresh = window.refresh_plane
+
+    def record(axis):
+        window.refreshed.append(axis)
+        refresh(axis)
+
+    window.refresh_plane = record
+    yield window
+    window.close()
+
+def test_only_changed_planes_are_rendered(window):
+    assert window.position == [2, 2, 3]
+    window.set_position(2, 4, 3)
+    assert window.refreshed == [1]
+    window.step(0, 1)
+    assert window.refreshed == [1, 0]
+    window.set_position(*window.position)
+    assert window.refreshed == [1, 0]
+
+def test_position_is_clamped_to_the_volume(window):
+    window.set_position(-3, 99, 99)
+    assert window.position == [0, 4, 5]
+
+def test_picking_maps_view_coordinates_to_voxels(window):
+    # Coronal and sagittal views show the last slice at the top
+    window.on_position_picked(1, 5, 0)
+    assert window.position == [3, 2, 5]
+    window.on_position_picked(2, 1, 3)
+    assert window.position == [0, 1, 5]
+    window.on_position_picked(0, 4, 3)
+    assert window.position == [0, 3, 4]
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from PyQt5.QtCore import QCoreApplication
+
+from dicom_playback import PlaybackEngine
+
+class GatedFrames:
+    """Frames that decode at once, except those held until released."""
+
+    def __init__(self, count, held=()):
+        self.count = count
+        self.gates = {index: threading.Event() for index in held}
+
+    def __len__(self):
+        return self.count
+
+    def frame(self, index):
+        if index in self.gates:
+            self.gates[index].wait(10)
+        return np.full((2, 2), index)
+
+    def release(self, index=None):
+        for key, gate in self.gates.items():
+            if index is None or key == index:
+                gate.set()
+
+@pytest.fixture
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+def _set_clock(engine, target):
+    """Puts the wall clock halfway through frame target (the engine runs at 1 fps)."""
+    engine._clock_frame = 0
+    engine._clock_start = time.perf_counter() - target - 0.5
+
+def _wait(futures):
+    for future in futures:
+        future.result(10)
+
+def test_frames_not_ready_in_time_are_dropped(app):
+    engine = PlaybackEngine(GatedFrames(20), fps=1, prefetch=4, workers=2)
+    shown = []
+    engine.frame_ready.connect(lambda index, frame: shown.append((index, int(frame[0, 0]))))
+    try:
+        engine.play()
+        _wait([engine._pending[index] for index in (1, 2, 3)])
+        _set_clock(engine, 3)
+        engine._tick()
+        assert shown == [(3, 3)]
+        assert engine.current == 3
+        assert engine.dropped_frames == 2
+        # Frames behind the playhead leave the ring; the window ahead is queued
+        assert set(engine._pending) == {3, 4, 5, 6, 7}
+    finally:
+        engine.close()
+
+def test_prefetch_around_the_clock_survives_a_shown_frame(app):
+    frames = GatedFrames(20, held=[4, 5, 6, 7, 12, 13, 14, 15])
+    engine = PlaybackEngine(frames, fps=1, prefetch=4, workers=8)
+    try:
+        engine.play()
+        _wait([engine._pending[index] for index in (1, 2, 3)])
+        _set_clock(engine, 3)
+        engine._tick()
+        assert engine.current == 3
+
+        # Far behind the clock: nothing new is ready, decoding moves to frames 12-15
+        _set_clock(engine, 12)
+        engine._tick()
+        queued = {index: engine._pending[index] for index in (12, 13, 14, 15)}
+
+        # Frame 6 finishing is shown; the decodes queued around the clock are kept
+        frames.release(6)
+        _wait([engine._pending[6]])
+        engine._tick()
+        assert engine.current == 6
+        assert {index: engine._pending[index] for index in (12, 13, 14, 15)} == queued
+        assert not any(future.cancelled() for future in queued.values())
+    finally:
+        frames.release()
+        engine.close()
@@ -0,0 +1,66 @@
+import shutil
+
+import numpy as np
+import pydicom
+import pytest
+
+from dicom_redact import RedactionRule, redact_array, redact_file, regions_for
+from dicom_synthetic import _save, make_jpeg2000_multiframe, make_multiframe
+
+BANNER = (2, 0, 10, 3)
+
+def _banner_blanked(before, after, fill=0):
+    """Checks the BANNER rows are fill on every frame and every other pixel is unchanged."""
+    x, y, width, height = BANNER
+    assert (after[:, y:y + height, x:x + width] == fill).all()
+    mask = np.ones(after.shape[1:], dtype=bool)
+    mask[y:y + height, x:x + width] = False
+    np.testing.assert_array_equal(after[:, mask], before[:, mask])
+
+def test_rules_match_on_device_and_size():
+    ds = pydicom.Dataset()
+    ds.Modality = 'US'
+    ds.Manufacturer = 'ACME Medical'
+    ds.Rows, ds.Columns = 16, 24
+    rules = [RedactionRule([BANNER], modality='us', manufacturer='acme'),
+             RedactionRule([(0, 0, 1, 1)], modality='CT'),
+             RedactionRule([(0, 15, 24, 1)], rows=16, columns=24),
+             RedactionRule([(0, 0, 2, 2)], rows=512)]
+    assert regions_for(ds, rules) == [BANNER, (0, 15, 24, 1)]
+    assert RedactionRule.from_dict(rules[0].to_dict()).to_dict() == rules[0].to_dict()
+    with pytest.raises(ValueError):
+        RedactionRule([(0, 0, 0, 5)])
+
+def test_regions_are_clipped_to_the_image():
+    array = np.ones((2, 4, 4), dtype=np.uint8)
+    redact_array(array, [(-2, 2, 4, 10)])
+    assert (array[:, 2:, :2] == 0).all()
+    assert array.sum() == 2 * (16 - 4)
+
+def test_native_pixel_data_is_blanked_in_place(tmp_path):
+    path = make_multiframe(str(tmp_path / 'cine.dcm'), frames=3, rows=16, cols=24)
+    before = pydicom.dcmread(path).pixel_array
+    assert redact_file(path, [BANNER]) == 'in place'
+    _banner_blanked(before, pydicom.dcmread(path).pixel_array)
+
+def test_monochrome1_is_blanked_to_white_values(tmp_path):
+    path = make_multiframe(str(tmp_path / 'cine.dcm'), frames=2, rows=16, cols=24)
+    ds = pydicom.dcmread(path)
+    ds.PhotometricInterpretation = 'MONOCHROME1'
+    _save(ds, path)
+    before = ds.pixel_array
+    redact_file(path, [BANNER])
+    # BitsStored is 12, so 4095 is the stored value that displays as black
+    _banner_blanked(before, pydicom.dcmread(path).pixel_array, fill=4095)
+
+def test_compressed_pixel_data_is_rewritten_native(tmp_path):
+    path = make_jpeg2000_multiframe(str(tmp_path / 'j2k.dcm'), frames=3, rows=16, cols=24)
+    before = pydicom.dcmread(path).pixel_array
+    original = str(tmp_path / 'original.dcm')
+    shutil.copy(path, original)
+
+    assert redact_file(path, [BANNER]) == 'rewritten'
+    redacted = pydicom.dcmread(path)
+    assert redacted.file_meta.TransferSyntaxUID == pydicom.uid.ExplicitVRLittleEndian
+    assert redacted.SOPInstanceUID == pydicom.dcmread(original).SOPInstanceUID
+    _banner_blanked(before, redacted.pixel_array)
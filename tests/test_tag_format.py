@@ -0,0 +1,52 @@
+import pydicom
+import pytest
+from pydicom.dataset import Dataset
+
+from dicom_frames import FRAME_DEFER_SIZE
+from dicom_synthetic import _save, make_single_frame
+from dicom_tag_format import (DEFER_SIZE, MAX_VALUES, DeferredElement, format_value, full_value,
+                              is_deferred, iter_elements, raw_element)
+
+@pytest.fixture
+def path(tmp_path):
+    path = make_single_frame(str(tmp_path / 'large.dcm'), rows=4, cols=4)
+    ds = pydicom.dcmread(path)
+    ds.add_new(0x00090010, 'LO', 'ACME')
+    ds.add_new(0x00091001, 'OB', bytes(range(256)) * 800)
+    return _save(ds, path)
+
+def test_large_values_stay_on_disk(path):
+    ds = pydicom.dcmread(path, defer_size=DEFER_SIZE)
+    elements = {int(elem.tag): elem for elem in iter_elements(ds)}
+    blob = elements[0x00091001]
+    assert isinstance(blob, DeferredElement) and blob.VR == 'OB'
+    assert format_value(blob) == ("<200.0 KB, not loaded>", True)
+    assert is_deferred(raw_element(ds, 0x00091001))
+
+    # Small values are ordinary elements
+    assert not isinstance(elements[0x00100010], DeferredElement)
+    assert full_value(blob).startswith('00000000  00 01 02')
+    assert blob.loaded
+    assert len(full_value(blob).splitlines()) == 200 * 1024 // 16
+
+def test_frame_reads_defer_pixel_data(tmp_path):
+    path = make_single_frame(str(tmp_path / 'slice.dcm'), rows=32, cols=32)
+    ds = pydicom.dcmread(path, defer_size=FRAME_DEFER_SIZE)
+    assert is_deferred(raw_element(ds, 0x7FE00010))
+    assert not is_deferred(raw_element(ds, 0x00100010))
+
+def test_values_are_capped_by_vr():
+    ds = Dataset()
+    ds.StudyComments = 'x' * 300
+    ds.ImageType = [str(index) for index in range(MAX_VALUES + 4)]
+    ds.add_new(0x00091001, 'OB', bytes(64))
+    ds.SOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+
+    text, cut = format_value(ds['StudyComments'])
+    assert cut and text.endswith('... (300 characters)') and len(text) < 300
+    text, cut = format_value(ds['ImageType'])
+    assert cut and text.endswith(f'\\... ({MAX_VALUES + 4} values)')
+    text, cut = format_value(ds[0x00091001])
+    assert cut and text.startswith('64 bytes: 00 00')
+    assert format_value(ds['SOPClassUID']) == ('CT Image Storage', False)
+    assert full_value(ds['StudyComments']) == 'x' * 300
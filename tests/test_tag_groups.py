@@ -0,0 +1,68 @@
+import pytest
+from pydicom.datadict import tag_for_keyword
+from pydicom.dataset import Dataset
+
+from dicom_tag_groups import GROUPS, TagGroupIndex, keyword_groups, name_groups, tag_groups
+
+@pytest.mark.parametrize('keyword, groups', [
+    ('PatientBirthDate', ('Patient',)),
+    ('OperatorsName', ('Physician',)),
+    ('StudyInstanceUID', ('Study',)),
+    ('WindowCenter', ('Image',)),
+    ('Rows', ()),
+])
+def test_keyword_words_name_groups(keyword, groups):
+    assert keyword_groups(keyword) == groups
+
+@pytest.mark.parametrize('keyword, groups', [
+    # Dictionary groups 0018 and 0028
+    ('KVP', ('Modality',)),
+    ('Rows', ('Image',)),
+    # Module attributes whose keyword says nothing about their group
+    ('AccessionNumber', ('Study',)),
+    ('Manufacturer', ('Modality',)),
+    ('SOPInstanceUID', ('Image',)),
+    ('ReferringPhysicianName', ('Study', 'Physician')),
+])
+def test_dictionary_tags_are_classified(keyword, groups):
+    assert tag_groups()[tag_for_keyword(keyword)] == (groups, False)
+
+def test_private_names_are_classified():
+    assert name_groups('Original Patient ID') == ('Patient',)
+    assert name_groups('ACME scanner setting') == ()
+
+@pytest.fixture
+def ds():
+    ds = Dataset()
+    ds.PatientName = 'Doe^Jane'
+    ds.Rows = 16
+    ds.InstitutionName = 'General Hospital'
+    ds.add_new(0x60000051, 'US', 1)
+    item = Dataset()
+    item.AccessionNumber = 'ACC42'
+    item.RequestingPhysician = 'Smith^John'
+    ds.RequestAttributesSequence = [item]
+    ds.add_new(0x00210010, 'LO', 'BRIT Systems, Inc.')
+    ds.add_new(0x00211011, 'LO', 'PID-7')
+    ds.add_new(0x00211099, 'LO', 'unknown private')
+    return ds
+
+def _keywords(index, group):
+    return [elem.keyword or elem.name for elem in index.elements_for(group)]
+
+def test_index_lists_elements_by_group(ds):
+    index = TagGroupIndex(ds)
+    assert _keywords(index, 'Patient') == ['PatientName', '[Original Patient ID]']
+    # Repeating and private elements have no keyword, only a name
+    assert _keywords(index, 'Image') == ['Rows', 'Image Frame Origin']
+    assert _keywords(index, 'Modality') == []
+    assert index.elements_for('Unknown') == []
+
+def test_nested_elements_are_listed_once(ds):
+    index = TagGroupIndex(ds)
+    # AccessionNumber is shown inside its Study sequence; the physician is not Study, so it is listed
+    assert _keywords(index, 'Study') == ['RequestAttributesSequence']
+    assert _keywords(index, 'Physician') == ['InstitutionName', 'RequestingPhysician']
+    item = ds.RequestAttributesSequence[0]
+    assert index.owners_for('Physician') == [ds, item]
+    assert set(index.groups) == set(GROUPS)
@@ -0,0 +1,52 @@
+import pytest
+
+import dicom_tag_index
+from dicom_synthetic import make_header
+from dicom_tag_index import TagSearchIndex
+
+QUERIES = ['a', 'pa', 'uid', 'patient', 'synthetic^physician', 'private 1', '99syn', 'no such text']
+
+@pytest.fixture(scope='module')
+def index():
+    return TagSearchIndex(make_header(3000))
+
+def _oracle(index, query):
+    term = query.lower().encode('utf-8')
+    return [i for i, text in enumerate(index.texts) if term in text]
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_substring_matches_a_plain_scan(index, query):
+    assert index.search(query) == _oracle(index, query)
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_substring_without_trigram_candidates(index, query, monkeypatch):
+    # Every candidate set counts as too large, so terms go through the buffer scan
+    monkeypatch.setattr(dicom_tag_index, 'VERIFY_LIMIT', 0)
+    assert index.search(query) == _oracle(index, query)
+
+def test_typing_narrows_the_previous_matches(index):
+    for length in range(1, len('synthetic^physician') + 1):
+        query = 'synthetic^physician'[:length]
+        assert index.search(query) == _oracle(index, query)
+    assert index.search('') is None
+    assert index.search('   ') is None
+
+def test_nested_elements_are_indexed_with_their_item(index):
+    ids = index.search('performingphysicianname')
+    assert ids
+    for i in ids:
+        assert index.elements[i].keyword == 'PerformingPhysicianName'
+        assert index.elements[i] is index.owners[i]['PerformingPhysicianName']
+    assert index.owners_for(ids) == [index.owners[i] for i in ids]
+
+def test_tag_patterns_and_ranges(index):
+    private = [i for i, tag in enumerate(index.tags.tolist()) if tag >> 16 == 0x0009]
+    assert private
+    assert index.search('(0009,xxxx)') == private
+    assert index.search('0009,xxxx') == private
+    assert index.search('(0009,0000)-(0009,ffff)') == private
+    assert index.search('(0010,0010)') == [i for i, tag in enumerate(index.tags.tolist()) if tag == 0x00100010]
+
+def test_regex_anchors_at_each_entry(index):
+    assert index.search('re:^\\(0010,') == [i for i, tag in enumerate(index.tags.tolist()) if tag >> 16 == 0x0010]
+    assert index.search('re:[unclosed') == []
@@ -0,0 +1,77 @@
+import pytest
+from pydicom.dataset import Dataset
+
+from dicom_tag_format import full_value
+from dicom_tag_model import parse_value
+
+@pytest.fixture
+def ds():
+    ds = Dataset()
+    ds.PatientName = 'Synthetic^Patient'
+    ds.ImageType = ['ORIGINAL', 'PRIMARY', 'AXIAL']
+    ds.ImageOrientationPatient = [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
+    ds.PixelSpacing = [0.7, 0.7]
+    ds.Rows = 512
+    ds.StudyComments = 'first\\second'
+    return ds
+
+@pytest.mark.parametrize('keyword', ['PatientName', 'ImageType', 'ImageOrientationPatient',
+                                     'PixelSpacing', 'Rows', 'StudyComments'])
+def test_full_value_round_trips(ds, keyword):
+    # The editor is filled with full_value; committing it unchanged must parse back to the same value
+    elem = ds[keyword]
+    value = parse_value(elem, full_value(elem))
+    if elem.VM > 1:
+        assert [str(item) for item in value] == [str(item) for item in elem.value]
+    else:
+        assert str(value) == str(elem.value)
+
+def test_multiple_values_are_split_on_backslashes(ds):
+    assert parse_value(ds['ImageType'], 'DERIVED\\SECONDARY') == ['DERIVED', 'SECONDARY']
+    assert parse_value(ds['PixelSpacing'], '0,5\\0.5') == [0.5, 0.5]
+    assert parse_value(ds['Rows'], ' 256 ') == 256
+    assert parse_value(ds['PatientName'], '"Doe^Jane"') == 'Doe^Jane'
+    # Text VRs hold one value that may contain backslashes
+    assert parse_value(ds['StudyComments'], 'a\\b') == 'a\\b'
+
+@pytest.mark.parametrize('keyword, text', [('Rows', 'abc'), ('PixelSpacing', '0.7\\x'),
+                                           ('ImageType', 'lower case')])
+def test_invalid_values_are_rejected(ds, keyword, text):
+    with pytest.raises(ValueError):
+        parse_value(ds[keyword], text)
+
+def test_editor_text_of_multi_valued_element(ds):
+    from PyQt5.QtCore import Qt
+    from dicom_tag_model import DicomTagModel
+
+    model = DicomTagModel(ds)
+    model.fetch_all()
+    rows = {model.index(row, 0).internalPointer().element.keyword: row for row in range(model.rowCount())}
+    index = model.index(rows['ImageType'], DicomTagModel.VALUE_COLUMN)
+
+    text = model.data(index, Qt.EditRole)
+    assert text == 'ORIGINAL\\PRIMARY\\AXIAL'
+    # Committing the editor unchanged records no edit
+    assert model.setData(index, text)
+    assert not model.edits
+    assert model.setData(index, 'DERIVED\\PRIMARY')
+    assert list(model.edits.values())[0].value == ['DERIVED', 'PRIMARY']
+
+def test_edits_are_written_to_the_item_holding_them():
+    from PyQt5.QtCore import Qt
+    from dicom_tag_model import DicomTagModel
+
+    ds = Dataset()
+    ds.PatientID = 'TOP'
+    item = Dataset()
+    item.PatientID = 'NESTED'
+    ds.OtherPatientIDsSequence = [item]
+
+    # A group view lists elements from several datasets, each with its owner
+    model = DicomTagModel(ds, [ds['PatientID'], item['PatientID']], [ds, item])
+    model.fetch_all()
+    assert model.setData(model.index(1, DicomTagModel.VALUE_COLUMN), 'EDITED', Qt.EditRole)
+    assert model.apply_edits() == 1
+    assert item.PatientID == 'EDITED'
+    assert ds.PatientID == 'TOP'
+    assert not model.edits
@@ -0,0 +1,73 @@
+import json
+import threading
+
+import pytest
+
+import dicom_trace
+from dicom_trace import enable, file_scope, metrics, span, traced, write_chrome_trace
+
+@pytest.fixture(autouse=True)
+def recording_off():
+    dicom_trace.disable()
+    dicom_trace.clear()
+    yield
+    dicom_trace.disable()
+    dicom_trace.clear()
+
+@traced()
+def add(a, b):
+    return a + b
+
+def test_nothing_is_recorded_while_off():
+    first = span('decode', frame=1)
+    assert first is span('render') is file_scope('a.dcm')
+    with first:
+        pass
+    assert add(1, 2) == 3
+    assert metrics.snapshot() == {}
+    assert dicom_trace._state.events == []
+
+def test_spans_feed_metrics_and_events(tmp_path):
+    enable()
+    with span('decode', 'decode', frame=3):
+        pass
+    with pytest.raises(RuntimeError):
+        with span('decode', 'decode', frame=4):
+            raise RuntimeError
+    worker = threading.Thread(target=add, args=(1, 2), name='worker')
+    worker.start()
+    worker.join()
+
+    snapshot = metrics.snapshot()
+    assert snapshot['decode']['count'] == 2
+    assert snapshot['add']['count'] == 1
+    assert metrics.recent('decode')[0] == 2
+
+    path = str(tmp_path / 'trace.json')
+    assert write_chrome_trace(path) == 3
+    with open(path) as trace_file:
+        trace = json.load(trace_file)
+    spans = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert [event['args'] for event in spans if event['name'] == 'decode'] == [{'frame': 3}, {'frame': 4}]
+    assert all(event['dur'] >= 0 for event in spans)
+    thread_names = {event['args']['name'] for event in trace['traceEvents']
+                    if event['name'] == 'thread_name'}
+    assert 'MainThread' in thread_names
+    assert trace['otherData']['metrics']['decode']['count'] == 2
+
+def test_metrics_without_events():
+    enable(events=False)
+    with span('render'):
+        pass
+    assert metrics.get('render').count == 1
+    assert dicom_trace._state.events == []
+
+def test_file_scope_records_peak_memory():
+    enable()
+    with file_scope('/data/a.dcm'):
+        with span('read', 'io'):
+            pass
+    [entry] = metrics.files
+    assert entry['path'] == '/data/a.dcm' and entry['peak_rss_mb'] > 0
+    assert [event['name'] for event in dicom_trace._state.events] == ['read', 'file', 'memory']
+    assert 'a.dcm' in metrics.summary()
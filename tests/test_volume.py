@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+import pydicom
+import pytest
+from pydicom.dataset import Dataset
+
+from dicom_synthetic import _save, make_multiframe, make_series
+from dicom_volume import build_volume
+
+def test_stopped_build_leaves_nothing_in_the_cache(tmp_path):
+    paths = make_series(str(tmp_path / 'series'), files=6, rows=4, cols=4)
+    cache_dir = str(tmp_path / 'cache')
+
+    def stop(done, total):
+        if done == 2:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        build_volume(paths, cache_dir=cache_dir, workers=1, progress=stop)
+    assert os.listdir(cache_dir) == []
+
+    volume = build_volume(paths, cache_dir=cache_dir)
+    assert volume.shape == (6, 4, 4)
+
+def _positioned_multiframe(path, first_z, seed):
+    """Writes a 3-frame file whose frames are 2 mm apart, starting at first_z."""
+    ds = pydicom.dcmread(make_multiframe(path, frames=3, rows=4, cols=4, seed=seed))
+    ds.ImageOrientationPatient = [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
+    items = []
+    for index in range(3):
+        plane = Dataset()
+        plane.ImagePositionPatient = [0.0, 0.0, first_z + 2.0 * index]
+        item = Dataset()
+        item.PlanePositionSequence = [plane]
+        items.append(item)
+    ds.PerFrameFunctionalGroupsSequence = items
+    return _save(ds, path)
+
+def test_multiframe_files_become_one_slice_per_frame(tmp_path):
+    paths = [_positioned_multiframe(str(tmp_path / 'a.dcm'), 0.0, seed=1),
+             _positioned_multiframe(str(tmp_path / 'b.dcm'), 6.0, seed=2)]
+    expected = np.concatenate([pydicom.dcmread(path).pixel_array for path in paths])
+
+    volume = build_volume(paths, cache_dir=None)
+    assert volume.shape == (6, 4, 4)
+    np.testing.assert_array_equal(volume.array, expected)
+    assert volume.spacing[0] == 2.0
+    assert volume.origin == (0.0, 0.0, 0.0)
+
+    with pytest.raises(ValueError):
+        build_volume(paths, cache_dir=None, frame_counts=[1, 1])